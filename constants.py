@@ -9,5 +9,59 @@ PG_HOST = os.getenv('PG_HOST')
 PG_PORT = os.getenv('PG_PORT')
 PG_DATABASE = os.getenv('PG_DATABASE')
 
+# Database backend: postgres (default), or an embedded file database for read-only analysis,
+# demos and CI: duckdb, or sqlite where DuckDB is not installed
+DB_BACKEND = os.getenv('DB_BACKEND', 'postgres').lower()
+DB_PATH = os.getenv('DB_PATH')  # embedded database file, default data/fci.<backend>
+
 # print(f"PostgreSQL connection details loaded: {PG_USERNAME}, {PG_HOST}, {PG_PORT}, {PG_DATABASE}")
 
+
+# Query cache (see src/database/cache.py)
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '256'))
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', '600'))
+CACHE_VERSION_CHECK_SECONDS = float(os.getenv('CACHE_VERSION_CHECK_SECONDS', '5'))
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')  # optional shared backend, needs the `redis` package
+
+# Cache warm-up and prefetching in a background thread of the app (see src/database/warmup.py)
+WARMUP = os.getenv('WARMUP', 'true').lower() in ('1', 'true', 'yes')
+WARMUP_INTERVAL_SECONDS = float(os.getenv('WARMUP_INTERVAL_SECONDS', '300'))  # re-warm period; 0 = at start only
+PREFETCH = os.getenv('PREFETCH', 'true').lower() in ('1', 'true', 'yes')
+
+# Connection pool (see src/database/connection.py)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+# Behind PgBouncer in transaction mode: leave pooling to PgBouncer and open a connection per checkout
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() in ('1', 'true', 'yes')
+
+# Query instrumentation (see src/database/instrumentation.py)
+QUERY_METRICS = os.getenv('QUERY_METRICS', 'true').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'true').lower() in ('1', 'true', 'yes')
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '10'))  # same SELECT this often in one request
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # serve /metrics on this port; 0 = off
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')  # interface to serve it on; 0.0.0.0 = all
+QUERY_DEBUG_PANEL = os.getenv('QUERY_DEBUG_PANEL', 'false').lower() in ('1', 'true', 'yes')
+
+# Logging (see src/utils/log.py)
+LOG_DIR = os.getenv('LOG_DIR', 'logs')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')  # per module, e.g. "src.database.filter=DEBUG,sqlalchemy=WARNING"
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()  # json or text
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', 'midnight')  # TimedRotatingFileHandler `when`
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '14'))
+
+# Denormalised read model of the filter, PostgreSQL only (see src/database/facts.py)
+MEASURE_FACTS = os.getenv('MEASURE_FACTS', 'true').lower() in ('1', 'true', 'yes')
+
+# In-process filter engine over a columnar snapshot of the measures (see src/database/columnar.py)
+IN_MEMORY_FILTER = os.getenv('IN_MEMORY_FILTER', 'true').lower() in ('1', 'true', 'yes')
+
+# Measures Over Time from an in-process copy of the measure count rollup (see src/database/cube.py)
+TIME_CUBE = os.getenv('TIME_CUBE', 'true').lower() in ('1', 'true', 'yes')
+
+# Range partitioning of the measure date tables: "month", "quarter" or empty for none (see src/database/partition.py)
+DATE_PARTITIONS = os.getenv('DATE_PARTITIONS', '').lower()
@@ -1,12 +1,37 @@
+import argparse
+
 from src.database.connection import engine
 from src.database.create import create_database
 from src.database.data_insert import import_data
+from src.database.bulk_insert import bulk_import_data, DEFAULT_BATCH_SIZE
+from src.database.incremental import incremental_import_data
+from src.database.pipeline import parallel_import_data, DEFAULT_WRITERS
 from sqlalchemy.orm import Session
 
+CSV_PATH = 'data/covid-fci-data-cleaned.csv'
+
 if __name__ == "__main__":
-    with Session(engine) as session:
-        create_database()
-        import_data(session, csv_path='data/covid-fci-data-cleaned.csv')
-        print("Database setup and data import completed successfully.")
-    print("You can now run the application with: streamlit run streamlit_app.py")
+    parser = argparse.ArgumentParser(description="Create the tables and import the FCI dataset.")
+    parser.add_argument("--mode", choices=["bulk", "parallel", "incremental", "orm"], default="bulk",
+                        help="bulk: COPY-based loader (default), parallel: multi-process resumable loader, "
+                             "incremental: apply only changed rows, orm: row-by-row ORM import")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="rows per COPY batch (per checkpointed chunk in parallel mode)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parsing processes in parallel mode (default: number of CPUs)")
+    parser.add_argument("--writers", type=int, default=DEFAULT_WRITERS,
+                        help="database writer connections in parallel mode")
+    args = parser.parse_args()
 
+    create_database()
+    if args.mode == "bulk":
+        bulk_import_data(CSV_PATH, batch_size=args.batch_size)
+    elif args.mode == "parallel":
+        parallel_import_data(CSV_PATH, chunk_size=args.batch_size, workers=args.workers, writers=args.writers)
+    elif args.mode == "incremental":
+        incremental_import_data(CSV_PATH, batch_size=args.batch_size)
+    else:
+        with Session(engine) as session:
+            import_data(session, csv_path=CSV_PATH)
+    print("Database setup and data import completed successfully.")
+    print("You can now run the application with: streamlit run streamlit_app.py")
@@ -0,0 +1,170 @@
+import argparse
+import os
+import string
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Columns of the source CSV, in its order (see bulk_insert.parse_row)
+CSV_COLUMNS = [
+    'ID', 'Original_ID', 'Country Name', 'Country ISO3', 'Income Level', 'Authority', 'Date',
+    'Level 1 policy measures', 'Level 2 policy measures', 'Level 3 policy measures',
+    'Details of the measure', 'Reference', 'Termination Date',
+    'Modification of Parent Measure', 'Parent Measure', 'was_modified',
+]
+
+# Value distributions of the real dataset
+AUTHORITIES = (["Cb", "Sup", "Other", "Gov", "Mof", "Res", ""], [0.57, 0.21, 0.09, 0.085, 0.034, 0.009, 0.002])
+INCOME_LEVELS = ["High income", "Upper middle income", "Lower middle income", "Low income"]
+MODIFICATIONS = (["Extension", "Other", "Rollback"], [0.65, 0.3, 0.05])
+VOCABULARY = (
+    "bank banks capital buffer liquidity loan loans mortgage moratorium payment deferral credit guarantee "
+    "facility central reserve requirement rate supervisory relief insurance market securities purchase "
+    "asset bond funding lending sme households corporate support temporary measure extension liquidity "
+    "repo swap currency reporting deadline provisioning dividend restriction regulatory easing program"
+).split()
+
+DEFAULT_START = date(2020, 1, 1)
+
+
+def iso3_code(index: int) -> str:
+    """
+    Three-letter code of the `index`-th synthetic country (AAA, AAB, ...).
+    """
+    letters = string.ascii_uppercase
+    return letters[index // 676 % 26] + letters[index // 26 % 26] + letters[index % 26]
+
+
+def policy_names(level_1: int, level_2_per_parent: int, level_3_per_parent: int):
+    """
+    Synthetic policy hierarchy: names of the level 1 policies, the level 2
+    policies under each level 1 and the level 3 policies under each level 2.
+    """
+    level_1_names = [f"Policy {i + 1}" for i in range(level_1)]
+    level_2_names = [f"{name}.{j + 1}" for name in level_1_names for j in range(level_2_per_parent)]
+    level_3_names = [f"{name}.{k + 1}" for name in level_2_names for k in range(level_3_per_parent)]
+    return level_1_names, level_2_names, level_3_names
+
+
+def generate_chunk(
+    rng: np.random.Generator,
+    first_id: int,
+    size: int,
+    countries: int,
+    policies,
+    level_2_per_parent: int,
+    level_3_per_parent: int,
+    start: date,
+    date_spread_days: int,
+) -> pd.DataFrame:
+    """
+    `size` synthetic source rows with IDs from `first_id`. Countries are
+    Zipf-skewed like the real data, a fifth of the measures have a
+    termination date and about a quarter modify an earlier measure.
+    """
+    level_1_names, level_2_names, level_3_names = policies
+    ids = np.arange(first_id, first_id + size)
+
+    country_weights = 1.0 / np.arange(1, countries + 1)
+    country = rng.choice(countries, size=size, p=country_weights / country_weights.sum())
+    codes = np.array([iso3_code(i) for i in range(countries)])
+    income = np.array(INCOME_LEVELS)[np.arange(countries) % len(INCOME_LEVELS)]
+
+    level_1 = rng.integers(0, len(level_1_names), size)
+    level_2 = level_1 * level_2_per_parent + rng.integers(0, level_2_per_parent, size)
+    level_3 = level_2 * level_3_per_parent + rng.integers(0, max(level_3_per_parent, 1), size)
+    has_level_3 = rng.random(size) < 0.5 if level_3_per_parent else np.zeros(size, dtype=bool)
+
+    # Most measures early in the spread, as in the pandemic response
+    offsets = np.minimum(rng.exponential(date_spread_days / 4, size), date_spread_days - 1).astype(int)
+    dates = np.datetime64(start) + offsets.astype("timedelta64[D]")
+    duration = rng.integers(1, 366, size).astype("timedelta64[D]")
+    termination = np.where(rng.random(size) < 0.2, np.datetime_as_string(dates + duration), "")
+
+    modified = (rng.random(size) < 0.25) & (ids > 1)
+    parent = (rng.random(size) * (ids - 1)).astype(int) + 1
+    modification = rng.choice(MODIFICATIONS[0], size=size, p=MODIFICATIONS[1])
+
+    words = np.array(VOCABULARY)[rng.integers(0, len(VOCABULARY), (size, 12))]
+
+    return pd.DataFrame({
+        'ID': ids,
+        'Original_ID': ids,
+        'Country Name': np.char.add("Country ", codes[country]),
+        'Country ISO3': codes[country],
+        'Income Level': income[country],
+        'Authority': rng.choice(AUTHORITIES[0], size=size, p=AUTHORITIES[1]),
+        'Date': np.datetime_as_string(dates),
+        'Level 1 policy measures': np.array(level_1_names)[level_1],
+        'Level 2 policy measures': np.array(level_2_names)[level_2],
+        'Level 3 policy measures': np.where(has_level_3, np.array(level_3_names or [""])[
+            np.minimum(level_3, max(len(level_3_names) - 1, 0))], ""),
+        'Details of the measure': [" ".join(row) for row in words],
+        'Reference': np.char.add("https://example.org/measures/", ids.astype(str)),
+        'Termination Date': termination,
+        'Modification of Parent Measure': np.where(modified, modification, "No"),
+        'Parent Measure': np.where(modified, np.char.add(parent.astype(str), ".0"), ""),
+        'was_modified': np.where(modified, "True", "False"),
+    }, columns=CSV_COLUMNS)
+
+
+def generate_dataset(
+    csv_path: str,
+    rows: int,
+    countries: int = 150,
+    level_1: int = 5,
+    level_2_per_parent: int = 4,
+    level_3_per_parent: int = 2,
+    start: date = DEFAULT_START,
+    date_spread_days: int = 730,
+    seed: int = 0,
+    chunk_size: int = 100_000,
+) -> str:
+    """
+    Write a synthetic dataset in the format of data/covid-fci-data-cleaned.csv.
+
+    The shape is configurable: number of rows (tested up to 10M), countries,
+    policy hierarchy (level 1 policies and the children per parent on levels
+    2 and 3) and the number of days the start dates spread over. The output
+    only depends on the arguments, so two runs with the same seed load
+    identical data. Rows are generated and written `chunk_size` at a time.
+    """
+    if not 0 < countries <= 26 ** 3:
+        raise ValueError(f"countries must be between 1 and {26 ** 3}")
+    os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+    rng = np.random.default_rng(seed)
+    policies = policy_names(level_1, level_2_per_parent, level_3_per_parent)
+    with open(csv_path, "w", newline="", encoding="utf-8") as f, \
+            tqdm(total=rows, desc="Generating data", unit="rows") as progress:
+        for first in range(0, rows, chunk_size):
+            size = min(chunk_size, rows - first)
+            chunk = generate_chunk(rng, first + 1, size, countries, policies, level_2_per_parent,
+                                   level_3_per_parent, start, date_spread_days)
+            chunk.to_csv(f, header=first == 0, index=False)
+            progress.update(size)
+    log.info("Generated %d synthetic measures in %s", rows, csv_path)
+    return csv_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic FCI-shaped dataset.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--countries", type=int, default=150)
+    parser.add_argument("--level-1", type=int, default=5, help="number of level 1 policies")
+    parser.add_argument("--level-2", type=int, default=4, help="level 2 policies per level 1 policy")
+    parser.add_argument("--level-3", type=int, default=2, help="level 3 policies per level 2 policy")
+    parser.add_argument("--start", type=date.fromisoformat, default=DEFAULT_START)
+    parser.add_argument("--date-spread", type=int, default=730, help="days the start dates spread over")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate_dataset(args.csv_path, args.rows, args.countries, args.level_1, args.level_2, args.level_3,
+                     args.start, args.date_spread, args.seed)
+    print(f"Wrote {args.rows} rows to {args.csv_path}.")
@@ -0,0 +1,378 @@
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import psutil
+from sqlalchemy import func, select
+
+from src.benchmark.generate import generate_dataset
+from src.database import aggregate
+from src.database.activity import active_measures_over_time
+from src.database.async_query import load_dashboard_panels
+from src.database.bulk_insert import DEFAULT_BATCH_SIZE, bulk_import_data
+from src.database.connection import engine, session_scope
+from src.database.create import create_database
+from src.database.drop import drop_all_tables
+from src.database.filter import count_filtered_measures, get_filtered_measure_page, get_filtered_measures
+from src.database.incremental import incremental_import_data
+from src.database.model import Country, Measure, MeasureDate, MeasurePolicyLink, PolicyMeasureLevel
+from src.database.pipeline import parallel_import_data
+from src.database.version import current_data_version
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+SCENARIOS = ("ingest", "filter", "panels")
+INGEST_MODES = ("bulk", "parallel", "incremental")
+FILTER_OPS = ("count", "page", "measures")
+FILTER_DIMENSIONS = ("country", "date", "policy_type", "level", "search")
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "mean_ms")
+DEFAULT_CSV = 'data/covid-fci-data-cleaned.csv'
+SEARCH_TERM = "liquidity"
+
+
+class PeakRss:
+    """
+    Samples the resident set size of this process in a background thread;
+    `peak` is the highest value seen between entering and leaving the block.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self):
+        self.start = self.peak = self.process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+@dataclass
+class Measurement:
+    name: str
+    group: str
+    latencies: List[float] = field(default_factory=list)
+    rows: List[int] = field(default_factory=list)
+    rss_start: int = 0
+    rss_peak: int = 0
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Latency percentiles in milliseconds, throughput and memory of the timed runs.
+        """
+        latencies = np.array(self.latencies)
+        total = float(latencies.sum())
+        p50, p95, p99 = (float(value) for value in np.percentile(latencies, [50, 95, 99]) * 1000)
+        return {
+            "group": self.group,
+            "runs": len(latencies),
+            "p50_ms": round(p50, 3),
+            "p95_ms": round(p95, 3),
+            "p99_ms": round(p99, 3),
+            "mean_ms": round(float(latencies.mean()) * 1000, 3),
+            "min_ms": round(float(latencies.min()) * 1000, 3),
+            "max_ms": round(float(latencies.max()) * 1000, 3),
+            "ops_per_s": round(len(latencies) / total, 3) if total else None,
+            "rows": int(np.mean(self.rows)),
+            "rows_per_s": round(sum(self.rows) / total, 1) if total else None,
+            "peak_rss_mb": round(self.rss_peak / 2 ** 20, 1),
+            "rss_growth_mb": round((self.rss_peak - self.rss_start) / 2 ** 20, 1),
+        }
+
+
+def measure(name: str, group: str, fn: Callable[[], int], repeat: int, warmup: int = 1) -> Measurement:
+    """
+    Run `fn` `warmup` times untimed, then `repeat` times timed. `fn` returns
+    the number of rows it produced (or loaded), used for the throughput.
+    """
+    for _ in range(warmup):
+        fn()
+    result = Measurement(name, group)
+    with PeakRss() as rss:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = fn()
+            result.latencies.append(time.perf_counter() - started)
+            result.rows.append(rows)
+    result.rss_start, result.rss_peak = rss.start, rss.peak
+    log.info("%s: %s", name, result.summary())
+    return result
+
+
+def reset_database() -> None:
+    drop_all_tables()
+    create_database()
+
+
+def ingest_scenarios(csv_path: str, modes: List[str], batch_size: int) -> List[Measurement]:
+    """
+    Load `csv_path` once per mode. bulk and parallel start from empty tables;
+    incremental applies the file on top of the current data, so after
+    another mode it measures change detection on an unchanged file.
+    """
+    loaders = {
+        "bulk": lambda: bulk_import_data(csv_path, batch_size=batch_size),
+        "parallel": lambda: parallel_import_data(csv_path, chunk_size=batch_size),
+        "incremental": lambda: _incremental_rows(csv_path, batch_size),
+    }
+    results = []
+    for mode in modes:
+        if mode != "incremental":
+            reset_database()
+        results.append(measure(f"ingest/{mode}", "ingest", loaders[mode], repeat=1, warmup=0))
+    return results
+
+
+def _incremental_rows(csv_path: str, batch_size: int) -> int:
+    stats = incremental_import_data(csv_path, batch_size=batch_size)
+    return stats.inserted + stats.updated + stats.deleted + stats.unchanged
+
+
+def scenario_values(session) -> Dict[str, Dict[str, Any]]:
+    """
+    Filter values for the scenarios, taken from the loaded data so that any
+    dataset works: the three countries and the level 2 policy with the most
+    measures, level 3 and the first 90 days of data.
+    """
+    countries = session.execute(
+        select(Country.name).join(Measure, Measure.country_id == Country.id)
+        .group_by(Country.name).order_by(func.count().desc(), Country.name).limit(3)
+    ).scalars().all()
+    policy = session.execute(
+        select(PolicyMeasureLevel.name)
+        .join(MeasurePolicyLink, MeasurePolicyLink.policy_measure_level_id == PolicyMeasureLevel.id)
+        .where(PolicyMeasureLevel.level_type == "Level 2")
+        .group_by(PolicyMeasureLevel.name).order_by(func.count().desc(), PolicyMeasureLevel.name).limit(1)
+    ).scalars().all()
+    first_date = session.execute(select(func.min(MeasureDate.date))).scalar()
+    date_from = first_date or datetime(2020, 1, 1).date()
+    return {
+        "country": {"country": countries},
+        "date": {"date_from": date_from, "date_to": date_from + timedelta(days=90)},
+        "policy_type": {"policy_type": policy},
+        "level": {"level": ["Level 3"]},
+        "search": {"search": SEARCH_TERM},
+    }
+
+
+def filter_combinations(values: Dict[str, Dict[str, Any]]):
+    """
+    (name, filters) for every subset of FILTER_DIMENSIONS, "all" being no filter.
+    """
+    for size in range(len(FILTER_DIMENSIONS) + 1):
+        for dimensions in itertools.combinations(FILTER_DIMENSIONS, size):
+            filters = {}
+            for dimension in dimensions:
+                filters.update(values[dimension])
+            yield "+".join(dimensions) or "all", filters
+
+
+def _in_session(fn, *args, **kwargs) -> Callable[[], Any]:
+    # A session per run, as the app opens one per query
+    def run():
+        with session_scope() as session:
+            return fn(session, *args, **kwargs)
+    return run
+
+
+def _counted(fn, *args, **kwargs) -> Callable[[], int]:
+    run = _in_session(fn, *args, **kwargs)
+    return lambda: len(run())
+
+
+def filter_scenarios(values, ops: List[str], repeat: int, warmup: int) -> List[Measurement]:
+    results = []
+    for name, filters in filter_combinations(values):
+        runs = {
+            "count": _in_session(count_filtered_measures, **filters),
+            "page": _counted(get_filtered_measure_page, **filters),
+            "measures": _counted(get_filtered_measures, **filters),
+        }
+        for op in ops:
+            results.append(measure(f"filter/{op}/{name}", "filter", runs[op], repeat, warmup))
+    return results
+
+
+def panel_scenarios(values, repeat: int, warmup: int) -> List[Measurement]:
+    """
+    Every dashboard panel with no filter, with filters the rollups can
+    answer (countries and dates) and with a policy filter that needs the
+    base tables; "dashboard" loads all panels as the app does.
+    """
+    filter_sets = {
+        "all": {},
+        "country+date": {**values["country"], **values["date"]},
+        "policy_type+date": {**values["policy_type"], **values["date"]},
+    }
+    panels = {
+        "measures_over_time": (aggregate.measures_over_time, ("week",)),
+        "active_measures_over_time": (active_measures_over_time, ("week",)),
+        "measures_by_country": (aggregate.measures_by_country, ()),
+        "policy_level_pairs": (aggregate.policy_level_pairs, ()),
+        "authority_counts": (aggregate.authority_counts, ()),
+        "dominant_authority_by_country": (aggregate.dominant_authority_by_country, ()),
+    }
+    results = []
+    for set_name, filters in filter_sets.items():
+        for panel, (fn, args) in panels.items():
+            results.append(measure(f"panel/{panel}/{set_name}", "panels",
+                                   _counted(fn, *args, **filters), repeat, warmup))
+        dashboard = _in_session(load_dashboard_panels, "week", **filters)
+        results.append(measure(f"panel/dashboard/{set_name}", "panels",
+                               lambda: sum(len(df) for df in dashboard().values()), repeat, warmup))
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    scenarios: List[str],
+    csv_path: str = DEFAULT_CSV,
+    ingest_modes: List[str] = ("bulk",),
+    filter_ops: List[str] = FILTER_OPS,
+    repeat: int = 10,
+    warmup: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """
+    Run the selected scenarios against the configured database and return
+    the report: run metadata and a summary per scenario.
+
+    The ingest scenario replaces the data in the database, so point
+    PG_DATABASE (or DB_PATH) at a scratch database to run it.
+    """
+    measurements: List[Measurement] = []
+    if "ingest" in scenarios:
+        measurements += ingest_scenarios(csv_path, list(ingest_modes), batch_size)
+    with session_scope() as session:
+        values = scenario_values(session)
+        measures = session.execute(select(func.count()).select_from(Measure)).scalar_one()
+        version = current_data_version(session.connection())
+    if "filter" in scenarios:
+        measurements += filter_scenarios(values, list(filter_ops), repeat, warmup)
+    if "panels" in scenarios:
+        measurements += panel_scenarios(values, repeat, warmup)
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "backend": engine.dialect.name,
+            "measures": measures,
+            "data_version": version,
+            "csv": csv_path if "ingest" in scenarios else None,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": psutil.cpu_count(),
+        },
+        "results": {m.name: m.summary() for m in measurements},
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], metric: str = "p95_ms",
+            tolerance: float = 0.2, min_delta_ms: float = 1.0) -> List[Dict[str, Any]]:
+    """
+    Scenarios present in both reports whose `metric` grew by more than
+    `tolerance` (0.2 = 20%) and by at least `min_delta_ms`, which keeps
+    sub-millisecond noise from counting as a regression.
+    """
+    if report["meta"]["measures"] != baseline["meta"]["measures"]:
+        log.warning("Baseline has %d measures, this run %d; timings are not comparable",
+                    baseline["meta"]["measures"], report["meta"]["measures"])
+    regressions = []
+    for name, current in report["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        before, after = previous[metric], current[metric]
+        if after - before >= min_delta_ms and after > before * (1 + tolerance):
+            regressions.append({"name": name, "baseline": before, "current": after,
+                                "ratio": round(after / before, 2) if before else None})
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{'scenario':<60} {'runs':>4} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'rows/s':>12} {'RSS MB':>8}")
+    for name, result in report["results"].items():
+        print(f"{name:<60} {result['runs']:>4} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+              f"{result['p99_ms']:>10.2f} {result['rows_per_s'] or 0:>12.0f} {result['peak_rss_mb']:>8.1f}")
+
+
+def _choices(allowed):
+    def parse(value):
+        items = [item for item in value.split(",") if item]
+        unknown = set(items) - set(allowed)
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown {sorted(unknown)}, expected some of {','.join(allowed)}")
+        return items
+    return parse
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingest, filtering and the dashboard aggregates.")
+    parser.add_argument("--scenarios", type=_choices(SCENARIOS), default=["filter", "panels"],
+                        help="comma-separated, from ingest,filter,panels (ingest replaces the data!)")
+    parser.add_argument("--csv", default=None, help=f"file to ingest (default: generated file or {DEFAULT_CSV})")
+    parser.add_argument("--generate", type=int, metavar="ROWS",
+                        help="generate a synthetic dataset of ROWS rows to ingest (see src.benchmark.generate)")
+    parser.add_argument("--ingest-modes", type=_choices(INGEST_MODES), default=["bulk"])
+    parser.add_argument("--filter-ops", type=_choices(FILTER_OPS), default=list(FILTER_OPS))
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per query scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before the timed ones")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--metric", choices=METRICS, default="p95_ms")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    csv_path = args.csv or DEFAULT_CSV
+    if args.generate:
+        csv_path = generate_dataset(args.csv or f"data/synthetic_{args.generate}.csv", args.generate)
+    report = run_benchmarks(args.scenarios, csv_path, args.ingest_modes, args.filter_ops,
+                            args.repeat, args.warmup, args.batch_size)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {args.output}.")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["measures"] != report["meta"]["measures"]:
+            print(f"Warning: the baseline was taken on {baseline['meta']['measures']} measures, "
+                  f"this run on {report['meta']['measures']}.")
+        regressions = compare(report, baseline, args.metric, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['name']}: {args.metric} {regression['baseline']} -> "
+                  f"{regression['current']} ({regression['ratio']}x)")
+        print(f"{len(regressions)} regression(s) against {args.baseline}.")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,162 @@
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import Boolean, and_, case, func, literal_column, or_, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import Null
+from sqlalchemy.sql.functions import FunctionElement
+
+from src.database.connection import engine
+from src.database.model import Measure, MeasureDate
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Period during which a measure is in force: from its date through its
+# termination date (open-ended without one). A termination date before the
+# start date is treated as a one-day measure; undated measures are never active.
+ACTIVE_RANGE = (
+    "CASE WHEN date IS NULL THEN NULL "
+    "WHEN termination_date IS NULL THEN daterange(date, NULL, '[)') "
+    "ELSE daterange(date, GREATEST(termination_date, date), '[]') END"
+)
+ACTIVITY_MIGRATIONS = [
+    f"ALTER TABLE measure_dates ADD COLUMN IF NOT EXISTS active_range daterange "
+    f"GENERATED ALWAYS AS ({ACTIVE_RANGE}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_measure_dates_active_range ON measure_dates USING gist (active_range)",
+]
+
+# pandas frequencies of the date_bucket intervals
+BUCKET_FREQUENCIES = {"day": "D", "week": "W-MON", "month": "MS"}
+
+
+def active_end(model=MeasureDate):
+    """
+    Last day a measure is in force, NULL when open-ended.
+    """
+    return case((model.termination_date < model.date, model.date), else_=model.termination_date)
+
+
+class active_between(FunctionElement):
+    """
+    True when the measure_dates row is in force on any day of [active_from, active_to];
+    either bound may be NULL for an open end.
+    """
+    type = Boolean()
+    inherit_cache = True
+    name = "active_between"
+
+
+@compiles(active_between, "postgresql")
+def _compile_active_between_pg(element, compiler, **kw):
+    active_from, active_to = element.clauses
+    overlap = literal_column("measure_dates.active_range").op("&&")(
+        func.daterange(active_from, active_to, "[]")
+    )
+    return compiler.process(overlap.self_group(), **kw)
+
+
+@compiles(active_between)
+def _compile_active_between(element, compiler, **kw):
+    active_from, active_to = element.clauses
+    end = active_end()
+    # An unset bound arrives as NULL and leaves that side open
+    conditions = [MeasureDate.date.is_not(None)]
+    if not isinstance(active_to, Null):
+        conditions.append(MeasureDate.date <= active_to)
+    if not isinstance(active_from, Null):
+        conditions.append(or_(end.is_(None), end >= active_from))
+    return compiler.process(and_(*conditions).self_group(), **kw)
+
+
+def active_criterion(active_from=None, active_to=None):
+    """
+    Semi-join on `measures` for the measures in force on some day between the two dates.
+    """
+    return (
+        select(MeasureDate.id)
+        .where(MeasureDate.measure_id == Measure.id, active_between(active_from, active_to))
+        .correlate(Measure)
+        .exists()
+    )
+
+
+def active_change_statements(interval="week", date_from=None, date_to=None, **filters):
+    """
+    Sweep-line inputs for active_measures_over_time: the number of measures
+    starting per bucket and the number whose last active day falls in each
+    bucket, for the measures matching `filters` and in force between
+    `date_from` and `date_to`.
+    """
+    # Imported here: filter.py uses active_criterion
+    from src.database.aggregate import date_bucket
+    from src.database.filter import filter_criteria
+
+    criteria = filter_criteria(**filters)
+    if date_from or date_to:
+        criteria.append(active_criterion(date_from, date_to))
+    starts = date_bucket(interval, MeasureDate.date).label("interval")
+    ends = date_bucket(interval, active_end()).label("interval")
+    base = select().select_from(Measure).join(MeasureDate, MeasureDate.measure_id == Measure.id).where(*criteria)
+    return (
+        base.add_columns(starts, func.count().label("starts"))
+        .where(MeasureDate.date.is_not(None))
+        .group_by(starts),
+        base.add_columns(ends, func.count().label("ends"))
+        .where(MeasureDate.date.is_not(None), MeasureDate.termination_date.is_not(None))
+        .group_by(ends),
+    )
+
+
+def bucket_start(day, interval="week") -> pd.Timestamp:
+    """
+    First day of the date_bucket containing `day`.
+    """
+    day = pd.Timestamp(day).normalize()
+    if interval == "week":
+        return day - pd.Timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def fold_active_counts(starts, ends, interval="week", date_from=None, date_to=None) -> pd.DataFrame:
+    """
+    Sweep over per-bucket start and end counts: a measure is active in every
+    bucket from the one it starts in through the one its last day falls in.
+    Returns columns interval, active_count for the buckets of [date_from,
+    date_to], by default from the first start to the last start or end.
+    """
+    starts = pd.Series({pd.Timestamp(bucket): count for bucket, count in starts}, dtype="int64")
+    ends = pd.Series({pd.Timestamp(bucket): count for bucket, count in ends}, dtype="int64")
+    if starts.empty:
+        return pd.DataFrame({"interval": pd.to_datetime([]), "active_count": pd.Series([], dtype="int64")})
+    first = starts.index.min() if date_from is None else bucket_start(date_from, interval)
+    last = max(starts.index.max(), ends.index.max() if len(ends) else starts.index.max())
+    if date_to is not None:
+        last = bucket_start(date_to, interval)
+    buckets = pd.date_range(min(first, starts.index.min()), last, freq=BUCKET_FREQUENCIES[interval])
+    started = starts.reindex(buckets, fill_value=0).cumsum()
+    # A measure whose last day is in bucket B is still active in B and gone from B + 1
+    ended = ends.reindex(buckets, fill_value=0).cumsum().shift(1, fill_value=0)
+    counts = (started - ended).loc[first:]
+    return pd.DataFrame({"interval": counts.index, "active_count": counts.to_numpy()})
+
+
+def active_measures_over_time(session: Session, interval: str = "week", **filters) -> pd.DataFrame:
+    """
+    Number of measures in force per `interval` ("day", "week" or "month"),
+    as columns interval, active_count. `date_from` and `date_to` select the
+    window: measures in force at any point of it count, whenever they started.
+    """
+    starts_stmt, ends_stmt = active_change_statements(interval, **filters)
+    return fold_active_counts(
+        session.execute(starts_stmt).all(), session.execute(ends_stmt).all(),
+        interval, filters.get("date_from"), filters.get("date_to"),
+    )
+
+
+if __name__ == "__main__":
+    with Session(engine) as session:
+        print(active_measures_over_time(session, "month", date_from=date(2020, 1, 1), date_to=date(2021, 12, 31)))
@@ -0,0 +1,260 @@
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import Date, case, cast, func, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql.functions import FunctionElement
+
+from src.database.connection import engine
+from src.database.cube import cube_for
+from src.database.filter import filter_criteria
+from src.database.model import (
+    Measure, Country, MeasureDate, MeasureDetail, MeasurePolicyLink, PolicyMeasureLevel,
+    MeasureCountRollup, PolicyPairRollup
+)
+from src.database.rollup import can_use_rollups, rollup_criteria, rollups_ready
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Dashboard labels -> date_trunc units
+INTERVALS = {"Daily": "day", "Weekly": "week", "Monthly": "month"}
+
+
+def _frame(session, stmt, columns):
+    return pd.DataFrame(session.execute(stmt).all(), columns=columns)
+
+
+def should_use_rollups(session, use_rollups, filters):
+    return use_rollups and can_use_rollups(filters) and rollups_ready(session.connection())
+
+
+class date_bucket(FunctionElement):
+    """
+    First day of the "day", "week" (Monday) or "month" containing a date.
+    """
+    type = Date()
+    inherit_cache = True
+    name = "date_bucket"
+
+
+@compiles(date_bucket)
+def _compile_date_bucket(element, compiler, **kw):
+    interval, column = element.clauses
+    return compiler.process(cast(func.date_trunc(interval, column), Date), **kw)
+
+
+@compiles(date_bucket, "sqlite")
+def _compile_date_bucket_sqlite(element, compiler, **kw):
+    # The interval stays a bound parameter: compiled statements are cached across its values
+    interval, column = element.clauses
+    return compiler.process(case(
+        (interval == "week", func.date(column, "-6 days", "weekday 1")),
+        (interval == "month", func.date(column, "start of month")),
+        else_=func.date(column),
+    ), **kw)
+
+
+def _date_bucket(column, interval):
+    return date_bucket(interval, column).label("interval")
+
+
+def _supports_mode(session):
+    # SQLite has no ordered-set aggregates
+    return session.get_bind().dialect.name != "sqlite"
+
+
+def measures_over_time_statement(interval="week", rollup=False, **filters):
+    if rollup:
+        bucket = _date_bucket(MeasureCountRollup.date, interval)
+        return (
+            select(bucket, func.sum(MeasureCountRollup.measure_count).label("measure_count"))
+            .where(MeasureCountRollup.date.is_not(None), *rollup_criteria(MeasureCountRollup, **filters))
+            .group_by(bucket)
+            .order_by(bucket)
+        )
+    bucket = _date_bucket(MeasureDate.date, interval)
+    return (
+        select(bucket, func.count().label("measure_count"))
+        .select_from(Measure)
+        .join(MeasureDate, MeasureDate.measure_id == Measure.id)
+        .where(MeasureDate.date.is_not(None), *filter_criteria(**filters))
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+
+
+def measures_by_country_statement(rollup=False, **filters):
+    if rollup:
+        measure_count = func.sum(MeasureCountRollup.measure_count).label("measure_count")
+        return (
+            select(Country.name, measure_count)
+            .join(Country, MeasureCountRollup.country_id == Country.id)
+            .where(*rollup_criteria(MeasureCountRollup, **filters))
+            .group_by(Country.name)
+            .order_by(measure_count.desc(), Country.name)
+        )
+    measure_count = func.count().label("measure_count")
+    return (
+        select(Country.name, measure_count)
+        .select_from(Measure)
+        .join(Country, Measure.country_id == Country.id)
+        .where(*filter_criteria(**filters))
+        .group_by(Country.name)
+        .order_by(measure_count.desc(), Country.name)
+    )
+
+
+def policy_level_pairs_statement(rollup=False, **filters):
+    level_1, level_2 = aliased(PolicyMeasureLevel), aliased(PolicyMeasureLevel)
+    if rollup:
+        pair_count = func.sum(PolicyPairRollup.pair_count).label("count")
+        return (
+            select(level_1.name, level_2.name, pair_count)
+            .join(level_1, PolicyPairRollup.level_1_id == level_1.id)
+            .join(level_2, PolicyPairRollup.level_2_id == level_2.id)
+            .where(*rollup_criteria(PolicyPairRollup, **filters))
+            .group_by(level_1.name, level_2.name)
+            .order_by(pair_count.desc())
+        )
+    link_1, link_2 = aliased(MeasurePolicyLink), aliased(MeasurePolicyLink)
+    pair_count = func.count().label("count")
+    return (
+        select(level_1.name, level_2.name, pair_count)
+        .select_from(Measure)
+        .join(link_1, link_1.measure_id == Measure.id)
+        .join(level_1, (link_1.policy_measure_level_id == level_1.id) & (level_1.level_type == "Level 1"))
+        .join(link_2, link_2.measure_id == Measure.id)
+        .join(level_2, (link_2.policy_measure_level_id == level_2.id) & (level_2.level_type == "Level 2"))
+        .where(*filter_criteria(**filters))
+        .group_by(level_1.name, level_2.name)
+        .order_by(pair_count.desc())
+    )
+
+
+def authority_counts_statement(rollup=False, **filters):
+    if rollup:
+        authority = MeasureCountRollup.authority
+        authority_count = func.sum(MeasureCountRollup.measure_count).label("count")
+        return (
+            select(authority, authority_count)
+            .where(authority.is_not(None), authority != "", *rollup_criteria(MeasureCountRollup, **filters))
+            .group_by(authority)
+            .order_by(authority_count.desc())
+        )
+    authority_count = func.count().label("count")
+    return (
+        select(MeasureDetail.authority, authority_count)
+        .select_from(Measure)
+        .join(MeasureDetail, MeasureDetail.measure_id == Measure.id)
+        .where(MeasureDetail.authority.is_not(None), MeasureDetail.authority != "", *filter_criteria(**filters))
+        .group_by(MeasureDetail.authority)
+        .order_by(authority_count.desc())
+    )
+
+
+def _top_authority(stmt, iso3, authority, total):
+    # Authority with the largest total per country, ties going to the first in sort order as mode() does
+    ranked = (
+        stmt.add_columns(
+            iso3, authority.label("authority"),
+            func.row_number().over(partition_by=iso3, order_by=(total.desc(), authority)).label("rank"),
+        )
+        .where(authority.is_not(None), authority != "")
+        .group_by(iso3, authority)
+        .subquery()
+    )
+    return select(ranked.c.iso3, ranked.c.authority).where(ranked.c.rank == 1)
+
+
+def dominant_authority_statement(rollup=False, use_mode=True, **filters):
+    iso3 = func.upper(Country.iso3).label("iso3")
+    if rollup:
+        # mode() needs the individual rows, so rank the rollup totals instead
+        return _top_authority(
+            select().select_from(MeasureCountRollup)
+            .join(Country, MeasureCountRollup.country_id == Country.id)
+            .where(*rollup_criteria(MeasureCountRollup, **filters)),
+            iso3, MeasureCountRollup.authority, func.sum(MeasureCountRollup.measure_count),
+        )
+    if not use_mode:
+        return _top_authority(
+            select().select_from(Measure)
+            .join(Country, Measure.country_id == Country.id)
+            .join(MeasureDetail, MeasureDetail.measure_id == Measure.id)
+            .where(*filter_criteria(**filters)),
+            iso3, MeasureDetail.authority, func.count(),
+        )
+    return (
+        select(iso3, func.mode().within_group(MeasureDetail.authority).label("authority"))
+        .select_from(Measure)
+        .join(Country, Measure.country_id == Country.id)
+        .join(MeasureDetail, MeasureDetail.measure_id == Measure.id)
+        .where(MeasureDetail.authority.is_not(None), MeasureDetail.authority != "", *filter_criteria(**filters))
+        .group_by(iso3)
+    )
+
+
+# Every aggregate below is answered from the rollup tables when `use_rollups`
+# is set, the filters are limited to country and date range, and the rollups
+# have been built; otherwise it is computed from the measure tables.
+
+def measures_over_time(session: Session, interval: str = "week", use_rollups: bool = True, **filters) -> pd.DataFrame:
+    """
+    Number of measures introduced per `interval` ("day", "week" or "month"),
+    as columns interval, measure_count. Answered from the time cube
+    whenever it holds the filters, whatever `use_rollups` says.
+    """
+    cube = cube_for(session, filters)
+    if cube is not None:
+        return cube.measures_over_time(interval, **filters)
+    rollup = should_use_rollups(session, use_rollups, filters)
+    df = _frame(session, measures_over_time_statement(interval, rollup, **filters), ["interval", "measure_count"])
+    df["interval"] = pd.to_datetime(df["interval"])
+    return df
+
+
+def measures_by_country(session: Session, use_rollups: bool = True, **filters) -> pd.DataFrame:
+    """
+    Number of measures per country, largest first, as columns country, measure_count.
+    """
+    rollup = should_use_rollups(session, use_rollups, filters)
+    return _frame(session, measures_by_country_statement(rollup, **filters), ["country", "measure_count"])
+
+
+def policy_level_pairs(session: Session, use_rollups: bool = True, **filters) -> pd.DataFrame:
+    """
+    Number of (Level 1, Level 2) policy pairs across the matching measures,
+    as columns level_1, level_2, count. A measure contributes one pair per
+    combination of its Level 1 and Level 2 policies.
+    """
+    rollup = should_use_rollups(session, use_rollups, filters)
+    return _frame(session, policy_level_pairs_statement(rollup, **filters), ["level_1", "level_2", "count"])
+
+
+def authority_counts(session: Session, use_rollups: bool = True, **filters) -> pd.DataFrame:
+    """
+    Number of measures per issuing authority, as columns authority, count.
+    """
+    rollup = should_use_rollups(session, use_rollups, filters)
+    return _frame(session, authority_counts_statement(rollup, **filters), ["authority", "count"])
+
+
+def dominant_authority_by_country(session: Session, use_rollups: bool = True, **filters) -> pd.DataFrame:
+    """
+    Most frequent authority per country, as columns iso3, authority.
+    """
+    rollup = should_use_rollups(session, use_rollups, filters)
+    stmt = dominant_authority_statement(rollup, _supports_mode(session), **filters)
+    return _frame(session, stmt, ["iso3", "authority"])
+
+
+if __name__ == "__main__":
+    with Session(engine) as session:
+        filters = dict(date_from=date(2020, 1, 1), date_to=date(2020, 12, 31))
+        print(measures_over_time(session, "month", **filters))
+        print(measures_by_country(session, **filters).head(10))
+        print(policy_level_pairs(session, **filters).head(10))
+        print(authority_counts(session, **filters))
+        print(dominant_authority_by_country(session, **filters).head(10))
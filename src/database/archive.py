@@ -0,0 +1,142 @@
+import argparse
+from datetime import date
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from src.database.partition import (
+    enabled, partition_name, partition_window, partitions, stored_columns, window_end, window_start
+)
+from src.database.refresh import refresh_derived_data
+from src.database.rollup import refresh_rollups
+from src.database.version import bump_data_version
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Old date windows are moved out of the live tables into this schema
+ARCHIVE_SCHEMA = "archive"
+# Tables holding the rest of an archived measure; measures last, the others reference it
+ARCHIVED_TABLES = ("measure_policy_links", "measure_modifications", "measure_details", "measures")
+
+
+def _key(table: str) -> str:
+    return "id" if table == "measures" else "measure_id"
+
+
+def _archived_partitions(conn: Connection) -> List[str]:
+    if conn.dialect.name != "postgresql":
+        return []
+    return list(conn.execute(text(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_schema = :schema AND table_name LIKE 'measure\\_dates\\_p%'"
+    ), {"schema": ARCHIVE_SCHEMA}).scalars())
+
+
+def archived_windows(conn: Connection) -> List[Tuple[date, date]]:
+    """
+    (first day, first day after) of every archived date window.
+    """
+    return sorted(partition_window(name) for name in _archived_partitions(conn))
+
+
+def is_archived(day: date | None, windows: List[Tuple[date, date]]) -> bool:
+    return day is not None and any(start <= day < end for start, end in windows)
+
+
+def archive_window(conn: Connection, day: date) -> int:
+    """
+    Move the measures of the date partition holding `day` out of the live
+    tables into the archive schema and return their number.
+
+    The measure_dates partition is detached and kept as it is; the rows of
+    its measures in the other tables are copied next to it and deleted, and
+    the derived tables drop them. Every step reads only the window's rows,
+    so the cost follows the size of the window, not of the history.
+    """
+    if not enabled(conn):
+        raise ValueError("Archiving needs date partitions: set DATE_PARTITIONS and run the migrations.")
+    start = window_start(day)
+    name = partition_name("measure_dates", start)
+    if name not in partitions(conn, "measure_dates"):
+        raise ValueError(f"No partition {name} to archive")
+    suffix = name[len("measure_dates"):]
+    conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+    conn.execute(text(f"ALTER TABLE measure_dates DETACH PARTITION {name}"))
+    conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+    # The detached table keeps its own copy of the foreign key to measures
+    for (constraint,) in conn.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'f'"
+    ), {"table": f"{ARCHIVE_SCHEMA}.{name}"}):
+        conn.execute(text(f"ALTER TABLE {ARCHIVE_SCHEMA}.{name} DROP CONSTRAINT {constraint}"))
+
+    archived = f"SELECT measure_id FROM {ARCHIVE_SCHEMA}.{name}"
+    for table in ARCHIVED_TABLES:
+        conn.execute(text(
+            f"CREATE TABLE {ARCHIVE_SCHEMA}.{table}{suffix} AS "
+            f"SELECT {stored_columns(conn, table)} FROM {table} WHERE {_key(table)} IN ({archived})"
+        ))
+        conn.execute(text(f"DELETE FROM {table} WHERE {_key(table)} IN ({archived})"))
+    facts = partition_name("measure_facts", start)
+    if facts in partitions(conn, "measure_facts"):
+        # Derived from the tables above; rebuilt on restore
+        conn.execute(text(f"ALTER TABLE measure_facts DETACH PARTITION {facts}"))
+        conn.execute(text(f"DROP TABLE {facts}"))
+
+    days = set(conn.execute(text(f"SELECT DISTINCT date FROM {ARCHIVE_SCHEMA}.{name}")).scalars())
+    refresh_rollups(conn, days)
+    bump_data_version(conn)
+    count = conn.execute(text(f"SELECT count(*) FROM {ARCHIVE_SCHEMA}.{name}")).scalar_one()
+    log.info("Archived %d measures of %s to %s into %s", count, start, window_end(start), ARCHIVE_SCHEMA)
+    return count
+
+
+def restore_window(conn: Connection, day: date) -> int:
+    """
+    Bring the archived window holding `day` back into the live tables and
+    return the number of measures restored.
+    """
+    name = next((name for name in _archived_partitions(conn) if is_archived(day, [partition_window(name)])), None)
+    if name is None:
+        raise ValueError(f"No archived window holds {day}")
+    start, end = partition_window(name)
+    if name in partitions(conn, "measure_dates"):
+        raise ValueError(f"measure_dates has a partition {name} again; archive or empty it first")
+    suffix = name[len("measure_dates"):]
+    for table in reversed(ARCHIVED_TABLES):
+        columns = stored_columns(conn, f"{ARCHIVE_SCHEMA}.{table}{suffix}")
+        conn.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {ARCHIVE_SCHEMA}.{table}{suffix}"))
+        conn.execute(text(f"DROP TABLE {ARCHIVE_SCHEMA}.{table}{suffix}"))
+    conn.execute(text(f"ALTER TABLE {ARCHIVE_SCHEMA}.{name} SET SCHEMA public"))
+    # Attaching checks the rows against the bounds and adds the parent's indexes and foreign keys
+    conn.execute(text(
+        f"ALTER TABLE measure_dates ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+
+    days = set(conn.execute(text(f"SELECT DISTINCT date FROM {name}")).scalars())
+    refresh_derived_data(conn, days)
+    count = conn.execute(text(f"SELECT count(*) FROM {name}")).scalar_one()
+    log.info("Restored %d measures of %s to %s from %s", count, start, end, ARCHIVE_SCHEMA)
+    return count
+
+
+if __name__ == "__main__":
+    from src.database.connection import engine
+
+    parser = argparse.ArgumentParser(description="Archive old date partitions of the measures, or restore one.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--before", type=date.fromisoformat,
+                       help="archive every partition that ends on or before this date (YYYY-MM-DD)")
+    group.add_argument("--restore", type=date.fromisoformat,
+                       help="restore the archived window holding this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.restore:
+            print(f"Restored {restore_window(conn, args.restore)} measures.")
+        else:
+            starts = sorted(partition_window(name)[0] for name in partitions(conn, "measure_dates")
+                            if not name.endswith("_default"))
+            total = sum(archive_window(conn, start) for start in starts if window_end(start) <= args.before)
+            print(f"Archived {total} measures.")
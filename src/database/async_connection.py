@@ -0,0 +1,69 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from constants import DB_PGBOUNCER, QUERY_METRICS
+from src.database.connection import connect_url, engine, pool_options
+from src.database.instrumentation import carry_query_traces, instrument_engine
+
+T = TypeVar("T")
+
+async_connect_url = connect_url.set(drivername="postgresql+asyncpg")
+
+if DB_PGBOUNCER:
+    # PgBouncer in transaction mode cannot keep asyncpg's prepared statements across transactions
+    async_engine = create_async_engine(
+        async_connect_url.update_query_dict({"prepared_statement_cache_size": "0"}),
+        connect_args={"statement_cache_size": 0},
+        **pool_options(),
+    )
+else:
+    async_engine = create_async_engine(async_connect_url, **pool_options())
+
+if QUERY_METRICS:
+    instrument_engine(async_engine.sync_engine, explain_bind=engine)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncIterator[AsyncSession]:
+    """
+    Async counterpart of session_scope(): commit on success, roll back on error, always close.
+    """
+    session = AsyncSessionLocal()
+    try:
+        yield session
+        await session.commit()
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-db", daemon=True).start()
+        return _loop
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """
+    Run `coro` from synchronous code (e.g. a Streamlit script) and wait for its result.
+
+    Pooled asyncpg connections belong to the event loop that opened them, so
+    every call runs on one long-lived loop in a background thread instead of
+    a fresh asyncio.run() loop. Queries it runs count towards the caller's
+    track_queries() traces.
+    """
+    return asyncio.run_coroutine_threadsafe(carry_query_traces(coro), _event_loop()).result()
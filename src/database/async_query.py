@@ -0,0 +1,182 @@
+import asyncio
+from datetime import date
+from typing import Dict, Iterable
+
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.database import activity, aggregate
+from src.database.activity import active_change_statements, fold_active_counts
+from src.database.aggregate import (
+    authority_counts_statement, dominant_authority_statement, measures_by_country_statement,
+    measures_over_time_statement, policy_level_pairs_statement, should_use_rollups
+)
+from src.database.async_connection import async_session_scope, run_async
+from src.database.columnar import filter_engine
+from src.database.connection import session_scope
+from src.database.cube import cube_for
+from src.database.filter import (
+    DEFAULT_PAGE_SIZE, count_statement, current_fact_codes, fold_policies, page_statement, policy_link_statement,
+    rows_by_id_statement
+)
+from src.database.rollup import can_use_rollups, rollups_ready
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Async versions of the filter and aggregate APIs. They build the same
+# statements as the synchronous functions; only execution differs. An
+# AsyncSession runs one statement at a time, so queries meant to overlap
+# need a session each (see dashboard_panels).
+
+
+async def _frame(session: AsyncSession, stmt, columns) -> pd.DataFrame:
+    result = await session.execute(stmt)
+    return pd.DataFrame(result.all(), columns=columns)
+
+
+async def _use_rollups(session: AsyncSession, use_rollups: bool, filters) -> bool:
+    if not (use_rollups and can_use_rollups(filters)):
+        return False
+    return await session.run_sync(lambda sync_session: rollups_ready(sync_session.connection()))
+
+
+async def _per_version(get, *args):
+    # Values cached per data version (fact codes, columnar snapshot, time
+    # cube) are loaded under a thread lock. Taken on the event loop, a second
+    # coroutine waiting for it would block the loop the first one needs to
+    # finish loading, so they are fetched on a worker thread instead
+    def run():
+        with session_scope() as session:
+            return get(session, *args)
+    return await asyncio.to_thread(run)
+
+
+async def _fact_codes(session: AsyncSession):
+    return await _per_version(current_fact_codes)
+
+
+async def _snapshot(session: AsyncSession):
+    return await _per_version(filter_engine.snapshot)
+
+
+async def count_filtered_measures(session: AsyncSession, **filters) -> int:
+    if filter_engine.applies(filters):
+        return (await _snapshot(session)).count(**filters)
+    result = await session.execute(count_statement(await _fact_codes(session), **filters))
+    return result.scalar_one()
+
+
+async def get_filtered_measure_page(session: AsyncSession, after_id=None, page_size=DEFAULT_PAGE_SIZE, **filters):
+    if filter_engine.applies(filters):
+        ids = (await _snapshot(session)).page_ids(after_id, page_size, **filters).tolist()
+        stmt = rows_by_id_statement(ids, **filters)
+    else:
+        stmt = page_statement(await _fact_codes(session), after_id, page_size, **filters)
+    rows = (await session.execute(stmt)).all()
+    links = await session.execute(policy_link_statement([row[0] for row in rows]))
+    return fold_policies(rows, links)
+
+
+async def measures_over_time(session: AsyncSession, interval: str = "week", use_rollups: bool = True,
+                             **filters) -> pd.DataFrame:
+    cube = await _per_version(cube_for, filters)
+    if cube is not None:
+        return cube.measures_over_time(interval, **filters)
+    rollup = await _use_rollups(session, use_rollups, filters)
+    df = await _frame(session, measures_over_time_statement(interval, rollup, **filters), ["interval", "measure_count"])
+    df["interval"] = pd.to_datetime(df["interval"])
+    return df
+
+
+async def measures_by_country(session: AsyncSession, use_rollups: bool = True, **filters) -> pd.DataFrame:
+    rollup = await _use_rollups(session, use_rollups, filters)
+    return await _frame(session, measures_by_country_statement(rollup, **filters), ["country", "measure_count"])
+
+
+async def policy_level_pairs(session: AsyncSession, use_rollups: bool = True, **filters) -> pd.DataFrame:
+    rollup = await _use_rollups(session, use_rollups, filters)
+    return await _frame(session, policy_level_pairs_statement(rollup, **filters), ["level_1", "level_2", "count"])
+
+
+async def authority_counts(session: AsyncSession, use_rollups: bool = True, **filters) -> pd.DataFrame:
+    rollup = await _use_rollups(session, use_rollups, filters)
+    return await _frame(session, authority_counts_statement(rollup, **filters), ["authority", "count"])
+
+
+async def dominant_authority_by_country(session: AsyncSession, use_rollups: bool = True, **filters) -> pd.DataFrame:
+    rollup = await _use_rollups(session, use_rollups, filters)
+    return await _frame(session, dominant_authority_statement(rollup, **filters), ["iso3", "authority"])
+
+
+async def active_measures_over_time(session: AsyncSession, interval: str = "week", use_rollups: bool = True,
+                                    **filters) -> pd.DataFrame:
+    starts_stmt, ends_stmt = active_change_statements(interval, **filters)
+    starts = (await session.execute(starts_stmt)).all()
+    ends = (await session.execute(ends_stmt)).all()
+    return fold_active_counts(starts, ends, interval, filters.get("date_from"), filters.get("date_to"))
+
+
+async def _in_own_session(fn, *args, **kwargs):
+    async with async_session_scope() as session:
+        return await fn(session, *args, **kwargs)
+
+
+# Panels that depend on the interval, and those that only depend on the filters
+TIME_SERIES_PANELS = ("measures_over_time", "active_measures_over_time")
+OTHER_PANELS = ("measures_by_country", "policy_level_pairs", "authority_counts", "dominant_authority_by_country")
+
+
+async def dashboard_panels(interval: str = "week", use_rollups: bool = True, names: Iterable[str] | None = None,
+                           **filters) -> Dict[str, pd.DataFrame]:
+    """
+    Every dashboard aggregate for `filters` (or those in `names`), each on
+    its own pooled connection and all in flight at once, so the wait is that
+    of the slowest query.
+    """
+    panels = {
+        "measures_over_time": (measures_over_time, (interval,)),
+        "active_measures_over_time": (active_measures_over_time, (interval,)),
+        "measures_by_country": (measures_by_country, ()),
+        "policy_level_pairs": (policy_level_pairs, ()),
+        "authority_counts": (authority_counts, ()),
+        "dominant_authority_by_country": (dominant_authority_by_country, ()),
+    }
+    if names is not None:
+        panels = {name: panels[name] for name in names}
+    results = await asyncio.gather(*(
+        _in_own_session(fn, *args, use_rollups=use_rollups, **filters) for fn, args in panels.values()
+    ))
+    return dict(zip(panels, results))
+
+
+def load_dashboard_panels(session: Session, interval: str = "week", use_rollups: bool = True,
+                          names: Iterable[str] | None = None, **filters) -> Dict[str, pd.DataFrame]:
+    """
+    Synchronous entry point for dashboard_panels. `session` decides once
+    whether the rollups apply, so the concurrent queries skip that check
+    when they do not. Embedded backends have no async driver and run the
+    synchronous aggregates one after the other on `session`.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        panels = {
+            "measures_over_time": lambda: aggregate.measures_over_time(session, interval, use_rollups, **filters),
+            "active_measures_over_time": lambda: activity.active_measures_over_time(session, interval, **filters),
+            "measures_by_country": lambda: aggregate.measures_by_country(session, use_rollups, **filters),
+            "policy_level_pairs": lambda: aggregate.policy_level_pairs(session, use_rollups, **filters),
+            "authority_counts": lambda: aggregate.authority_counts(session, use_rollups, **filters),
+            "dominant_authority_by_country":
+                lambda: aggregate.dominant_authority_by_country(session, use_rollups, **filters),
+        }
+        return {name: panels[name]() for name in (panels if names is None else names)}
+    use_rollups = should_use_rollups(session, use_rollups, filters)
+    return run_async(dashboard_panels(interval, use_rollups, names, **filters))
+
+
+if __name__ == "__main__":
+    with session_scope() as session:
+        panels = load_dashboard_panels(session, "month", date_from=date(2020, 1, 1), date_to=date(2020, 12, 31))
+    for name, df in panels.items():
+        print(name)
+        print(df.head(5))
@@ -0,0 +1,225 @@
+import csv
+import hashlib
+import io
+from datetime import date
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Sequence
+
+from sqlalchemy import Table, func, select, text
+from sqlalchemy.engine import Connection, Engine
+from tqdm import tqdm
+
+from src.database.connection import engine
+from src.database.dimension_cache import DimensionCache
+from src.database.embedded import id_sequence
+from src.database.partition import ensure_partitions
+from src.database.refresh import refresh_derived_data
+from src.database.model import (
+    Measure, MeasureDate, MeasureDetail, MeasureModification, MeasurePolicyLink
+)
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_BATCH_SIZE = 10_000
+POLICY_LEVELS = ("Level 1", "Level 2", "Level 3")
+# Source columns that make up a measure; `ID` identifies the row and is not hashed
+HASHED_COLUMNS = (
+    'Original_ID', 'Country Name', 'Country ISO3', 'Income Level', 'Authority', 'Date',
+    'Level 1 policy measures', 'Level 2 policy measures', 'Level 3 policy measures',
+    'Details of the measure', 'Reference', 'Termination Date',
+    'Modification of Parent Measure', 'Parent Measure', 'was_modified',
+)
+# Dialects whose surrogate keys reserve_ids draws from a sequence
+SEQUENCE_DIALECTS = ("postgresql", "duckdb")
+
+
+def parse_date(value: str) -> date | None:
+    return date.fromisoformat(value) if value else None
+
+
+def row_hash(row: Dict[str, str]) -> str:
+    """
+    Fingerprint of a source row, used to detect changed measures between loads.
+    """
+    return hashlib.md5("\x1f".join(row[col] for col in HASHED_COLUMNS).encode("utf-8")).hexdigest()
+
+
+def parse_row(row: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Normalise one CSV row into the column values written by the loaders.
+    """
+    return {
+        "source_id": int(row['ID']),
+        "row_hash": row_hash(row),
+        "iso3": row['Country ISO3'],
+        "country_name": row['Country Name'],
+        "income_level": row['Income Level'] or None,
+        "original_id": int(row['Original_ID']) if row['Original_ID'] else None,
+        "date": parse_date(row['Date']),
+        "termination_date": parse_date(row['Termination Date']),
+        "authority": row['Authority'] or None,
+        "details": row['Details of the measure'] or None,
+        "reference": row['Reference'] or None,
+        "was_modified": row['was_modified'] or None,
+        "modification_of_parent": row['Modification of Parent Measure'] or None,
+        "parent_measure": row['Parent Measure'] or None,
+        "policies": tuple(
+            (row[f'{level} policy measures'], level)
+            for level in POLICY_LEVELS
+            if row[f'{level} policy measures']
+        ),
+    }
+
+
+def read_batches(csv_path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Parse the CSV once, yielding lists of at most `batch_size` normalised rows.
+    """
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        while True:
+            batch = [parse_row(row) for row in islice(reader, batch_size)]
+            if not batch:
+                return
+            yield batch
+
+
+def reserve_ids(conn: Connection, table: Table, count: int) -> List[int]:
+    """
+    Reserve `count` surrogate keys for `table`.
+
+    On PostgreSQL the keys are drawn from the table's serial sequence, so
+    concurrent loaders never collide; DuckDB draws them from the sequence
+    behind the table's key default (see embedded.schema_metadata). Other
+    backends continue from MAX(id), so only one transaction at a time may
+    reserve and insert keys there.
+    """
+    if count <= 0:
+        return []
+    if conn.dialect.name == "postgresql":
+        sequence = conn.execute(
+            text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table.name}
+        ).scalar_one()
+        rows = conn.execute(
+            text("SELECT nextval(:sequence) FROM generate_series(1, :count)"),
+            {"sequence": sequence, "count": count}
+        )
+        return [r[0] for r in rows]
+    if conn.dialect.name == "duckdb":
+        rows = conn.execute(
+            text(f"SELECT nextval('{id_sequence(table.name)}') FROM range(:count)"), {"count": count}
+        )
+        return [r[0] for r in rows]
+    start = conn.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar_one() + 1
+    return list(range(start, start + count))
+
+
+def _copy_rows(conn: Connection, table: Table, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> None:
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buf
+        )
+    finally:
+        cursor.close()
+
+
+def write_rows(conn: Connection, table: Table, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> None:
+    """
+    Write `rows` into `table`, streaming through COPY FROM STDIN on psycopg2
+    and falling back to an executemany INSERT on other drivers.
+    """
+    if not rows:
+        return
+    if conn.dialect.driver == "psycopg2":
+        _copy_rows(conn, table, columns, rows)
+    else:
+        conn.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+
+
+def ensure_dimensions(conn: Connection, batch: List[Dict[str, Any]], cache: DimensionCache) -> None:
+    # Date partitions are created like dimension members, before any row needs
+    # them, and first, as they take the lock that orders concurrent writers
+    ensure_partitions(conn, {rec["date"] for rec in batch})
+    cache.ensure_countries(conn, {
+        rec["iso3"]: (rec["country_name"], rec["income_level"]) for rec in batch
+    })
+    cache.ensure_policies(conn, (key for rec in batch for key in rec["policies"]))
+
+
+def write_measure_children(
+    conn: Connection, measure_ids: Sequence[int], batch: List[Dict[str, Any]], cache: DimensionCache
+) -> None:
+    """
+    Write the date, detail, modification and policy link rows of `batch`
+    for the already existing measures `measure_ids`.
+    """
+    write_rows(conn, MeasureDate.__table__, ("measure_id", "date", "termination_date"), [
+        (measure_id, rec["date"], rec["termination_date"])
+        for measure_id, rec in zip(measure_ids, batch)
+    ])
+    write_rows(conn, MeasureDetail.__table__, ("measure_id", "authority", "details", "reference"), [
+        (measure_id, rec["authority"], rec["details"], rec["reference"])
+        for measure_id, rec in zip(measure_ids, batch)
+    ])
+    write_rows(conn, MeasureModification.__table__,
+               ("measure_id", "was_modified", "modification_of_parent", "parent_measure"), [
+        (measure_id, rec["was_modified"], rec["modification_of_parent"], rec["parent_measure"])
+        for measure_id, rec in zip(measure_ids, batch)
+    ])
+    write_rows(conn, MeasurePolicyLink.__table__, ("measure_id", "policy_measure_level_id"), [
+        (measure_id, cache.policy_id(*key))
+        for measure_id, rec in zip(measure_ids, batch)
+        for key in rec["policies"]
+    ])
+
+
+def write_batch(conn: Connection, batch: List[Dict[str, Any]], cache: DimensionCache) -> List[int]:
+    """
+    Insert `batch` as new measures and return their keys.
+    """
+    # New dimension members first, so every fact row below can resolve its keys
+    ensure_dimensions(conn, batch, cache)
+
+    # Facts: measure keys come from a sequence block, side tables use their defaults
+    measure_ids = reserve_ids(conn, Measure.__table__, len(batch))
+    write_rows(conn, Measure.__table__, ("id", "source_id", "original_id", "country_id", "row_hash"), [
+        (measure_id, rec["source_id"], rec["original_id"], cache.country_id(rec["iso3"]), rec["row_hash"])
+        for measure_id, rec in zip(measure_ids, batch)
+    ])
+    write_measure_children(conn, measure_ids, batch, cache)
+    return measure_ids
+
+
+def bulk_import_data(
+    csv_path: str = 'data/covid-fci-data-cleaned.csv',
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    bind: Engine = engine,
+) -> int:
+    """
+    Load the CSV in batches of `batch_size` rows in a single transaction.
+
+    Countries and policy levels are resolved in memory, measure keys are
+    assigned client-side and each table is written with one COPY per batch.
+    Returns the number of imported rows.
+    """
+    total = 0
+    with bind.begin() as conn:
+        cache = DimensionCache(conn)
+        with tqdm(desc="Importing data", unit="rows") as progress:
+            for batch in read_batches(csv_path, batch_size):
+                write_batch(conn, batch, cache)
+                total += len(batch)
+                progress.update(len(batch))
+        refresh_derived_data(conn)
+    log.info("Bulk import of %s complete: %d rows", csv_path, total)
+    print("Data import complete.")
+    return total
+
+
+if __name__ == "__main__":
+    bulk_import_data()
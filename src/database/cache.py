@@ -0,0 +1,176 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Hashable
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from constants import CACHE_MAX_ENTRIES, CACHE_REDIS_URL, CACHE_TTL_SECONDS, CACHE_VERSION_CHECK_SECONDS
+from src.database.version import current_data_version
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+_MISSING = object()
+
+
+def _normalise(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(_normalise(item) for item in value))
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def cache_key(fn: Callable, *args, **kwargs) -> tuple:
+    """
+    Key of a call: the function plus its arguments with unset filters dropped,
+    lists sorted and dates as ISO strings, so equivalent filters share an entry.
+    """
+    filters = tuple(sorted(
+        (name, _normalise(value)) for name, value in kwargs.items()
+        if value is not None and value != [] and value != ()
+    ))
+    return (f"{fn.__module__}.{fn.__qualname__}", tuple(_normalise(arg) for arg in args), filters)
+
+
+class RedisBackend:
+    """
+    Shared second-level store so several app processes reuse each other's results.
+    Eviction is left to the Redis server (expiry plus its maxmemory policy).
+    """
+
+    def __init__(self, url: str, ttl: float, prefix: str = "fci-cache"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("CACHE_REDIS_URL is set but the `redis` package is not installed") from e
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _name(self, version: int, key: tuple) -> str:
+        return f"{self.prefix}:{version}:{key!r}"
+
+    def get(self, version: int, key: tuple) -> Any:
+        payload = self.client.get(self._name(version, key))
+        if payload is None:
+            return _MISSING
+        stored_version, value = pickle.loads(payload)
+        return value if stored_version == version else _MISSING
+
+    def set(self, version: int, key: tuple, value: Any) -> None:
+        self.client.set(self._name(version, key), pickle.dumps((version, value)), ex=max(1, int(self.ttl)))
+
+
+def _shallow_copy(value: Any) -> Any:
+    # Results are row lists, frames or dicts of frames (dashboard panels);
+    # copying their data on every hit would cost as much as the query
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    if isinstance(value, dict):
+        return {key: _shallow_copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+class QueryCache:
+    """
+    In-process LRU cache of query results with a time-to-live per entry.
+
+    Entries belong to the data version current when they were computed and
+    are only returned while that version is current. The version is re-read
+    at most every `version_check_seconds`; when an ingest has bumped it, the
+    whole cache is dropped, and results still being computed for the old
+    version are not stored. Results are shared between
+    callers except for their containers: the lists, dicts and DataFrames
+    they get back are shallow copies, so adding to them (e.g. a column) is
+    safe, but values inside them must not be modified in place.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        ttl: float = CACHE_TTL_SECONDS,
+        version_check_seconds: float = CACHE_VERSION_CHECK_SECONDS,
+        shared: RedisBackend | None = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_check_seconds = version_check_seconds
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: int | None = None
+        self._version_checked_at = 0.0
+
+    def data_version(self, session: Session) -> int:
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked_at >= self.version_check_seconds:
+            version = current_data_version(session.connection())
+            with self._lock:
+                if version != self._version:
+                    if self._version is not None:
+                        log.info("Data version %d -> %d, dropping %d entries",
+                                 self._version, version, len(self._entries))
+                    self._entries.clear()
+                    self._version = version
+                self._version_checked_at = now
+        return self._version
+
+    def _get_local(self, version: int, key: tuple) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            entry_version, expires_at, value = entry
+            if entry_version != version or expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def _set_local(self, version: int, key: tuple, value: Any) -> None:
+        with self._lock:
+            # Computed before another thread saw a newer version and cleared the cache
+            if version != self._version:
+                return
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def call(self, session: Session, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Return fn(session, *args, **kwargs), computing it only on a cache miss.
+        """
+        version = self.data_version(session)
+        key = cache_key(fn, *args, **kwargs)
+        value = self._get_local(version, key)
+        if value is _MISSING and self.shared is not None:
+            value = self.shared.get(version, key)
+            if value is not _MISSING:
+                self._set_local(version, key, value)
+        if value is _MISSING:
+            self.misses += 1
+            value = fn(session, *args, **kwargs)
+            self._set_local(version, key, value)
+            if self.shared is not None:
+                self.shared.set(version, key, value)
+        else:
+            self.hits += 1
+        return _shallow_copy(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+
+query_cache = QueryCache(shared=RedisBackend(CACHE_REDIS_URL, CACHE_TTL_SECONDS) if CACHE_REDIS_URL else None)
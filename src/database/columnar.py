@@ -0,0 +1,304 @@
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from constants import IN_MEMORY_FILTER
+from src.database.criteria import as_list
+from src.database.model import Country, Measure, MeasureDate, MeasurePolicyLink, PolicyMeasureLevel
+from src.database.version import PerVersion
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Undated measures sort after every date, open-ended ones end after every date
+_NAT_LAST = np.iinfo(np.int64).max
+_OPEN_END = np.iinfo(np.int32).max
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def _day(value) -> np.datetime64:
+    return np.datetime64(value, "D")
+
+
+def _day_number(value) -> int:
+    return int(_day(value).astype(np.int64))
+
+
+@dataclass(frozen=True)
+class ColumnarSnapshot:
+    """
+    The filterable columns of every measure at one data version, as NumPy
+    arrays in start-date order (undated measures last), so a date range is
+    a slice found by binary search.
+
+    Countries are small integer codes with an inverted index (the positions
+    of each country's measures); a country with at least 1/32 of them also
+    has a bitmap, no larger than its positions and much faster to combine.
+    Every policy and every
+    level has a bitmap of the measures linked to it, packed eight measures
+    to a byte.
+    """
+    version: int
+    ids: np.ndarray  # int32
+    dates: np.ndarray  # datetime64[D], NaT when undated
+    ends: np.ndarray  # int32 day number of the last day in force, _OPEN_END when open-ended
+    dated: int  # measures with a date; they come first
+    countries: Dict[str, int]  # name -> code
+    country_positions: np.ndarray  # int32 positions grouped by country code, ascending within a country
+    country_offsets: np.ndarray  # country code c owns country_positions[offsets[c]:offsets[c + 1]]
+    country_bitmap_rows: np.ndarray  # row of each country code in country_bitmaps, -1 without one
+    country_bitmaps: np.ndarray  # uint8, packed
+    policy_names: np.ndarray
+    policy_bitmaps: np.ndarray  # uint8, one packed row per policy
+    level_names: np.ndarray
+    level_bitmaps: np.ndarray  # uint8, one packed row per level
+    by_id: np.ndarray  # int32 positions in id order, for pages
+    sorted_ids: np.ndarray  # ids[by_id]
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def _window(self, date_from, date_to, active_from, active_to) -> slice:
+        lo, hi = 0, self.size
+        if date_from or date_to or active_from or active_to:
+            hi = self.dated
+        dates = self.dates[:self.dated]
+        if date_from:
+            lo = int(np.searchsorted(dates, _day(date_from), "left"))
+        if date_to:
+            hi = int(np.searchsorted(dates, _day(date_to), "right"))
+        if active_to:
+            # In force by active_to means started by then
+            hi = min(hi, int(np.searchsorted(dates, _day(active_to), "right")))
+        return slice(lo, max(lo, hi))
+
+    def _country_mask(self, codes, window: slice) -> np.ndarray:
+        rows = self.country_bitmap_rows[codes]
+        if (rows >= 0).any():
+            mask = self._bitmap_mask(self.country_bitmaps, rows[rows >= 0], window)
+        else:
+            mask = np.zeros(window.stop - window.start, dtype=bool)
+        for code in np.asarray(codes, dtype=np.int64)[rows < 0]:
+            positions = self.country_positions[self.country_offsets[code]:self.country_offsets[code + 1]]
+            # Needles of the array's dtype, or NumPy converts the whole array
+            first, last = np.searchsorted(positions, np.array((window.start, window.stop), dtype=positions.dtype))
+            mask[positions[first:last] - window.start] = True
+        return mask
+
+    def _bitmap_mask(self, bitmaps: np.ndarray, rows: np.ndarray, window: slice) -> np.ndarray:
+        # Only the bytes covering the window are combined and unpacked
+        start, end = window.start // 8, -(-window.stop // 8)
+        packed = np.bitwise_or.reduce(bitmaps[rows, start:end], axis=0)
+        bits = np.unpackbits(packed, bitorder="little").view(bool)
+        return bits[window.start - start * 8:window.stop - start * 8]
+
+    def mask(
+        self,
+        country=None,
+        date_from=None,
+        date_to=None,
+        policy_type=None,
+        target_group=None,
+        level=None,
+        active_from=None,
+        active_to=None,
+        **_,
+    ):
+        """
+        (window, mask): the slice of the date-ordered arrays that the start
+        date range selects, and a boolean mask over it of the measures
+        matching every other filter, with the semantics of filter.filter_criteria.
+        """
+        window = self._window(date_from, date_to, active_from, active_to)
+        mask = np.ones(window.stop - window.start, dtype=bool)
+        if country:
+            codes = [self.countries[name] for name in as_list(country) if name in self.countries]
+            mask &= self._country_mask(codes, window)
+        for names, bitmaps, value in (
+            (self.policy_names, self.policy_bitmaps, policy_type),
+            (self.policy_names, self.policy_bitmaps, target_group),
+            (self.level_names, self.level_bitmaps, level),
+        ):
+            if value:
+                rows = np.flatnonzero(np.isin(names, as_list(value)))
+                if not len(rows):
+                    return window, np.zeros_like(mask)
+                mask &= self._bitmap_mask(bitmaps, rows, window)
+        if active_from:
+            # Still in force on active_from (see activity.active_between)
+            mask &= self.ends[window] >= _day_number(active_from)
+        return window, mask
+
+    def count(self, **filters) -> int:
+        _, mask = self.mask(**filters)
+        return int(np.count_nonzero(mask))
+
+    def page_ids(self, after_id, page_size: int, **filters) -> np.ndarray:
+        """
+        Keys of the `page_size` matching measures with the lowest ids above `after_id`, in order.
+        """
+        window, mask = self.mask(**filters)
+        matches = int(np.count_nonzero(mask))
+        if matches <= page_size * 64:
+            # Few matches: select them all
+            ids = self.ids[window][mask]
+            if after_id is not None:
+                ids = ids[ids > after_id]
+            if len(ids) > page_size:
+                ids = np.partition(ids, page_size - 1)[:page_size]
+            return np.sort(ids)
+        # Many matches: walk the measures in id order until the page is full
+        selected = np.zeros(self.size, dtype=bool)
+        selected[window] = mask
+        start = 0
+        if after_id is not None:
+            start = int(np.searchsorted(self.sorted_ids, self.sorted_ids.dtype.type(after_id), "right"))
+        step = max(page_size * 2 * self.size // matches, page_size)
+        pages = []
+        found = 0
+        while start < self.size and found < page_size:
+            hits = self.sorted_ids[start:start + step][selected[self.by_id[start:start + step]]]
+            pages.append(hits[:page_size - found])
+            found += len(pages[-1])
+            start += step
+        return np.concatenate(pages) if pages else np.empty(0, dtype=self.ids.dtype)
+
+
+def _grouped_bitmaps(positions: np.ndarray, groups: np.ndarray, group_count: int, size: int) -> np.ndarray:
+    """
+    One packed bitmap per group of the (position, group) pairs.
+    """
+    order = np.argsort(groups, kind="stable")
+    bounds = np.searchsorted(groups[order], np.arange(group_count + 1))
+    bitmaps = np.zeros((group_count, -(-size // 8)), dtype=np.uint8)
+    for group in range(group_count):
+        bits = np.zeros(bitmaps.shape[1] * 8, dtype=bool)
+        bits[positions[order[bounds[group]:bounds[group + 1]]]] = True
+        bitmaps[group] = np.packbits(bits, bitorder="little")
+    return bitmaps
+
+
+def day_array(values) -> np.ndarray:
+    """
+    Dates as a datetime64[D] array, None as NaT; much faster than letting NumPy convert the date objects.
+    """
+    nat = np.iinfo(np.int64).min
+    return np.array(
+        [nat if value is None else value.toordinal() - _EPOCH for value in values], dtype=np.int64
+    ).view("datetime64[D]")
+
+
+def _columns(result, width: int):
+    # Column tuples; NumPy is slow to convert Row objects directly
+    rows = result.all()
+    return tuple(zip(*rows)) if rows else ((),) * width
+
+
+def load_snapshot(conn: Connection, version: int) -> ColumnarSnapshot:
+    """
+    Read the measure, date, country and policy link columns into a ColumnarSnapshot.
+    """
+    started = time.perf_counter()
+    ids, country_ids, dates, terminations = _columns(conn.execute(
+        select(Measure.id, Measure.country_id, MeasureDate.date, MeasureDate.termination_date)
+        .outerjoin(MeasureDate, MeasureDate.measure_id == Measure.id)
+    ), 4)
+    ids = np.array(ids, dtype=np.int32)
+    dates = day_array(dates)
+    terminations = day_array(terminations)
+    # A termination before the start date ends the measure on its start date (activity.active_end)
+    ends = np.where(terminations < dates, dates, terminations)
+    ends = np.where(np.isnat(ends), _OPEN_END, ends.astype(np.int64)).astype(np.int32)
+
+    order_key = dates.view(np.int64).copy()
+    order_key[np.isnat(dates)] = _NAT_LAST
+    order = np.lexsort((ids, order_key))
+    ids, dates, ends = ids[order], dates[order], ends[order]
+    positions = np.zeros(int(ids.max()) + 1 if len(ids) else 0, dtype=np.int64)
+    positions[ids] = np.arange(len(ids))
+
+    country_rows = conn.execute(select(Country.id, Country.name)).all()
+    countries = {name: code for code, (_, name) in enumerate(country_rows)}
+    # Measures without a country get the code after the last country's
+    country_lookup = np.full(max((key for key, _ in country_rows), default=0) + 2, len(countries), dtype=np.int64)
+    country_lookup[[key for key, _ in country_rows]] = np.arange(len(country_rows))
+    country_codes = country_lookup[np.array([-1 if key is None else key for key in country_ids], dtype=np.int64)]
+    country_codes = country_codes[order]
+    by_country = np.argsort(country_codes, kind="stable")
+    country_offsets = np.searchsorted(country_codes[by_country], np.arange(len(countries) + 2))
+    # A bitmap takes size / 8 bytes, a position list 4 bytes per measure
+    dense = np.flatnonzero(np.diff(country_offsets)[:len(countries)] * 32 >= len(ids))
+    country_bitmap_rows = np.full(len(countries) + 1, -1, dtype=np.int64)
+    country_bitmap_rows[dense] = np.arange(len(dense))
+    in_dense = country_bitmap_rows[country_codes] >= 0
+
+    policy_rows = conn.execute(
+        select(PolicyMeasureLevel.id, PolicyMeasureLevel.name, PolicyMeasureLevel.level_type)
+    ).all()
+    policy_lookup = np.zeros(max((key for key, _, _ in policy_rows), default=0) + 1, dtype=np.int64)
+    policy_lookup[[key for key, _, _ in policy_rows]] = np.arange(len(policy_rows))
+    level_names = sorted({level for _, _, level in policy_rows if level is not None})
+    policy_levels = np.array(
+        [level_names.index(level) if level is not None else len(level_names) for _, _, level in policy_rows],
+        dtype=np.int64,
+    )
+    link_measures, link_policies = _columns(
+        conn.execute(select(MeasurePolicyLink.measure_id, MeasurePolicyLink.policy_measure_level_id)), 2
+    )
+    link_positions = positions[np.array(link_measures, dtype=np.int64)]
+    link_policies = policy_lookup[np.array(link_policies, dtype=np.int64)]
+
+    snapshot = ColumnarSnapshot(
+        version=version,
+        ids=ids,
+        dates=dates,
+        ends=ends,
+        dated=int(np.count_nonzero(~np.isnat(dates))),
+        countries=countries,
+        country_positions=by_country.astype(np.int32),
+        country_offsets=country_offsets,
+        country_bitmap_rows=country_bitmap_rows,
+        country_bitmaps=_grouped_bitmaps(
+            np.flatnonzero(in_dense), country_bitmap_rows[country_codes[in_dense]], len(dense), len(ids)
+        ),
+        policy_names=np.array([name for _, name, _ in policy_rows], dtype=object),
+        policy_bitmaps=_grouped_bitmaps(link_positions, link_policies, len(policy_rows), len(ids)),
+        level_names=np.array(level_names, dtype=object),
+        level_bitmaps=_grouped_bitmaps(
+            link_positions, policy_levels[link_policies], len(level_names) + 1, len(ids)
+        )[:len(level_names)],
+        by_id=np.argsort(ids).astype(np.int32),
+        sorted_ids=np.sort(ids),
+    )
+    log.info(
+        "Loaded columnar snapshot of %d measures (data version %d) in %.2f s",
+        snapshot.size, version, time.perf_counter() - started,
+    )
+    return snapshot
+
+
+class FilterEngine:
+    """
+    Answers filters in process from a ColumnarSnapshot of the measures,
+    reloaded whenever the data version changes.
+    """
+
+    def __init__(self):
+        self._snapshot = PerVersion(load_snapshot)
+
+    def applies(self, filters) -> bool:
+        # Full-text search needs the database
+        return IN_MEMORY_FILTER and not filters.get("search")
+
+    def snapshot(self, session: Session) -> ColumnarSnapshot:
+        return self._snapshot.get(session.connection())
+
+
+filter_engine = FilterEngine()
@@ -1,5 +1,16 @@
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from sqlalchemy import event
 from sqlalchemy.engine import URL, create_engine
-from constants import PG_USERNAME, PG_PASSWORD, PG_HOST, PG_PORT, PG_DATABASE
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+from constants import (
+    PG_USERNAME, PG_PASSWORD, PG_HOST, PG_PORT, PG_DATABASE, DB_BACKEND, DB_PATH,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_PGBOUNCER,
+    QUERY_METRICS
+)
+from src.database.instrumentation import instrument_engine
 from src.utils.log import get_logger
 
 logger = get_logger("sqlalchemy")
@@ -13,4 +24,107 @@ connect_url = URL.create(
     database=PG_DATABASE
 )
 
-engine = create_engine(connect_url, echo=False)
\ No newline at end of file
+EMBEDDED_BACKENDS = ("duckdb", "sqlite")
+
+
+def backend_url(backend: str = DB_BACKEND) -> URL:
+    """
+    Connection URL for `backend`: the configured PostgreSQL server, or an
+    embedded database file (DB_PATH, default data/fci.duckdb or data/fci.sqlite).
+    """
+    if backend == "postgres":
+        return connect_url
+    if backend in EMBEDDED_BACKENDS:
+        return URL.create(backend, database=DB_PATH or f"data/fci.{backend}")
+    raise ValueError(f"Unknown DB_BACKEND {backend!r}, expected postgres, duckdb or sqlite")
+
+
+def pool_options(pgbouncer: bool = DB_PGBOUNCER) -> Dict:
+    """
+    create_engine keyword arguments for the configured pool.
+
+    With PgBouncer in front of PostgreSQL, PgBouncer owns the pool: SQLAlchemy
+    keeps no idle connections of its own and every checkout is a fresh
+    (cheap) connection to PgBouncer, so the server connection count stays at
+    PgBouncer's limit however many app processes run.
+    """
+    if pgbouncer:
+        return dict(poolclass=NullPool)
+    return dict(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_use_lifo=True,
+    )
+
+
+if DB_BACKEND == "postgres":
+    engine = create_engine(connect_url, echo=False, **pool_options())
+else:
+    # Embedded databases live in-process; the default pool is all they need
+    engine = create_engine(backend_url(), echo=False)
+
+if QUERY_METRICS:
+    instrument_engine(engine)
+
+# Sessions for request-scoped work; objects stay readable after the session closes
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+
+_pool_events = {"connects": 0, "checkouts": 0, "checkins": 0, "invalidated": 0}
+
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    _pool_events["connects"] += 1
+
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _pool_events["checkouts"] += 1
+
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    _pool_events["checkins"] += 1
+
+
+@event.listens_for(engine, "invalidate")
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    _pool_events["invalidated"] += 1
+    logger.warning(f"Pooled connection invalidated: {exception}")
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """
+    Session for one unit of work (e.g. one Streamlit rerun): committed on
+    success, rolled back on error, and always closed so its connection goes
+    back to the pool. No connection is checked out until the first query.
+    """
+    session = SessionLocal()
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def pool_status() -> Dict:
+    """
+    Current pool occupancy and lifetime connection counters.
+    """
+    pool = engine.pool
+    status = {"pool": type(pool).__name__, **_pool_events}
+    if hasattr(pool, "checkedout"):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return status
@@ -1,11 +1,14 @@
-from src.database.model import Base
+from src.database.embedded import schema_metadata
 from src.database.connection import engine
+from src.database.migrate import migrate
 
 def create_database():
     """
-    Create the database tables defined in the Base metadata.
+    Create the database tables defined in the Base metadata and bring
+    tables created by older versions of the models up to date.
     """
-    Base.metadata.create_all(engine)
+    schema_metadata(engine).create_all(engine)
+    migrate(engine)
     print("Database tables created successfully.")
 
 if __name__ == "__main__":
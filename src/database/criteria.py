@@ -0,0 +1,24 @@
+from typing import Iterable, List
+
+from sqlalchemy import or_
+
+
+# Helpers shared by the modules that answer filters outside filter.py
+# (rollups, measure_facts, the columnar snapshot and the time cube).
+
+def as_list(value) -> List:
+    """
+    A filter value as a list: filters take a single name or a list of names.
+    """
+    return value if isinstance(value, list) else [value]
+
+
+def date_condition(column, dates: Iterable):
+    """
+    `column` is one of `dates`; None among them matches undated rows.
+    """
+    dates = list(dates)
+    conditions = [column.in_([d for d in dates if d is not None])]
+    if None in dates:
+        conditions.append(column.is_(None))
+    return or_(*conditions)
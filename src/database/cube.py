@@ -0,0 +1,156 @@
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, FrozenSet, List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from constants import TIME_CUBE
+from src.database.columnar import day_array
+from src.database.criteria import as_list
+from src.database.model import Country, MeasureCountRollup, PolicyMeasureLevel
+from src.database.rollup import rollups_ready
+from src.database.version import PerVersion
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Filters the cube can answer; policy filters only with Level 1 names
+CUBE_FILTERS = {"country", "date_from", "date_to", "policy_type", "target_group"}
+# 1970-01-01 was a Thursday: shifting day numbers by 3 makes weeks start on Monday
+_WEEK_SHIFT = 3
+
+
+def bucket_days(days: np.ndarray, interval: str) -> np.ndarray:
+    """
+    First day of the "day", "week" (Monday) or "month" containing each of `days`,
+    like aggregate.date_bucket.
+    """
+    if interval == "week":
+        return days - (days.astype(np.int64) + _WEEK_SHIFT) % 7
+    if interval == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    return days
+
+
+@dataclass(frozen=True)
+class TimeCube:
+    """
+    The dated rows of rollup_measure_counts at one data version, as NumPy
+    arrays in date order: a country, date and Level 1 policy filter is a
+    slice plus a mask, and weeks and months are rolled up from the days.
+    `ready` is False while the rollups have not been built.
+    """
+    ready: bool
+    days: np.ndarray
+    country_ids: np.ndarray
+    level_1_ids: np.ndarray
+    counts: np.ndarray
+    countries: Dict[str, int]
+    level_1: Dict[str, List[int]]
+    other_levels: FrozenSet[str]
+
+    def _is_level_1(self, names) -> bool:
+        # A measure has at most one Level 1 policy, which the rollup keeps,
+        # so only Level 1 names can be matched exactly
+        return all(name in self.level_1 and name not in self.other_levels for name in as_list(names))
+
+    def answers(self, filters) -> bool:
+        if not self.ready or any(value and key not in CUBE_FILTERS for key, value in filters.items()):
+            return False
+        return all(self._is_level_1(filters[key]) for key in ("policy_type", "target_group") if filters.get(key))
+
+    def _level_1_keys(self, names) -> List[int]:
+        return [key for name in as_list(names) for key in self.level_1[name]]
+
+    def measures_over_time(self, interval="week", country=None, date_from=None, date_to=None,
+                           policy_type=None, target_group=None, **unset) -> pd.DataFrame:
+        """
+        Same frame as aggregate.measures_over_time for filters the cube answers.
+        """
+        lo = int(np.searchsorted(self.days, np.datetime64(date_from, "D"), "left")) if date_from else 0
+        hi = int(np.searchsorted(self.days, np.datetime64(date_to, "D"), "right")) if date_to else len(self.days)
+        days, counts = self.days[lo:hi], self.counts[lo:hi]
+        mask = np.ones(len(days), dtype=bool)
+        if country:
+            keys = [self.countries[name] for name in as_list(country) if name in self.countries]
+            mask &= np.isin(self.country_ids[lo:hi], keys)
+        for names in (policy_type, target_group):
+            if names:
+                mask &= np.isin(self.level_1_ids[lo:hi], self._level_1_keys(names))
+        buckets = bucket_days(days[mask], interval)
+        counts = counts[mask]
+        # Buckets come out sorted, so each one is a run
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]]) if len(buckets) else np.array([], int)
+        return pd.DataFrame({
+            "interval": pd.to_datetime(buckets[starts]),
+            "measure_count": np.add.reduceat(counts, starts) if len(starts) else np.array([], np.int64),
+        })
+
+
+def load_cube(conn: Connection, version: int) -> TimeCube:
+    """
+    Read the dated rows of rollup_measure_counts and the policy names into a TimeCube.
+    """
+    if not rollups_ready(conn):
+        empty = np.array([], dtype=np.int64)
+        return TimeCube(False, empty.view("datetime64[D]"), empty, empty, empty, {}, {}, frozenset())
+    started = time.perf_counter()
+    rows = conn.execute(
+        select(MeasureCountRollup.date, MeasureCountRollup.country_id, MeasureCountRollup.level_1_id,
+               MeasureCountRollup.measure_count)
+        .where(MeasureCountRollup.date.is_not(None))
+        .order_by(MeasureCountRollup.date)
+    ).all()
+    days, country_ids, level_1_ids, counts = tuple(zip(*rows)) if rows else ((),) * 4
+    level_1: Dict[str, List[int]] = {}
+    other_levels = set()
+    for key, name, level_type in conn.execute(
+        select(PolicyMeasureLevel.id, PolicyMeasureLevel.name, PolicyMeasureLevel.level_type)
+    ):
+        if level_type == "Level 1":
+            level_1.setdefault(name, []).append(key)
+        else:
+            other_levels.add(name)
+    cube = TimeCube(
+        ready=True,
+        days=day_array(days),
+        country_ids=np.array([-1 if key is None else key for key in country_ids], dtype=np.int32),
+        level_1_ids=np.array([-1 if key is None else key for key in level_1_ids], dtype=np.int32),
+        counts=np.array(counts, dtype=np.int64),
+        countries=dict(conn.execute(select(Country.name, Country.id)).all()),
+        level_1=level_1,
+        other_levels=frozenset(other_levels),
+    )
+    log.info("Time cube of version %d loaded: %d rows in %.2fs", version, len(rows), time.perf_counter() - started)
+    return cube
+
+
+_cube = PerVersion(load_cube)
+
+
+def cube_for(session: Session, filters) -> TimeCube | None:
+    """
+    The TimeCube of the current data version when it can answer `filters`,
+    else None (disabled, rollups not built, or a filter it does not hold).
+    """
+    if not TIME_CUBE:
+        return None
+    cube = _cube.get(session.connection())
+    return cube if cube.answers(filters) else None
+
+
+if __name__ == "__main__":
+    from src.database.connection import session_scope
+
+    with session_scope() as session:
+        cube = cube_for(session, {})
+        for interval in ("day", "week", "month"):
+            started = time.perf_counter()
+            df = cube.measures_over_time(interval, date_from=date(2020, 1, 1), date_to=date(2020, 12, 31))
+            print(f"{interval}: {len(df)} buckets in {(time.perf_counter() - started) * 1000:.1f} ms")
+        print(df.head())
@@ -3,14 +3,22 @@ from datetime import datetime
 from typing import Any, Dict
 from sqlalchemy.orm import Session
 
+from src.database.bulk_insert import row_hash
 from src.database.connection import engine
+from src.database.dimension_cache import DimensionCache
+from src.database.refresh import refresh_derived_data
 from src.database.model import (
     Country, Measure, MeasureDate, MeasureDetail,
     MeasureModification, PolicyMeasureLevel, MeasurePolicyLink
 )
 from tqdm import tqdm
 
-def get_or_create_country(session: Session, row: Dict[str, Any]) -> Country:
+def get_or_create_country(session: Session, row: Dict[str, Any], cache: DimensionCache | None = None) -> Country:
+    if cache is not None:
+        cache.ensure_countries(session.connection(), {
+            row['Country ISO3']: (row['Country Name'], row['Income Level'] or None)
+        })
+        return session.get(Country, cache.country_id(row['Country ISO3']))
     country = session.query(Country).filter_by(iso3=row['Country ISO3']).first()
     if not country:
         country = Country(
@@ -22,9 +30,14 @@ def get_or_create_country(session: Session, row: Dict[str, Any]) -> Country:
         session.flush()
     return country
 
-def get_or_create_policy(session: Session, level: str, name: str) -> PolicyMeasureLevel | None:
+def get_or_create_policy(
+    session: Session, level: str, name: str, cache: DimensionCache | None = None
+) -> PolicyMeasureLevel | None:
     if not name:
         return None
+    if cache is not None:
+        cache.ensure_policies(session.connection(), [(name, level)])
+        return session.get(PolicyMeasureLevel, cache.policy_id(name, level))
     policy = session.query(PolicyMeasureLevel).filter_by(name=name, level_type=level).first()
     if not policy:
         policy = PolicyMeasureLevel(name=name, level_type=level)
@@ -35,17 +48,19 @@ def get_or_create_policy(session: Session, level: str, name: str) -> PolicyMeasu
 def import_data(session: Session, csv_path: str = 'sources/covid-fci-data-cleaned.csv') -> None:
     with open(csv_path, newline='', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
+        cache = DimensionCache(session.connection())
         for row in tqdm(reader, desc="Importing data", unit="rows"):
             # Country
-            country = get_or_create_country(session, row)
+            country = get_or_create_country(session, row, cache)
 
             # Measure
             measure = Measure(
+                source_id=row['ID'],
                 original_id=row['Original_ID'],
-                country=country
+                country=country,
+                row_hash=row_hash(row)
             )
             session.add(measure)
-            session.flush()
 
             # MeasureDate
             date = datetime.strptime(row['Date'], "%Y-%m-%d").date() if row['Date'] else None
@@ -81,7 +96,7 @@ def import_data(session: Session, csv_path: str = 'sources/covid-fci-data-cleane
             # Policy Levels (up to 3)
             for level in [1, 2, 3]:
                 col = f'Level {level} policy measures'
-                policy = get_or_create_policy(session, f'Level {level}', row[col])
+                policy = get_or_create_policy(session, f'Level {level}', row[col], cache)
                 if policy:
                     mpl = MeasurePolicyLink(
                         measure=measure,
@@ -89,6 +104,8 @@ def import_data(session: Session, csv_path: str = 'sources/covid-fci-data-cleane
                     )
                     session.add(mpl)
 
+        session.flush()
+        refresh_derived_data(session.connection())
         session.commit()
         print("Data import complete.")
 
@@ -0,0 +1,89 @@
+from typing import Dict, Iterable, Mapping, Tuple
+
+from sqlalchemy import Table, select, tuple_
+from sqlalchemy.engine import Connection
+
+from src.database.model import Country, PolicyMeasureLevel
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+PolicyKey = Tuple[str, str]
+
+
+def insert_ignoring_conflicts(conn: Connection, table: Table):
+    """
+    INSERT statement for `table` that skips rows violating a unique constraint.
+    """
+    if conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif conn.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return table.insert()
+    return insert(table).on_conflict_do_nothing()
+
+
+class DimensionCache:
+    """
+    In-memory lookup of country and policy level keys for ingest.
+
+    The cache is pre-warmed from the `countries` and `policy_measure_levels`
+    tables and only goes back to the database for members it has not seen.
+    Misses are inserted in one statement per batch with ON CONFLICT DO NOTHING
+    and then re-read, so an importer running concurrently that inserted the
+    same member first simply hands us its key. Members are inserted in key
+    order so that concurrent importers lock them in the same order.
+    """
+
+    def __init__(self, conn: Connection):
+        self.countries: Dict[str, int] = {}
+        self.policies: Dict[PolicyKey, int] = {}
+        self.warm(conn)
+
+    def warm(self, conn: Connection) -> None:
+        self.countries = dict(conn.execute(select(Country.iso3, Country.id)).all())
+        self.policies = {
+            (name, level_type): policy_id
+            for name, level_type, policy_id in conn.execute(
+                select(PolicyMeasureLevel.name, PolicyMeasureLevel.level_type, PolicyMeasureLevel.id)
+            )
+        }
+        log.info("Dimension cache warmed: %d countries, %d policy levels", len(self.countries), len(self.policies))
+
+    def ensure_countries(self, conn: Connection, members: Mapping[str, Tuple[str, str | None]]) -> None:
+        """
+        Make sure every iso3 in `members` (iso3 -> (name, income_level)) has a key.
+        """
+        missing = {iso3: attrs for iso3, attrs in members.items() if iso3 not in self.countries}
+        if not missing:
+            return
+        conn.execute(insert_ignoring_conflicts(conn, Country.__table__), [
+            {"iso3": iso3, "name": name, "income_level": income_level}
+            for iso3, (name, income_level) in sorted(missing.items())
+        ])
+        self.countries.update(conn.execute(
+            select(Country.iso3, Country.id).where(Country.iso3.in_(list(missing)))
+        ).all())
+
+    def ensure_policies(self, conn: Connection, keys: Iterable[PolicyKey]) -> None:
+        """
+        Make sure every (name, level_type) pair in `keys` has a key.
+        """
+        missing = sorted({key for key in keys if key not in self.policies})
+        if not missing:
+            return
+        conn.execute(insert_ignoring_conflicts(conn, PolicyMeasureLevel.__table__), [
+            {"name": name, "level_type": level_type} for name, level_type in missing
+        ])
+        rows = conn.execute(
+            select(PolicyMeasureLevel.name, PolicyMeasureLevel.level_type, PolicyMeasureLevel.id)
+            .where(tuple_(PolicyMeasureLevel.name, PolicyMeasureLevel.level_type).in_(missing))
+        )
+        self.policies.update({(name, level_type): policy_id for name, level_type, policy_id in rows})
+
+    def country_id(self, iso3: str) -> int:
+        return self.countries[iso3]
+
+    def policy_id(self, name: str, level_type: str) -> int:
+        return self.policies[(name, level_type)]
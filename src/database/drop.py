@@ -1,7 +1,13 @@
 from src.database.connection import engine
+from src.database.embedded import schema_metadata
 from sqlalchemy import inspect, text
 
 def drop_all_tables():
+    if engine.dialect.name != "postgresql":
+        # Embedded backends: the schema is exactly the model's
+        schema_metadata(engine).drop_all(engine)
+        print("All tables dropped successfully.")
+        return
     inspector = inspect(engine)
     with engine.connect() as conn:
         trans = conn.begin()
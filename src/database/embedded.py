@@ -0,0 +1,64 @@
+from sqlalchemy import ForeignKeyConstraint, Integer, MetaData, Sequence, UniqueConstraint, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import DefaultClause
+
+from src.database.connection import engine
+from src.database.model import Base
+
+
+# Unique columns that are written once and never updated or deleted and
+# re-added in one transaction, so DuckDB can keep checking them
+WRITE_ONCE_UNIQUE = {("measures", "source_id")}
+
+
+def id_sequence(table_name: str) -> str:
+    return f"{table_name}_id_seq"
+
+
+def _surrogate_key(table):
+    """
+    The single integer primary key of `table`, or None (e.g. composite keys).
+    """
+    keys = list(table.primary_key.columns)
+    if len(keys) == 1 and isinstance(keys[0].type, Integer) and keys[0].autoincrement in (True, "auto"):
+        return keys[0]
+    return None
+
+
+def schema_metadata(bind: Engine = engine) -> MetaData:
+    """
+    Table definitions from model.py as `bind` should create them.
+
+    DuckDB has no SERIAL/autoincrement columns, so its copy of the schema
+    draws every surrogate key from a `<table>_id_seq` sequence; the queries
+    themselves still use the model classes, which refer to the same tables.
+    The copy also leaves out foreign keys and unique constraints other than
+    the primary key. DuckDB checks foreign keys against the state at
+    transaction start, so an ingest could not delete a measure after
+    deleting its children, and it runs an UPDATE of an indexed column as a
+    delete plus insert that trips its own unique checks. The loaders keep
+    those columns unique themselves, except for WRITE_ONCE_UNIQUE ones,
+    which keep their unique index so that importing a second time fails
+    instead of duplicating every measure. PostgreSQL and SQLite use the
+    model metadata as is.
+    """
+    if bind.dialect.name != "duckdb":
+        return Base.metadata
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.constraints):
+            if isinstance(constraint, (ForeignKeyConstraint, UniqueConstraint)):
+                copy.constraints.discard(constraint)
+        for column in copy.columns:
+            column.unique = column.unique and (copy.name, column.name) in WRITE_ONCE_UNIQUE
+        for index in copy.indexes:
+            index.unique = index.unique and all(
+                (copy.name, column.name) in WRITE_ONCE_UNIQUE for column in index.columns
+            )
+        key = _surrogate_key(copy)
+        if key is not None:
+            sequence = Sequence(id_sequence(copy.name), metadata=metadata)
+            key.server_default = DefaultClause(text(f"nextval('{sequence.name}')"))
+            key.autoincrement = False
+    return metadata
@@ -0,0 +1,109 @@
+from datetime import date
+from typing import Any, Dict, Iterator, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from src.database.connection import engine
+from src.database.filter import build_filter_query, count_statement, current_fact_codes, page_statement
+from src.database.partition import PARTITIONED_TABLES, is_partitioned, partition_parents, window_partitions
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Tables that grow with the number of measures; scanning them in full is what
+# the indexes in model.py are there to avoid
+FACT_TABLES = (
+    "measures", "measure_dates", "measure_details", "measure_modifications", "measure_policy_links",
+    "measure_facts",
+)
+
+
+def explain(conn: Connection, stmt, analyze: bool = False) -> Dict[str, Any]:
+    """
+    Return the root node of the PostgreSQL JSON plan for `stmt`.
+    """
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    plan = conn.exec_driver_sql(f"EXPLAIN ({options}) {compiled}", compiled.params).scalar_one()
+    return plan[0]["Plan"]
+
+
+def plan_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def seq_scanned_tables(plan: Dict[str, Any], parents: Dict[str, str] | None = None) -> List[str]:
+    # A scan of a partition counts as one of its parent table
+    parents = parents or {}
+    tables = (
+        parents.get(node.get("Relation Name"), node.get("Relation Name"))
+        for node in plan_nodes(plan) if node["Node Type"] == "Seq Scan"
+    )
+    return sorted({table for table in tables if table in FACT_TABLES})
+
+
+def scanned_partitions(plan: Dict[str, Any], parents: Dict[str, str]) -> List[str]:
+    return sorted({node["Relation Name"] for node in plan_nodes(plan) if node.get("Relation Name") in parents})
+
+
+def check_filter_indexes(session: Session, **filters) -> List[str]:
+    """
+    EXPLAIN the filter query for `filters` with sequential scans disabled and
+    return the fact tables the planner still has to scan in full, i.e. the
+    ones for which no usable index exists. An empty list means every join and
+    filter of the query can be answered from an index.
+
+    On small tables the planner legitimately prefers sequential scans, so the
+    check forces index paths instead of judging the default plan.
+    """
+    stmt = build_filter_query(session, **filters).statement
+    # Separate connection, so the planner setting never leaks into the session
+    with session.get_bind().connect() as conn:
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = explain(conn, stmt)
+        missing = seq_scanned_tables(plan, partition_parents(conn))
+        conn.rollback()
+    log.info("Index check for %s: seq scans on %s", filters, missing or "none")
+    return missing
+
+
+def check_partition_pruning(session: Session, **filters) -> List[str]:
+    """
+    EXPLAIN the count, first page and full filter queries for `filters` and
+    return the partitions they read outside the date window of the filters.
+    An empty list means the planner pruned every other partition.
+    """
+    conn = session.connection()
+    parents = partition_parents(conn)
+    expected = set().union(*(
+        window_partitions(conn, table, filters.get("date_from"), filters.get("date_to"))
+        for table in PARTITIONED_TABLES if is_partitioned(conn, table)
+    ))
+    codes = current_fact_codes(session)
+    statements = (
+        count_statement(codes, **filters), page_statement(codes, **filters),
+        build_filter_query(session, **filters).statement,
+    )
+    extra = sorted({
+        name for stmt in statements for name in scanned_partitions(explain(conn, stmt), parents)
+    } - expected)
+    log.info("Partition check for %s: extra partitions read %s", filters, extra or "none")
+    return extra
+
+
+if __name__ == "__main__":
+    with Session(engine) as session:
+        missing = check_filter_indexes(
+            session, country="China", date_from=date(2020, 1, 1), date_to=date(2020, 2, 29)
+        )
+        if missing:
+            print(f"Filter query falls back to sequential scans on: {', '.join(missing)}")
+        else:
+            print("Filter query is fully index-backed.")
+        if partition_parents(session.connection()):
+            extra = check_partition_pruning(session, date_from=date(2020, 1, 1), date_to=date(2020, 2, 29))
+            print(f"Partitions read outside the window: {', '.join(extra) or 'none'}")
@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from src.database.connection import session_scope
+from src.database.filter import DEFAULT_PAGE_SIZE, iter_filtered_measure_rows
+from src.database.version import current_data_version
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+FORMATS = {"parquet": "parquet", "arrow": "ipc"}
+PARTITIONS = ("none", "country", "month")
+MANIFEST = "_snapshot.json"
+
+# Denormalised measure view, one row per measure (the fields of filter.MeasureRow)
+SNAPSHOT_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("country", pa.string()),
+    ("iso3", pa.string()),
+    ("date", pa.date32()),
+    ("termination_date", pa.date32()),
+    ("authority", pa.string()),
+    ("details", pa.string()),
+    ("policy_type", pa.list_(pa.string())),
+    ("level", pa.list_(pa.string())),
+])
+
+
+def partition_by_key(partition_by: str) -> str:
+    return "iso3" if partition_by == "country" else partition_by
+
+
+def _partition_value(row, partition_by: str) -> str | None:
+    if partition_by == "country":
+        return row.iso3 or "unknown"
+    if partition_by == "month":
+        return row.date.strftime("%Y-%m") if row.date else "undated"
+    return None
+
+
+class _PartitionWriter:
+    """
+    Buffers rows of one partition and appends them to its file a batch at a time.
+    """
+
+    def __init__(self, path: str, file_format: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if file_format == "parquet":
+            self.writer = pq.ParquetWriter(path, SNAPSHOT_SCHEMA, compression="zstd")
+        else:
+            self.sink = pa.OSFile(path, "wb")
+            self.writer = ipc.new_file(self.sink, SNAPSHOT_SCHEMA)
+        self.rows: List[Any] = []
+        self.count = 0
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        columns = list(zip(*self.rows))
+        self.writer.write_batch(pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, SNAPSHOT_SCHEMA)],
+            schema=SNAPSHOT_SCHEMA,
+        ))
+        self.count += len(self.rows)
+        self.rows = []
+
+    def close(self) -> None:
+        self.flush()
+        self.writer.close()
+        if hasattr(self, "sink"):
+            self.sink.close()
+
+
+def export_snapshot(
+    out_dir: str,
+    file_format: str = "parquet",
+    partition_by: str = "none",
+    batch_size: int = DEFAULT_PAGE_SIZE,
+    overwrite: bool = False,
+    **filters,
+) -> Dict[str, Any]:
+    """
+    Write the measures matching `filters` (all of them by default) to `out_dir`
+    as Parquet or Arrow IPC files, hive-partitioned by country (iso3=...) or
+    month (month=YYYY-MM) if requested.
+
+    Rows are streamed from a server-side cursor and written `batch_size` at a
+    time per partition, so memory stays bounded whatever the result size. The
+    export reads from one snapshot (REPEATABLE READ on PostgreSQL) and records
+    its data version, filters and row count in `_snapshot.json`.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format {file_format!r}, expected one of {sorted(FORMATS)}")
+    if partition_by not in PARTITIONS:
+        raise ValueError(f"Unknown partitioning {partition_by!r}, expected one of {PARTITIONS}")
+    if os.path.exists(out_dir) and os.listdir(out_dir):
+        if not overwrite:
+            raise FileExistsError(f"{out_dir} is not empty; pass overwrite=True to replace it")
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    extension = "parquet" if file_format == "parquet" else "arrow"
+    key = partition_by_key(partition_by)
+    writers: Dict[str | None, _PartitionWriter] = {}
+    with session_scope() as session:
+        if session.get_bind().dialect.name == "postgresql":
+            # SQLite and DuckDB reject this level; their transactions are serializable or snapshot reads
+            session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        version = current_data_version(session.connection())
+        try:
+            for row in iter_filtered_measure_rows(session, batch_size=batch_size, **filters):
+                value = _partition_value(row, partition_by)
+                writer = writers.get(value)
+                if writer is None:
+                    directory = out_dir if value is None else os.path.join(out_dir, f"{key}={value}")
+                    writer = writers[value] = _PartitionWriter(os.path.join(directory, f"part-0.{extension}"), file_format)
+                writer.rows.append(row)
+                if len(writer.rows) >= batch_size:
+                    writer.flush()
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+    manifest = {
+        "format": file_format,
+        "partition_by": partition_by,
+        "data_version": version,
+        "rows": sum(writer.count for writer in writers.values()),
+        "partitions": len(writers),
+        "filters": {name: value for name, value in filters.items() if value},
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    log.info("Exported %d measures to %s (%s, %d partitions)",
+             manifest["rows"], out_dir, file_format, manifest["partitions"])
+    return manifest
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def open_snapshot(path: str) -> ds.Dataset:
+    """
+    Dataset over a snapshot written by export_snapshot. Files are memory-mapped,
+    so only the columns and row groups actually read are paged in.
+    """
+    manifest = read_manifest(path)
+    partitioning = None
+    if manifest["partition_by"] != "none":
+        partitioning = ds.partitioning(
+            pa.schema([(partition_by_key(manifest["partition_by"]), pa.string())]), flavor="hive"
+        )
+    return ds.dataset(
+        path,
+        format=FORMATS[manifest["format"]],
+        partitioning=partitioning,
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def read_snapshot(path: str, columns: List[str] | None = None, filter: ds.Expression | None = None) -> pd.DataFrame:
+    """
+    Load a snapshot (optionally only some columns, or rows matching a pyarrow
+    expression such as `ds.field("iso3") == "POL"`) as a DataFrame.
+    """
+    return open_snapshot(path).to_table(columns=columns, filter=filter).to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the measures to a columnar snapshot.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--partition-by", choices=PARTITIONS, default="none")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    manifest = export_snapshot(args.out_dir, args.format, args.partition_by, args.batch_size, args.overwrite)
+    print(f"Exported {manifest['rows']} measures to {args.out_dir}.")
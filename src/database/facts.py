@@ -0,0 +1,235 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import (
+    Column, Date, Integer, MetaData, SmallInteger, String, Table, delete, func, literal, select, text
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.engine import Connection
+
+from constants import MEASURE_FACTS
+from src.database.activity import active_between
+from src.database.criteria import as_list, date_condition
+from src.database.model import Country, Measure, MeasureDate, MeasureDetail, MeasurePolicyLink, PolicyMeasureLevel
+from src.database.search import matches_search
+from src.database.version import PerVersion, built_version, bump_data_version, mark_built
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Read model of the filter: one narrow row per measure with everything the
+# filters test, so a filter is answered from a single table. Countries and
+# authorities are small integer codes and the policy links an array of
+# policy_measure_levels keys. PostgreSQL only (integer arrays, GIN), so like
+# the search column it is created by migrate.py rather than model.py.
+FACTS_MIGRATIONS = [
+    "CREATE TABLE IF NOT EXISTS authority_codes ("
+    "id SMALLSERIAL PRIMARY KEY, name VARCHAR NOT NULL UNIQUE)",
+    # Fixed-width columns first, so rows pack without alignment padding
+    "CREATE TABLE IF NOT EXISTS measure_facts ("
+    "measure_id INTEGER PRIMARY KEY, date DATE, termination_date DATE, "
+    "country_id SMALLINT, authority_id SMALLINT, policy_ids INTEGER[] NOT NULL DEFAULT '{}')",
+    "CREATE INDEX IF NOT EXISTS ix_measure_facts_date ON measure_facts (date)",
+    "CREATE INDEX IF NOT EXISTS ix_measure_facts_country_id_date ON measure_facts (country_id, date)",
+    "CREATE INDEX IF NOT EXISTS ix_measure_facts_policy_ids ON measure_facts USING gin (policy_ids)",
+]
+# Name of measure_facts in derived_builds
+FACTS_BUILD = "measure_facts"
+
+facts_metadata = MetaData()
+
+authority_codes = Table(
+    "authority_codes", facts_metadata,
+    Column("id", SmallInteger, primary_key=True),
+    Column("name", String, nullable=False, unique=True),
+)
+
+measure_facts = Table(
+    "measure_facts", facts_metadata,
+    Column("measure_id", Integer, primary_key=True, autoincrement=False),
+    Column("date", Date),
+    Column("termination_date", Date),
+    Column("country_id", SmallInteger),
+    Column("authority_id", SmallInteger),
+    Column("policy_ids", ARRAY(Integer), nullable=False),
+)
+
+
+def _facts_select(dates=None):
+    policy_ids = (
+        select(func.array_agg(MeasurePolicyLink.policy_measure_level_id))
+        .where(MeasurePolicyLink.measure_id == Measure.id)
+        .correlate(Measure)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(
+            Measure.id, MeasureDate.date, MeasureDate.termination_date, Measure.country_id,
+            authority_codes.c.id, func.coalesce(policy_ids, text("'{}'::integer[]")),
+        )
+        .select_from(Measure)
+        .outerjoin(MeasureDate, MeasureDate.measure_id == Measure.id)
+        .outerjoin(MeasureDetail, MeasureDetail.measure_id == Measure.id)
+        .outerjoin(authority_codes, authority_codes.c.name == MeasureDetail.authority)
+    )
+    if dates is not None:
+        stmt = stmt.where(date_condition(MeasureDate.date, dates))
+    return stmt
+
+
+def refresh_facts(conn: Connection, dates: Iterable | None = None) -> None:
+    """
+    Rebuild measure_facts from the measure tables (PostgreSQL only).
+
+    With `dates` (the measure dates touched by an incremental ingest, None
+    standing for undated measures) only the facts of measures on those dates
+    are rewritten; otherwise the whole table is, as it is when the table was
+    never built in full (e.g. just created by migrate.py).
+    """
+    if not MEASURE_FACTS or conn.dialect.name != "postgresql":
+        return
+    if dates is not None:
+        dates = set(dates)
+        if not dates:
+            return
+        if built_version(conn, FACTS_BUILD) is None:
+            log.info("measure_facts was never built in full, rebuilding it")
+            dates = None
+    conn.execute(
+        insert(authority_codes)
+        .from_select(["name"], select(MeasureDetail.authority).distinct().where(MeasureDetail.authority.is_not(None)))
+        .on_conflict_do_nothing()
+    )
+    if dates is None:
+        conn.execute(text("TRUNCATE measure_facts"))
+    else:
+        conn.execute(delete(measure_facts).where(date_condition(measure_facts.c.date, dates)))
+    conn.execute(measure_facts.insert().from_select(
+        ["measure_id", "date", "termination_date", "country_id", "authority_id", "policy_ids"],
+        _facts_select(dates),
+    ))
+    if dates is None:
+        mark_built(conn, FACTS_BUILD)
+    log.info("Measure facts refreshed for %s dates", "all" if dates is None else len(dates))
+
+
+@dataclass(frozen=True)
+class FactCodes:
+    """
+    The codes measure_facts stores, at one data version: country ids by
+    name and the (id, name, level_type) of every policy level. `ready` is
+    False while the table is missing or not yet built in full.
+    """
+    ready: bool
+    countries: Dict[str, int]
+    policies: List[Tuple[int, str, str]]
+
+    def country_ids(self, country) -> List[int]:
+        return [self.countries[name] for name in as_list(country) if name in self.countries]
+
+    def policy_ids(self, names=None, levels=None) -> List[int]:
+        wanted = set(as_list(names if levels is None else levels))
+        return [key for key, name, level_type in self.policies
+                if (name if levels is None else level_type) in wanted]
+
+
+def _read_codes(conn: Connection, version: int) -> FactCodes:
+    # Being non-empty is not enough: a refresh of some dates fills only those
+    ready = conn.execute(text("SELECT to_regclass('measure_facts')")).scalar() is not None and (
+        built_version(conn, FACTS_BUILD) is not None or not conn.execute(select(select(Measure.id).exists())).scalar()
+    )
+    if not ready:
+        return FactCodes(False, {}, [])
+    countries = dict(conn.execute(select(Country.name, Country.id)).all())
+    policies = [tuple(row) for row in conn.execute(
+        select(PolicyMeasureLevel.id, PolicyMeasureLevel.name, PolicyMeasureLevel.level_type)
+    )]
+    return FactCodes(True, countries, policies)
+
+
+_codes = PerVersion(_read_codes)
+
+
+def fact_codes(conn: Connection) -> FactCodes | None:
+    """
+    Codes to filter measure_facts with, or None when filters cannot be
+    answered from it (disabled, not PostgreSQL, or not built yet).
+
+    The dimension tables are tiny and only change on ingest, so they are
+    read once per data version; refresh_derived_data bumps the version in
+    the transaction that rewrites the facts.
+    """
+    if not MEASURE_FACTS or conn.dialect.name != "postgresql":
+        return None
+    codes = _codes.get(conn)
+    return codes if codes.ready else None
+
+
+def _has_policy(keys: List[int]):
+    # The keys are sent as a literal array so the planner can weigh them
+    # against the column statistics: a GIN probe only pays off for rare policies
+    return measure_facts.c.policy_ids.overlap(literal(keys, ARRAY(Integer)))
+
+
+def fact_criteria(
+    codes: FactCodes,
+    country=None,
+    date_from=None,
+    date_to=None,
+    policy_type=None,
+    target_group=None,
+    level=None,
+    search=None,
+    fuzzy=False,
+    active_from=None,
+    active_to=None,
+):
+    """
+    WHERE clauses on measure_facts equivalent to filter.filter_criteria,
+    with names translated to codes by `codes`. Search and in-force ranges
+    still probe their own indexed tables.
+    """
+    facts = measure_facts.c
+    criteria = []
+    if country:
+        criteria.append(facts.country_id.in_(codes.country_ids(country)))
+    if date_from:
+        criteria.append(facts.date >= date_from)
+    if date_to:
+        criteria.append(facts.date <= date_to)
+    if policy_type:
+        criteria.append(_has_policy(codes.policy_ids(names=policy_type)))
+    if target_group:
+        criteria.append(_has_policy(codes.policy_ids(names=target_group)))
+    if level:
+        criteria.append(_has_policy(codes.policy_ids(levels=level)))
+    if active_from or active_to:
+        criteria.append(
+            select(MeasureDate.id)
+            .where(MeasureDate.measure_id == facts.measure_id, active_between(active_from, active_to))
+            .exists()
+        )
+    if search:
+        criteria.append(
+            select(MeasureDetail.id)
+            .where(MeasureDetail.measure_id == facts.measure_id, matches_search(search, fuzzy))
+            .exists()
+        )
+    return criteria
+
+
+def fact_ids(codes: FactCodes, **filters):
+    """
+    SELECT of the keys of the measures matching `filters`, from measure_facts alone.
+    """
+    return select(measure_facts.c.measure_id).where(*fact_criteria(codes, **filters))
+
+
+if __name__ == "__main__":
+    from src.database.connection import engine
+
+    with engine.begin() as conn:
+        refresh_facts(conn)
+        # Lets running apps pick up the rebuilt table
+        bump_data_version(conn)
+    print("Measure facts refreshed successfully.")
@@ -1,15 +1,195 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import func, select
+from collections import namedtuple
 from datetime import date
 
 from src.database.connection import engine
 from src.database.model import (
     Measure, Country, MeasureDate, MeasureDetail, MeasurePolicyLink, PolicyMeasureLevel
 )
+from src.database.activity import active_criterion
+from src.database.columnar import filter_engine
+from src.database.facts import fact_codes, fact_criteria, fact_ids, measure_facts
+from src.database.search import matches_search, search_relevance
 from src.utils.log import get_logger
 
 log = get_logger(__name__)
 
+DEFAULT_PAGE_SIZE = 500
+
+# Flat, read-only view of a measure with its policy links aggregated into lists
+MeasureRow = namedtuple(
+    "MeasureRow",
+    ["id", "country", "iso3", "date", "termination_date", "authority", "details", "policy_type", "level"],
+)
+
+
+def _matches(column, value):
+    if isinstance(value, list):
+        return column.in_(value)
+    return column == value
+
+
+def country_ids(country):
+    """
+    SELECT of the keys of the countries named `country` (a name or a list of names).
+    """
+    return select(Country.id).where(_matches(Country.name, country))
+
+
+def _has_policy(condition):
+    return (
+        select(MeasurePolicyLink.id)
+        .join(PolicyMeasureLevel, MeasurePolicyLink.policy_measure_level_id == PolicyMeasureLevel.id)
+        .where(MeasurePolicyLink.measure_id == Measure.id, condition)
+        .correlate(Measure)
+        .exists()
+    )
+
+
+def filter_criteria(
+    country=None,
+    date_from=None,
+    date_to=None,
+    policy_type=None,
+    target_group=None,
+    level=None,
+    search=None,
+    fuzzy=False,
+    active_from=None,
+    active_to=None,
+):
+    """
+    WHERE clauses on `measures` for the given filter values.
+
+    Every criterion is its own semi-join, so the measures table is never
+    multiplied by its links and each measure appears at most once. Policy
+    criteria are independent of each other: a measure matches `policy_type`
+    and `target_group` when it has a link satisfying each, which may be at
+    different levels. `search` is a web-style full-text query over the
+    details and reference ("capital buffer", "moratorium -mortgage"); with
+    `fuzzy` misspelt words also match (PostgreSQL with pg_trgm).
+    `date_from`/`date_to` bound the start date, whereas `active_from`/
+    `active_to` select the measures in force on some day between them.
+    """
+    criteria = []
+
+    if country:
+        criteria.append(Measure.country_id.in_(country_ids(country)))
+
+    if date_from or date_to:
+        date_conditions = [MeasureDate.measure_id == Measure.id]
+        if date_from:
+            date_conditions.append(MeasureDate.date >= date_from)
+        if date_to:
+            date_conditions.append(MeasureDate.date <= date_to)
+        criteria.append(select(MeasureDate.id).where(*date_conditions).correlate(Measure).exists())
+
+    if policy_type:
+        criteria.append(_has_policy(_matches(PolicyMeasureLevel.name, policy_type)))
+
+    if target_group:
+        criteria.append(_has_policy(_matches(PolicyMeasureLevel.name, target_group)))
+
+    if level:
+        criteria.append(_has_policy(_matches(PolicyMeasureLevel.level_type, level)))
+
+    if active_from or active_to:
+        criteria.append(active_criterion(active_from, active_to))
+
+    if search:
+        criteria.append(
+            select(MeasureDetail.id)
+            .where(MeasureDetail.measure_id == Measure.id, matches_search(search, fuzzy))
+            .correlate(Measure)
+            .exists()
+        )
+
+    return criteria
+
+
+def current_fact_codes(session):
+    """
+    FactCodes when filters can be answered from measure_facts, else None.
+    """
+    return fact_codes(session.connection())
+
+
+def _facts_apply(codes, filters) -> bool:
+    # Unfiltered queries read `measures` directly; the facts only help to filter
+    return codes is not None and any(value for name, value in filters.items() if name != "fuzzy")
+
+
+def measure_criteria(codes=None, **filters):
+    """
+    WHERE clauses on `measures` for `filters`: filter_criteria, or with
+    fact `codes` a single semi-join on measure_facts, which answers every
+    filter without joining the measure tables.
+    """
+    if _facts_apply(codes, filters):
+        return [Measure.id.in_(fact_ids(codes, **filters))]
+    return filter_criteria(**filters)
+
+
+def count_statement(codes=None, **filters):
+    if _facts_apply(codes, filters):
+        return select(func.count()).select_from(measure_facts).where(*fact_criteria(codes, **filters))
+    return select(func.count()).select_from(Measure).where(*filter_criteria(**filters))
+
+
+def page_statement(codes=None, after_id=None, page_size=DEFAULT_PAGE_SIZE, **filters):
+    """
+    SELECT of the MeasureRow columns of the page of `page_size` measures after `after_id`.
+    With fact `codes` the page's keys are found in measure_facts first, so
+    only those measures are joined to their details.
+    """
+    if _facts_apply(codes, filters):
+        keys = fact_ids(codes, **filters).order_by(measure_facts.c.measure_id).limit(page_size)
+        if after_id is not None:
+            keys = keys.where(measure_facts.c.measure_id > after_id)
+        return measure_row_statement([Measure.id.in_(keys)], None, filters.get("date_from"), filters.get("date_to"))
+    criteria = filter_criteria(**filters)
+    if after_id is not None:
+        criteria.append(Measure.id > after_id)
+    return measure_row_statement(criteria, None, filters.get("date_from"), filters.get("date_to")).limit(page_size)
+
+
+def build_filter_query(
+    session,
+    country=None,
+    date_from=None,
+    date_to=None,
+    policy_type=None,
+    target_group=None,
+    level=None,
+    search=None,
+    fuzzy=False,
+    active_from=None,
+    active_to=None,
+):
+    query = session.query(Measure).filter(*measure_criteria(
+        current_fact_codes(session),
+        country=country,
+        date_from=date_from,
+        date_to=date_to,
+        policy_type=policy_type,
+        target_group=target_group,
+        level=level,
+        search=search,
+        fuzzy=fuzzy,
+        active_from=active_from,
+        active_to=active_to,
+    ))
+    if search:
+        # Best matches first
+        query = (
+            query.join(MeasureDetail, MeasureDetail.measure_id == Measure.id)
+            .order_by(search_relevance(search, fuzzy).desc(), Measure.id)
+        )
+    else:
+        query = query.order_by(Measure.id)
+    return query
+
 
 def get_filtered_measures(
     session,
@@ -19,55 +199,228 @@ def get_filtered_measures(
     policy_type=None,
     target_group=None,
     level=None,
+    search=None,
+    fuzzy=False,
+    active_from=None,
+    active_to=None,
+    eager=True,
 ):
-    log.info(f"Filtering measures with parameters: {locals()}")
+    """
+    Return the matching Measure objects, ranked by relevance when `search`
+    is given. With `eager` their country, date, detail and policy links are
+    loaded up front (joined for the one-to-one sides, one SELECT ... IN for
+    the links), so reading them does not fire a lazy load per measure.
+    """
+    log.info("Filtering measures with parameters: %s", locals())
 
-    query = session.query(Measure)\
-        .join(Country)\
-        .join(MeasureDate)\
-        .join(MeasureDetail)\
-        .join(MeasurePolicyLink)\
-        .join(PolicyMeasureLevel)
+    query = build_filter_query(
+        session,
+        country=country,
+        date_from=date_from,
+        date_to=date_to,
+        policy_type=policy_type,
+        target_group=target_group,
+        level=level,
+        search=search,
+        fuzzy=fuzzy,
+        active_from=active_from,
+        active_to=active_to,
+    )
+    if eager:
+        query = query.options(
+            joinedload(Measure.country),
+            joinedload(Measure.date_ref),
+            joinedload(Measure.detail_ref),
+            selectinload(Measure.policy_links).joinedload(MeasurePolicyLink.policy),
+        )
+    results = query.all()
+    log.info("Total measures found: %d", len(results))
+    return results
 
-    filters = []
-
-    if country:
-        if isinstance(country, list):
-            filters.append(Country.name.in_(country))
-        else:
-            filters.append(Country.name == country)
 
+def measure_row_statement(criteria, key_range=None, date_from=None, date_to=None):
+    """
+    SELECT of the MeasureRow columns (without the policy lists) for `criteria`, ordered by id.
+    A (first, last) `key_range` known to hold every match is repeated on the
+    side tables, so they are read by that range rather than scanned. So are
+    the date bounds of the filter on measure_dates, which then only reads
+    the partitions of the window when it is partitioned (see partition.py).
+    """
+    date_join = MeasureDate.measure_id == Measure.id
+    detail_join = MeasureDetail.measure_id == Measure.id
+    if key_range is not None:
+        date_join &= MeasureDate.measure_id.between(*key_range)
+        detail_join &= MeasureDetail.measure_id.between(*key_range)
     if date_from:
-        filters.append(MeasureDate.date >= date_from)
+        date_join &= MeasureDate.date >= date_from
     if date_to:
-        filters.append(MeasureDate.date <= date_to)
+        date_join &= MeasureDate.date <= date_to
+    return (
+        select(
+            Measure.id, Country.name, Country.iso3, MeasureDate.date, MeasureDate.termination_date,
+            MeasureDetail.authority, MeasureDetail.details,
+        )
+        .select_from(Measure)
+        .outerjoin(Country, Measure.country_id == Country.id)
+        .outerjoin(MeasureDate, date_join)
+        .outerjoin(MeasureDetail, detail_join)
+        .where(*criteria)
+        .order_by(Measure.id)
+    )
 
-    if policy_type:
-        if isinstance(policy_type, list):
-            filters.append(PolicyMeasureLevel.name.in_(policy_type))
-        else:
-            filters.append(PolicyMeasureLevel.name == policy_type)
 
-    if target_group:
-        if isinstance(target_group, list):
-            filters.append(PolicyMeasureLevel.name.in_(target_group))
-        else:
-            filters.append(PolicyMeasureLevel.name == target_group)
+def rows_by_id_statement(ids, date_from=None, date_to=None, **filters):
+    """
+    SELECT of the MeasureRow columns of the measures with the sorted keys
+    `ids`, which matched the `filters` they were picked with.
+    """
+    return measure_row_statement([Measure.id.in_(ids)], (ids[0], ids[-1]) if ids else None, date_from, date_to)
 
-    if level:
-        if isinstance(level, list):
-            filters.append(PolicyMeasureLevel.level_type.in_(level))
-        else:
-            filters.append(PolicyMeasureLevel.level_type == level)
 
-    if filters:
-        query = query.filter(and_(*filters))
+def policy_link_statement(measure_ids):
+    """
+    SELECT of (measure_id, name, level_type) for the measures in `measure_ids`,
+    a list of keys or a subquery.
+    """
+    return (
+        select(MeasurePolicyLink.measure_id, PolicyMeasureLevel.name, PolicyMeasureLevel.level_type)
+        .join(PolicyMeasureLevel, MeasurePolicyLink.policy_measure_level_id == PolicyMeasureLevel.id)
+        .where(MeasurePolicyLink.measure_id.in_(measure_ids))
+        .order_by(MeasurePolicyLink.measure_id, PolicyMeasureLevel.level_type)
+    )
 
-    results = query.all()
-    log.info(f"Total measures found: {len(results)}")
+
+def fold_policies(rows, links):
+    """
+    Combine measure rows with their (measure_id, name, level_type) links into MeasureRow tuples.
+    """
+    policies = {}
+    for measure_id, name, level_type in links:
+        names, levels = policies.setdefault(measure_id, ([], []))
+        names.append(name)
+        levels.append(level_type)
+    return [MeasureRow(*row, *policies.get(row[0], ([], []))) for row in rows]
+
+
+def _with_policies(session, rows, measure_ids):
+    return fold_policies(rows, session.execute(policy_link_statement(measure_ids)))
+
+
+def get_filtered_measure_rows(
+    session,
+    country=None,
+    date_from=None,
+    date_to=None,
+    policy_type=None,
+    target_group=None,
+    level=None,
+    search=None,
+    fuzzy=False,
+    active_from=None,
+    active_to=None,
+):
+    """
+    Return the matching measures as MeasureRow tuples, ordered by id (by
+    relevance when `search` is given).
+
+    Only the displayed columns are selected: one query for the measure
+    columns and one for the policy links, which are folded into the
+    `policy_type` and `level` lists.
+    """
+    log.info("Filtering measure rows with parameters: %s", locals())
+
+    criteria = measure_criteria(
+        current_fact_codes(session),
+        country=country,
+        date_from=date_from,
+        date_to=date_to,
+        policy_type=policy_type,
+        target_group=target_group,
+        level=level,
+        search=search,
+        fuzzy=fuzzy,
+        active_from=active_from,
+        active_to=active_to,
+    )
+
+    stmt = measure_row_statement(criteria, None, date_from, date_to)
+    if search:
+        stmt = stmt.order_by(None).order_by(search_relevance(search, fuzzy).desc(), Measure.id)
+    rows = session.execute(stmt).all()
+    results = _with_policies(session, rows, select(Measure.id).where(*criteria))
+    log.info("Total measure rows found: %d", len(results))
     return results
 
 
+def count_filtered_measures(session, **filters):
+    """
+    Number of measures matching `filters` (the keyword arguments of filter_criteria).
+    """
+    if filter_engine.applies(filters):
+        return filter_engine.snapshot(session).count(**filters)
+    return session.execute(count_statement(current_fact_codes(session), **filters)).scalar_one()
+
+
+def get_filtered_measure_page(session, after_id=None, page_size=DEFAULT_PAGE_SIZE, **filters):
+    """
+    Return up to `page_size` MeasureRow tuples with an id greater than
+    `after_id` (keyset pagination). Pass the id of the last row of a page to
+    get the next one; the cost of a page does not depend on its position.
+    """
+    if filter_engine.applies(filters):
+        # The in-process engine picks the page; only its rows are read by key
+        ids = filter_engine.snapshot(session).page_ids(after_id, page_size, **filters).tolist()
+        rows = session.execute(rows_by_id_statement(ids, **filters)).all()
+        return _with_policies(session, rows, ids)
+    stmt = page_statement(current_fact_codes(session), after_id, page_size, **filters)
+    rows = session.execute(stmt).all()
+    return _with_policies(session, rows, [row[0] for row in rows])
+
+
+def search_measure_rows(session, search, fuzzy=False, limit=DEFAULT_PAGE_SIZE, **filters):
+    """
+    The `limit` best matches for the full-text query `search` among the
+    measures matching `filters`, as MeasureRow tuples, most relevant first.
+    """
+    criteria = measure_criteria(current_fact_codes(session), search=search, fuzzy=fuzzy, **filters)
+    stmt = (
+        measure_row_statement(criteria, None, filters.get("date_from"), filters.get("date_to"))
+        .order_by(None)
+        .order_by(search_relevance(search, fuzzy).desc(), Measure.id)
+        .limit(limit)
+    )
+    rows = session.execute(stmt).all()
+    return _with_policies(session, rows, [row[0] for row in rows])
+
+
+def iter_filtered_measure_rows(session, batch_size=DEFAULT_PAGE_SIZE, **filters):
+    """
+    Stream the matching MeasureRow tuples through a server-side cursor,
+    holding at most `batch_size` rows in memory at a time.
+
+    Embedded backends have no server-side cursors (and DuckDB drops a
+    pending result when the connection runs another query), so there the
+    rows are read one keyset page at a time instead.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        after_id = None
+        while True:
+            page = get_filtered_measure_page(session, after_id=after_id, page_size=batch_size, **filters)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after_id = page[-1].id
+    result = session.execute(
+        measure_row_statement(
+            measure_criteria(current_fact_codes(session), **filters), None,
+            filters.get("date_from"), filters.get("date_to"),
+        )
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in result.partitions():
+        yield from _with_policies(session, rows, [row[0] for row in rows])
+
+
 if __name__ == "__main__":
     # ---- Set your filter values here ----
     FILTER_COUNTRY = "China"  # Country name or None
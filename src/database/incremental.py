@@ -0,0 +1,164 @@
+import csv
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import bindparam, delete, func, select, update
+from sqlalchemy.engine import Connection, Engine
+from tqdm import tqdm
+
+from src.database.archive import archived_windows, is_archived
+from src.database.bulk_insert import (
+    DEFAULT_BATCH_SIZE, ensure_dimensions, parse_date, parse_row, row_hash, write_batch, write_measure_children
+)
+from src.database.connection import engine
+from src.database.dimension_cache import DimensionCache
+from src.database.model import (
+    Measure, MeasureDate, MeasureDetail, MeasureModification, MeasurePolicyLink
+)
+from src.database.refresh import refresh_derived_data
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+CHILD_TABLES = (MeasureDate, MeasureDetail, MeasureModification, MeasurePolicyLink)
+
+
+@dataclass
+class IngestDelta:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    # Rows dated in an archived window (see archive.py), left out
+    archived: int = 0
+    # Measure dates (before and after the ingest) of every inserted, updated or deleted measure
+    touched_dates: set = field(default_factory=set)
+
+
+def _chunks(items: Sequence[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _delete_children(conn: Connection, measure_ids: Sequence[int], batch_size: int) -> None:
+    for chunk in _chunks(measure_ids, batch_size):
+        for model in CHILD_TABLES:
+            conn.execute(delete(model).where(model.measure_id.in_(chunk)))
+
+
+def _update_measures(conn: Connection, changed: List[Dict[str, Any]], cache: DimensionCache) -> None:
+    stmt = (
+        update(Measure.__table__)
+        .where(Measure.__table__.c.id == bindparam("b_id"))
+        .values(
+            original_id=bindparam("b_original_id"),
+            country_id=bindparam("b_country_id"),
+            row_hash=bindparam("b_row_hash"),
+        )
+    )
+    conn.execute(stmt, [
+        {
+            "b_id": rec["measure_id"],
+            "b_original_id": rec["original_id"],
+            "b_country_id": cache.country_id(rec["iso3"]),
+            "b_row_hash": rec["row_hash"],
+        }
+        for rec in changed
+    ])
+
+
+def incremental_import_data(
+    csv_path: str = 'data/covid-fci-data-cleaned.csv',
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    bind: Engine = engine,
+) -> IngestDelta:
+    """
+    Bring the database in line with the CSV, touching only the rows that changed.
+
+    Measures are matched on the source `ID` column (`Original_ID` repeats for
+    modifications of the same measure) and compared by row hash. New rows are
+    inserted, changed rows get their measure updated and their side tables
+    rewritten, and measures whose source row disappeared are deleted.
+    Rows dated in an archived window are skipped, so archived measures are
+    not imported again.
+    """
+    delta = IngestDelta()
+    with bind.begin() as conn:
+        legacy = conn.execute(
+            select(func.count()).select_from(Measure).where(Measure.source_id.is_(None))
+        ).scalar_one()
+        if legacy:
+            raise ValueError(
+                f"{legacy} measures were loaded without a source ID; "
+                "drop the tables and run a full import once before importing incrementally."
+            )
+
+        stored = {
+            source_id: (measure_id, stored_hash)
+            for source_id, measure_id, stored_hash in conn.execute(
+                select(Measure.source_id, Measure.id, Measure.row_hash)
+            )
+        }
+        cache = DimensionCache(conn)
+        archived = archived_windows(conn)
+
+        new_rows, changed_rows = [], []
+        seen = set()
+        with open(csv_path, newline='', encoding='utf-8') as csvfile:
+            for row in tqdm(csv.DictReader(csvfile), desc="Comparing rows", unit="rows"):
+                source_id = int(row['ID'])
+                if archived and is_archived(parse_date(row['Date']), archived):
+                    delta.archived += 1
+                    continue
+                seen.add(source_id)
+                existing = stored.get(source_id)
+                if existing is None:
+                    new_rows.append(parse_row(row))
+                elif existing[1] != row_hash(row):
+                    rec = parse_row(row)
+                    rec["measure_id"] = existing[0]
+                    changed_rows.append(rec)
+                else:
+                    delta.unchanged += 1
+
+        removed_ids = [measure_id for source_id, (measure_id, _) in stored.items() if source_id not in seen]
+        rewritten_ids = removed_ids + [rec["measure_id"] for rec in changed_rows]
+        for chunk in _chunks(rewritten_ids, batch_size):
+            delta.touched_dates.update(conn.execute(
+                select(MeasureDate.date).where(MeasureDate.measure_id.in_(chunk)).distinct()
+            ).scalars())
+        delta.touched_dates.update(rec["date"] for rec in changed_rows + new_rows)
+        _delete_children(conn, rewritten_ids, batch_size)
+        for chunk in _chunks(removed_ids, batch_size):
+            conn.execute(delete(Measure).where(Measure.id.in_(chunk)))
+        delta.deleted = len(removed_ids)
+
+        for batch in _chunks(changed_rows, batch_size):
+            ensure_dimensions(conn, batch, cache)
+            _update_measures(conn, batch, cache)
+            write_measure_children(conn, [rec["measure_id"] for rec in batch], batch, cache)
+        delta.updated = len(changed_rows)
+
+        for batch in _chunks(new_rows, batch_size):
+            write_batch(conn, batch, cache)
+        delta.inserted = len(new_rows)
+
+        # Every written row touches a date (None for undated rows); with none
+        # touched and none deleted the derived data and data version stand
+        if delta.touched_dates or delta.deleted:
+            refresh_derived_data(conn, delta.touched_dates)
+
+    log.info(
+        "Incremental import of %s complete: %d inserted, %d updated, %d deleted, %d unchanged, %d archived, "
+        "%d dates touched", csv_path, delta.inserted, delta.updated, delta.deleted, delta.unchanged, delta.archived,
+        len(delta.touched_dates),
+    )
+    print(
+        f"Incremental import complete: {delta.inserted} inserted, {delta.updated} updated, "
+        f"{delta.deleted} deleted, {delta.unchanged} unchanged."
+    )
+    return delta
+
+
+if __name__ == "__main__":
+    incremental_import_data()
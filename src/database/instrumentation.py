@@ -0,0 +1,400 @@
+import json
+import queue
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Awaitable, Dict, Iterator, List, Tuple, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from constants import N_PLUS_ONE_THRESHOLD, SLOW_QUERY_EXPLAIN, SLOW_QUERY_MS
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+T = TypeVar("T")
+
+# Upper bounds (seconds) of the query duration histogram
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Distinct statements tracked individually; further ones are counted under OTHER_STATEMENTS
+MAX_STATEMENTS = 500
+OTHER_STATEMENTS = "<other statements>"
+EXPLAIN_PREFIXES = {"postgresql": "EXPLAIN", "duckdb": "EXPLAIN", "sqlite": "EXPLAIN QUERY PLAN"}
+# Execution option that keeps a connection's statements out of the metrics (the EXPLAINs themselves)
+SKIP_OPTION = "skip_instrumentation"
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+(?:::\w+)?|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Statement text with whitespace collapsed and bound parameters as `?`; an
+    expanded IN list counts as one parameter, so every execution of the same
+    query shares a fingerprint whatever its values.
+    """
+    statement = _PLACEHOLDER.sub("?", _WHITESPACE.sub(" ", statement.strip()))
+    return _PLACEHOLDER_LIST.sub("?, ...", statement)
+
+
+def operation(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    return keyword if keyword in ("select", "insert", "update", "delete", "with") else "other"
+
+
+@dataclass
+class QueryTrace:
+    """
+    Statements run inside one track_queries() block, e.g. one API call of the app.
+    """
+    name: str
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    seconds: float = 0.0
+    rows: int = 0
+    statements: Counter = field(default_factory=Counter)
+    n_plus_one: List[Tuple[str, int]] = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    def record(self, statement: str, seconds: float, rows: int) -> None:
+        self.queries += 1
+        self.seconds += seconds
+        self.rows += max(rows, 0)
+        self.statements[statement] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "queries": self.queries,
+            "sql_ms": round(self.seconds * 1000, 2),
+            "wall_ms": round(self.wall_seconds * 1000, 2),
+            "rows": self.rows,
+            "distinct_statements": len(self.statements),
+            "n_plus_one": [{"statement": statement, "executions": count} for statement, count in self.n_plus_one],
+        }
+
+
+_active_traces: ContextVar[Tuple[QueryTrace, ...]] = ContextVar("active_query_traces", default=())
+
+
+class QueryMetrics:
+    """
+    Process-wide query aggregates fed by the engine events of instrument_engine():
+    counts, time and rows per operation and per statement fingerprint, a
+    duration histogram, the latest slow queries (with plans) and the latest traces.
+    """
+
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD,
+                 keep: int = 50):
+        self.slow_ms = slow_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self.keep = keep
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.queries: Counter = Counter()
+            self.seconds: Counter = Counter()
+            self.rows: Counter = Counter()
+            self.errors = 0
+            self.slow = 0
+            self.n_plus_one = 0
+            self.buckets = [0] * len(DURATION_BUCKETS)
+            self.statements: Dict[str, Dict[str, float]] = {}
+            self.slow_queries: deque = deque(maxlen=self.keep)
+            self.traces: deque = deque(maxlen=self.keep)
+
+    def record(self, statement: str, seconds: float, rows: int) -> None:
+        key = fingerprint(statement)
+        kind = operation(statement)
+        with self._lock:
+            self.queries[kind] += 1
+            self.seconds[kind] += seconds
+            self.rows[kind] += max(rows, 0)
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    self.buckets[index] += 1
+                    break
+            if key not in self.statements and len(self.statements) >= MAX_STATEMENTS:
+                key = OTHER_STATEMENTS
+            stats = self.statements.setdefault(key, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0})
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["rows"] += max(rows, 0)
+        for trace in _active_traces.get():
+            trace.record(key, seconds, rows)
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def record_slow(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.slow += 1
+            self.slow_queries.append(entry)
+
+    def finish_trace(self, trace: QueryTrace) -> None:
+        """
+        Close `trace`: flag statements repeated often enough to look like an
+        N+1 pattern (a lazy load per parent row) and keep its summary.
+        """
+        trace.wall_seconds = time.perf_counter() - trace.started
+        trace.n_plus_one = [
+            (statement, count) for statement, count in trace.statements.most_common()
+            if count >= self.n_plus_one_threshold and operation(statement) in ("select", "with")
+        ]
+        for statement, count in trace.n_plus_one:
+            log.warning("Possible N+1 in %s: %d executions of %s", trace.name, count, statement[:500])
+        with self._lock:
+            self.n_plus_one += len(trace.n_plus_one)
+            self.traces.append(trace.summary())
+
+    def top_statements(self, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            ranked = sorted(self.statements.items(), key=lambda item: item[1]["seconds"], reverse=True)[:limit]
+        return [{
+            "statement": statement,
+            "count": stats["count"],
+            "total_ms": round(stats["seconds"] * 1000, 2),
+            "mean_ms": round(stats["seconds"] * 1000 / stats["count"], 2),
+            "max_ms": round(stats["max_seconds"] * 1000, 2),
+            "rows": stats["rows"],
+        } for statement, stats in ranked]
+
+    def as_dict(self, plans: bool = True) -> Dict[str, Any]:
+        """
+        All aggregates as JSON-serialisable values. Slow query entries never
+        hold bound parameters; without `plans` they also leave out their
+        EXPLAIN output, which shows the values the statement ran with.
+        """
+        top_statements = self.top_statements()
+        with self._lock:
+            return {
+                "queries": dict(self.queries),
+                "seconds": {kind: round(value, 6) for kind, value in self.seconds.items()},
+                "rows": dict(self.rows),
+                "errors": self.errors,
+                "slow_queries": self.slow,
+                "n_plus_one": self.n_plus_one,
+                "duration_buckets": dict(zip(map(str, DURATION_BUCKETS), self.buckets)),
+                "recent_slow_queries": [
+                    entry if plans else {key: value for key, value in entry.items() if key != "plan"}
+                    for entry in self.slow_queries
+                ],
+                "recent_traces": list(self.traces),
+                "top_statements": top_statements,
+            }
+
+    def prometheus(self, prefix: str = "fci_db") -> str:
+        """
+        Aggregates in the Prometheus text exposition format.
+        """
+        with self._lock:
+            lines = [f"# HELP {prefix}_queries_total Statements executed, by operation.",
+                     f"# TYPE {prefix}_queries_total counter"]
+            lines += [f'{prefix}_queries_total{{operation="{kind}"}} {count}' for kind, count in sorted(self.queries.items())]
+            lines += [f"# HELP {prefix}_rows_total Rows reported by the driver, by operation.",
+                      f"# TYPE {prefix}_rows_total counter"]
+            lines += [f'{prefix}_rows_total{{operation="{kind}"}} {count}' for kind, count in sorted(self.rows.items())]
+            lines += [f"# HELP {prefix}_query_duration_seconds Statement execution time.",
+                      f"# TYPE {prefix}_query_duration_seconds histogram"]
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, self.buckets):
+                cumulative += count
+                lines.append(f'{prefix}_query_duration_seconds_bucket{{le="{bound}"}} {cumulative}')
+            total = sum(self.queries.values())
+            lines += [
+                f'{prefix}_query_duration_seconds_bucket{{le="+Inf"}} {total}',
+                f"{prefix}_query_duration_seconds_sum {sum(self.seconds.values()):.6f}",
+                f"{prefix}_query_duration_seconds_count {total}",
+            ]
+            for name, value, text in (
+                ("query_errors_total", self.errors, "Statements that raised an error."),
+                ("slow_queries_total", self.slow, f"Statements slower than {self.slow_ms:g} ms."),
+                ("n_plus_one_total", self.n_plus_one, "Statements flagged as N+1 patterns."),
+            ):
+                lines += [f"# HELP {prefix}_{name} {text}", f"# TYPE {prefix}_{name} counter",
+                          f"{prefix}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+query_metrics = QueryMetrics()
+
+
+@contextmanager
+def track_queries(name: str) -> Iterator[QueryTrace]:
+    """
+    Trace the statements run inside the block (in this thread, or in coroutines
+    started through run_async) as one request called `name`. Blocks may nest.
+    """
+    trace = QueryTrace(name)
+    token = _active_traces.set(_active_traces.get() + (trace,))
+    try:
+        yield trace
+    finally:
+        _active_traces.reset(token)
+        query_metrics.finish_trace(trace)
+
+
+def carry_query_traces(coro: Awaitable[T]) -> Awaitable[T]:
+    """
+    Wrap `coro` so that it records into the traces active here, even when it
+    runs on another thread's event loop.
+    """
+    traces = _active_traces.get()
+
+    async def run():
+        _active_traces.set(traces)
+        return await coro
+    return run()
+
+
+class _Explainer:
+    """
+    Background thread that EXPLAINs slow statements on a separate connection,
+    so planning them never adds to the slow request itself.
+    """
+
+    def __init__(self):
+        self.jobs: queue.Queue = queue.Queue(maxsize=100)
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()
+
+    def submit(self, bind: Engine, statement: str, parameters, paramstyle: str, entry: Dict[str, Any]) -> None:
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+                self.thread.start()
+        try:
+            self.jobs.put_nowait((bind, statement, parameters, paramstyle, entry))
+        except queue.Full:
+            log.warning("Slow query (%s ms), not explained, queue full: %s", entry["ms"], entry["statement"])
+
+    def _run(self) -> None:
+        while True:
+            bind, statement, parameters, paramstyle, entry = self.jobs.get()
+            try:
+                entry["plan"] = explain_plan(bind, statement, parameters, paramstyle)
+            except Exception as e:
+                entry["plan"] = f"EXPLAIN failed: {e}"
+            log.warning("Slow query (%s ms, %d rows): %s\n%s",
+                        entry["ms"], entry["rows"], entry["statement"], entry["plan"])
+
+
+_explainer = _Explainer()
+
+
+def explain_plan(bind: Engine, statement: str, parameters=(), paramstyle: str | None = None) -> str:
+    """
+    Text plan on `bind` of a statement as the driver executed it, with the
+    same parameters. `paramstyle` is that of the executing driver; asyncpg's
+    $1 placeholders are rewritten for a `bind` on psycopg2.
+    """
+    if paramstyle == "numeric_dollar" and bind.dialect.paramstyle != paramstyle and "$" in statement:
+        positions = [int(number) - 1 for number in re.findall(r"\$(\d+)", statement)]
+        statement = re.sub(r"\$\d+", "%s", statement.replace("%", "%%"))
+        parameters = tuple(parameters[position] for position in positions)
+    prefix = EXPLAIN_PREFIXES.get(bind.dialect.name, "EXPLAIN")
+    with bind.connect().execution_options(**{SKIP_OPTION: True}) as conn:
+        rows = conn.exec_driver_sql(f"{prefix} {statement}", parameters).all()
+        conn.rollback()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def instrument_engine(bind: Engine, explain_bind: Engine | None = None) -> None:
+    """
+    Record every statement `bind` executes in query_metrics and the active
+    traces. Statements slower than SLOW_QUERY_MS are logged, with their plan
+    from `explain_bind` (default `bind`; an async engine's sync_engine
+    cannot run outside its event loop, so it borrows the sync engine).
+    """
+    explain_bind = explain_bind or bind
+
+    @event.listens_for(bind, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(bind, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_started"].pop()
+        if context is not None and context.execution_options.get(SKIP_OPTION):
+            return
+        rows = getattr(cursor, "rowcount", -1)
+        rows = rows if isinstance(rows, int) else -1
+        query_metrics.record(statement, seconds, rows)
+        if seconds * 1000 < query_metrics.slow_ms:
+            return
+        entry = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "ms": round(seconds * 1000, 1),
+            "rows": rows,
+            "statement": statement,
+            "plan": None,
+        }
+        query_metrics.record_slow(entry)
+        # The executed statement and parameters, not context.compiled: that comes
+        # from the compiled cache and carries the bind values of its first use
+        if SLOW_QUERY_EXPLAIN and not executemany and operation(statement) in ("select", "with") \
+                and explain_bind.dialect.name in EXPLAIN_PREFIXES:
+            _explainer.submit(explain_bind, statement, parameters, conn.dialect.paramstyle, entry)
+        else:
+            log.warning("Slow query (%s ms, %d rows): %s %s", entry["ms"], rows, statement, repr(parameters)[:1000])
+
+    @event.listens_for(bind, "handle_error")
+    def _error(exception_context):
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+        query_metrics.record_error()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") in ("", "/metrics"):
+            body, content_type = query_metrics.prometheus(), "text/plain; version=0.0.4"
+        elif self.path.rstrip("/") == "/metrics.json":
+            body, content_type = json.dumps(query_metrics.as_dict(plans=False), default=str), "application/json"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: ThreadingHTTPServer | None = None
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer | None:
+    """
+    Serve /metrics (Prometheus) and /metrics.json from a daemon thread; once per process.
+    Only on the loopback interface unless `host` says otherwise, as the
+    statements it reports may contain data. Returns None when the port is
+    taken, e.g. by another app process.
+    """
+    global _server
+    if _server is None:
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            log.warning("Cannot serve query metrics on port %d: %s", port, e)
+            return None
+        threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        log.info("Serving query metrics on port %d", port)
+    return _server
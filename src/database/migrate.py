@@ -0,0 +1,90 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from src.database.activity import ACTIVITY_MIGRATIONS
+from src.database.connection import engine
+from src.database.facts import FACTS_BUILD, FACTS_MIGRATIONS, refresh_facts
+from src.database.model import DerivedBuild
+from src.database.partition import partition_tables
+from src.database.search import SEARCH_MIGRATIONS, TRIGRAM_MIGRATIONS
+from src.database.version import built_version
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+
+def _create_index_once(name: str, statement: str) -> str:
+    # For indexes on tables partition.py may have partitioned: PostgreSQL
+    # rejects a unique index without the partition key even when it exists
+    return f"DO $$ BEGIN IF to_regclass('{name}') IS NULL THEN {statement}; END IF; END $$"
+
+
+# Idempotent DDL that brings a database created by an older version of the
+# models up to date. `create_all` never alters existing tables, so every
+# column or index added to model.py after the first release is listed here.
+MIGRATIONS = [
+    # Incremental ingest: source row key and change-detection hash
+    "ALTER TABLE measures ADD COLUMN IF NOT EXISTS source_id INTEGER",
+    "ALTER TABLE measures ADD COLUMN IF NOT EXISTS row_hash VARCHAR(32)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_measures_source_id ON measures (source_id)",
+    # Filter query join graph: FK indexes, filter columns and natural keys
+    "CREATE UNIQUE INDEX IF NOT EXISTS countries_iso3_key ON countries (iso3)",
+    "CREATE INDEX IF NOT EXISTS ix_countries_name ON countries (name)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_policy_measure_levels_name_level_type "
+    "ON policy_measure_levels (name, level_type)",
+    "CREATE INDEX IF NOT EXISTS ix_measures_country_id ON measures (country_id)",
+    _create_index_once(
+        "ix_measure_dates_measure_id", "CREATE UNIQUE INDEX ix_measure_dates_measure_id ON measure_dates (measure_id)"
+    ),
+    "CREATE INDEX IF NOT EXISTS ix_measure_dates_date_measure_id ON measure_dates (date, measure_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_measure_details_measure_id ON measure_details (measure_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_measure_modifications_measure_id ON measure_modifications (measure_id)",
+    "CREATE INDEX IF NOT EXISTS ix_measure_policy_links_measure_id ON measure_policy_links (measure_id)",
+    "CREATE INDEX IF NOT EXISTS ix_measure_policy_links_policy_measure "
+    "ON measure_policy_links (policy_measure_level_id, measure_id)",
+    # Full-text search over measure details (not mapped in model.py: tsvector is PostgreSQL-only)
+    *SEARCH_MIGRATIONS,
+    # In-force ranges of measures for "active between" queries
+    *ACTIVITY_MIGRATIONS,
+    # Denormalised read model of the filter (filled by refresh_derived_data)
+    *FACTS_MIGRATIONS,
+    "ANALYZE",
+]
+
+# Applied only where the extension they need is available on the server
+OPTIONAL_MIGRATIONS = {
+    "pg_trgm": TRIGRAM_MIGRATIONS,
+}
+
+
+def migrate(bind: Engine = engine) -> None:
+    """
+    Apply MIGRATIONS, and the OPTIONAL_MIGRATIONS whose extension the server
+    provides, to an existing PostgreSQL database.
+    """
+    if bind.dialect.name != "postgresql":
+        return
+    with bind.begin() as conn:
+        available = set(conn.execute(text("SELECT name FROM pg_available_extensions")).scalars())
+        statements = [
+            statement
+            for extension, extension_statements in OPTIONAL_MIGRATIONS.items() if extension in available
+            for statement in extension_statements
+        ]
+        skipped = sorted(set(OPTIONAL_MIGRATIONS) - available)
+        if skipped:
+            log.warning("Extensions not available, skipping their migrations: %s", skipped)
+        for statement in statements + MIGRATIONS:
+            conn.execute(text(statement))
+        # Date partitioning of the measure date tables, when DATE_PARTITIONS asks for it
+        partition_tables(conn)
+        # A measure_facts table created above is empty until built in full
+        DerivedBuild.__table__.create(conn, checkfirst=True)
+        if built_version(conn, FACTS_BUILD) is None:
+            refresh_facts(conn)
+    log.info("Applied %d migration statements", len(statements) + len(MIGRATIONS))
+
+
+if __name__ == "__main__":
+    migrate()
+    print("Database migrated successfully.")
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Date, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, Text, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
 
 class PolicyMeasureLevel(Base):
     __tablename__ = 'policy_measure_levels'
+    __table_args__ = (
+        UniqueConstraint('name', 'level_type', name='uq_policy_measure_levels_name_level_type'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String)
@@ -15,8 +18,8 @@ class Country(Base):
     __tablename__ = 'countries'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    iso3 = Column(String(3), nullable=False)
-    name = Column(String, nullable=False)
+    iso3 = Column(String(3), nullable=False, unique=True)
+    name = Column(String, nullable=False, index=True)
     income_level = Column(String, nullable=True)
 
     measures = relationship('Measure', back_populates='country')
@@ -26,8 +29,10 @@ class Measure(Base):
     __tablename__ = 'measures'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    source_id = Column(Integer, unique=True, index=True)  # `ID` column of the source CSV
     original_id = Column(Integer)
-    country_id = Column(Integer, ForeignKey('countries.id'))
+    country_id = Column(Integer, ForeignKey('countries.id'), index=True)
+    row_hash = Column(String(32), nullable=True)
 
     country = relationship('Country', back_populates='measures')
     date_ref = relationship('MeasureDate', uselist=False, back_populates='measure')
@@ -38,9 +43,12 @@ class Measure(Base):
 
 class MeasureDate(Base):
     __tablename__ = 'measure_dates'
+    __table_args__ = (
+        Index('ix_measure_dates_date_measure_id', 'date', 'measure_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    measure_id = Column(Integer, ForeignKey('measures.id'))
+    measure_id = Column(Integer, ForeignKey('measures.id'), unique=True, index=True)
     date = Column(Date, nullable=True)
     termination_date = Column(Date, nullable=True)
 
@@ -51,7 +59,7 @@ class MeasureDetail(Base):
     __tablename__ = 'measure_details'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    measure_id = Column(Integer, ForeignKey('measures.id'))
+    measure_id = Column(Integer, ForeignKey('measures.id'), unique=True, index=True)
     authority = Column(String, nullable=True)
     details = Column(Text, nullable=True)
     reference = Column(Text, nullable=True)
@@ -63,7 +71,7 @@ class MeasureModification(Base):
     __tablename__ = 'measure_modifications'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    measure_id = Column(Integer, ForeignKey('measures.id'))
+    measure_id = Column(Integer, ForeignKey('measures.id'), unique=True, index=True)
     was_modified = Column(String, nullable=True)
     modification_of_parent = Column(String, nullable=True)
     parent_measure = Column(String, nullable=True)
@@ -73,10 +81,72 @@ class MeasureModification(Base):
 
 class MeasurePolicyLink(Base):
     __tablename__ = 'measure_policy_links'
+    __table_args__ = (
+        # Leading column covers the FK; measure_id makes policy -> measure semi-joins index-only
+        Index('ix_measure_policy_links_policy_measure', 'policy_measure_level_id', 'measure_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    measure_id = Column(Integer, ForeignKey('measures.id'))
+    measure_id = Column(Integer, ForeignKey('measures.id'), index=True)
     policy_measure_level_id = Column(Integer, ForeignKey('policy_measure_levels.id'))
 
     measure = relationship('Measure', back_populates='policy_links')
     policy = relationship('PolicyMeasureLevel')
+
+
+class IngestCheckpoint(Base):
+    __tablename__ = 'ingest_checkpoints'
+
+    source = Column(String, primary_key=True)
+    chunk_index = Column(Integer, primary_key=True)
+    chunk_size = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
+
+
+class MeasureCountRollup(Base):
+    """
+    Measures per (date, country, authority, Level 1 policy), rebuilt by src/database/rollup.py.
+    """
+    __tablename__ = 'rollup_measure_counts'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    date = Column(Date, nullable=True, index=True)
+    country_id = Column(Integer, ForeignKey('countries.id'), index=True)
+    authority = Column(String, nullable=True)
+    level_1_id = Column(Integer, ForeignKey('policy_measure_levels.id'), nullable=True)
+    measure_count = Column(Integer, nullable=False)
+
+
+class PolicyPairRollup(Base):
+    """
+    (Level 1, Level 2) policy pairs per (date, country), rebuilt by src/database/rollup.py.
+    """
+    __tablename__ = 'rollup_policy_pairs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    date = Column(Date, nullable=True, index=True)
+    country_id = Column(Integer, ForeignKey('countries.id'), index=True)
+    level_1_id = Column(Integer, ForeignKey('policy_measure_levels.id'))
+    level_2_id = Column(Integer, ForeignKey('policy_measure_levels.id'))
+    pair_count = Column(Integer, nullable=False)
+
+
+class DataVersion(Base):
+    """
+    Single-row stamp bumped by every ingest; caches key their entries on it.
+    """
+    __tablename__ = 'data_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class DerivedBuild(Base):
+    """
+    One row per set of derived tables (rollups, measure facts) that has been
+    built in full; until then a refresh of some dates cannot be trusted.
+    """
+    __tablename__ = 'derived_builds'
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)  # data version the full build was made at
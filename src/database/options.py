@@ -0,0 +1,26 @@
+from sqlalchemy import select
+
+from src.database.model import Country, PolicyMeasureLevel
+from src.database.search import trigram_available
+
+
+def get_country_options(session):
+    return list(session.execute(select(Country.name).order_by(Country.name)).scalars())
+
+
+def get_policy_type_options(session):
+    return list(session.execute(
+        select(PolicyMeasureLevel.name).distinct().order_by(PolicyMeasureLevel.name)
+    ).scalars())
+
+
+def get_level_options(session):
+    return list(session.execute(
+        select(PolicyMeasureLevel.level_type).distinct()
+        .where(PolicyMeasureLevel.level_type.is_not(None), PolicyMeasureLevel.level_type != "")
+        .order_by(PolicyMeasureLevel.level_type)
+    ).scalars())
+
+
+def fuzzy_search_available(session):
+    return trigram_available(session.connection())
@@ -0,0 +1,247 @@
+from datetime import date
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from constants import DATE_PARTITIONS
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Tables range-partitioned on their `date` column when DATE_PARTITIONS is
+# "month" or "quarter" (PostgreSQL only). Rows without a date, or dated
+# outside every partition, go to the <table>_default partition.
+PARTITIONED_TABLES = ("measure_dates", "measure_facts")
+PARTITION_INTERVALS = ("month", "quarter")
+# Advisory lock serialising partition creation with the loaders
+PARTITION_LOCK_KEY = 0x66636970
+
+
+def enabled(conn: Connection) -> bool:
+    return DATE_PARTITIONS in PARTITION_INTERVALS and conn.dialect.name == "postgresql"
+
+
+def window_start(day: date, interval: str = DATE_PARTITIONS) -> date:
+    """
+    First day of the month or quarter containing `day`.
+    """
+    month = day.month if interval == "month" else day.month - (day.month - 1) % 3
+    return date(day.year, month, 1)
+
+
+def window_end(start: date, interval: str = DATE_PARTITIONS) -> date:
+    """
+    First day after the window starting on `start`.
+    """
+    month = start.month + (1 if interval == "month" else 3)
+    return date(start.year + (month > 12), (month - 1) % 12 + 1, 1)
+
+
+def partition_name(table: str, start: date, interval: str = DATE_PARTITIONS) -> str:
+    if interval == "month":
+        return f"{table}_p{start.year}_{start.month:02d}"
+    return f"{table}_p{start.year}_q{(start.month - 1) // 3 + 1}"
+
+
+def partition_window(name: str) -> Tuple[date, date]:
+    """
+    First day and first day after the window of the partition called `name`.
+    """
+    year, part = name.rsplit("_p", 1)[1].split("_")
+    if part.startswith("q"):
+        start = date(int(year), 3 * int(part[1:]) - 2, 1)
+        return start, window_end(start, "quarter")
+    start = date(int(year), int(part), 1)
+    return start, window_end(start, "month")
+
+
+def default_partition(table: str) -> str:
+    return f"{table}_default"
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    return conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"),
+        {"table": table},
+    ).scalar()
+
+
+def partitions(conn: Connection, table: str) -> List[str]:
+    """
+    Names of the partitions currently attached to `table`.
+    """
+    return list(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+    ), {"table": table}).scalars())
+
+
+def partition_parents(conn: Connection) -> Dict[str, str]:
+    """
+    Parent table of every partition of the PARTITIONED_TABLES.
+    """
+    return {name: table for table in PARTITIONED_TABLES for name in partitions(conn, table)}
+
+
+def stored_columns(conn: Connection, table: str) -> str:
+    """
+    Column list of `table` without its generated columns, which cannot be
+    written: the target table computes them again.
+    """
+    return ", ".join(conn.execute(text(
+        "SELECT quote_ident(attname) FROM pg_attribute WHERE attrelid = to_regclass(:table) "
+        "AND attnum > 0 AND NOT attisdropped AND attgenerated = '' ORDER BY attnum"
+    ), {"table": table}).scalars())
+
+
+def _add_partition(conn: Connection, table: str, start: date, interval: str) -> None:
+    name, end = partition_name(table, start, interval), window_end(start, interval)
+    default = default_partition(table)
+    in_window = f"date >= '{start}' AND date < '{end}'"
+    has_rows = conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_window})")).scalar()
+    if not has_rows:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{end}')"))
+        return
+    # Rows of the window already sit in the default partition (loaded before
+    # the partition existed): move them into a new table, then attach it
+    columns = stored_columns(conn, table)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED)"))
+    conn.execute(text(f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {default} WHERE {in_window}"))
+    conn.execute(text(f"DELETE FROM {default} WHERE {in_window}"))
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"))
+
+
+def ensure_partitions(conn: Connection, dates: Iterable | None = None) -> None:
+    """
+    Create the partitions holding `dates` that do not exist yet, on every
+    partitioned table. Loaders call it first in a batch's transaction; with
+    `dates` None, every dated row left in a default partition gets its partition.
+    """
+    if not enabled(conn):
+        return
+    tables = [table for table in PARTITIONED_TABLES if is_partitioned(conn, table)]
+    if dates is None:
+        dates = {day for table in tables for day in conn.execute(text(
+            f"SELECT DISTINCT date FROM {default_partition(table)} WHERE date IS NOT NULL"
+        )).scalars()}
+    starts = {window_start(day) for day in dates if day is not None}
+
+    def missing(table):
+        existing = set(partitions(conn, table))
+        return sorted(start for start in starts if partition_name(table, start) not in existing)
+
+    # Every loader transaction that writes rows calls this first (through
+    # ensure_dimensions, which write_batch calls too) and so holds the lock
+    # shared until it commits. A partition is only added under the exclusive
+    # lock: adding one locks the tables an open batch is writing to, which
+    # would deadlock with a concurrent loader
+    if not any(missing(table) for table in tables):
+        conn.execute(text("SELECT pg_advisory_xact_lock_shared(:key)"), {"key": PARTITION_LOCK_KEY})
+        return
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+    for table in tables:
+        created = missing(table)
+        for start in created:
+            _add_partition(conn, table, start, DATE_PARTITIONS)
+        if created:
+            log.info("Created %d partitions of %s: %s to %s", len(created), table, created[0], created[-1])
+
+
+def partition_table(conn: Connection, table: str, interval: str = DATE_PARTITIONS) -> None:
+    """
+    Turn the plain table `table` into one range-partitioned by date, keeping
+    its rows, defaults, generated columns, indexes and foreign keys.
+
+    Indexes and keys of a partitioned table must include the partition key,
+    so unique indexes (the primary key included) become plain ones; the
+    loaders keep those columns unique themselves.
+    """
+    plain = f"{table}_unpartitioned"
+    indexes = list(conn.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table"
+    ), {"table": table}))
+    keys = conn.execute(text(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(:table) AND contype IN ('p', 'u', 'f')"
+    ), {"table": table}).all()
+    sequences = conn.execute(text(
+        "SELECT attname, pg_get_serial_sequence(:table, attname) FROM pg_attribute "
+        "WHERE attrelid = to_regclass(:table) AND attnum > 0 AND NOT attisdropped "
+        "AND pg_get_serial_sequence(:table, attname) IS NOT NULL"
+    ), {"table": table}).all()
+
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {plain}"))
+    # Frees the index names for the partitioned table
+    for name, _, _ in keys:
+        conn.execute(text(f"ALTER TABLE {plain} DROP CONSTRAINT {name}"))
+    for name, _ in indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    conn.execute(text(
+        f"CREATE TABLE {table} (LIKE {plain} INCLUDING DEFAULTS INCLUDING GENERATED) PARTITION BY RANGE (date)"
+    ))
+    conn.execute(text(f"CREATE TABLE {default_partition(table)} PARTITION OF {table} DEFAULT"))
+    starts = {window_start(day, interval) for day in conn.execute(text(
+        f"SELECT DISTINCT date FROM {plain} WHERE date IS NOT NULL"
+    )).scalars()}
+    for start in sorted(starts):
+        _add_partition(conn, table, start, interval)
+    columns = stored_columns(conn, plain)
+    conn.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {plain}"))
+    # The sequences would otherwise be dropped with the plain table
+    for column, sequence in sequences:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{column}"))
+    conn.execute(text(f"DROP TABLE {plain}"))
+
+    for name, kind, definition in keys:
+        if kind == "f":
+            conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"))
+        else:
+            conn.execute(text(f"CREATE INDEX {name} ON {table} {definition.split(' ', 2)[-1]}"))
+    constraint_names = {name for name, _, _ in keys}
+    for name, definition in indexes:
+        if name not in constraint_names:
+            conn.execute(text(definition.replace("CREATE UNIQUE INDEX", "CREATE INDEX", 1)))
+    conn.execute(text(f"ANALYZE {table}"))
+    log.info("Partitioned %s by %s into %d partitions", table, interval, len(starts))
+
+
+def partition_tables(conn: Connection) -> None:
+    """
+    Partition those of the PARTITIONED_TABLES that are still plain tables.
+    """
+    if not enabled(conn):
+        return
+    for table in PARTITIONED_TABLES:
+        exists = conn.execute(text("SELECT to_regclass(:table)"), {"table": table}).scalar() is not None
+        if exists and not is_partitioned(conn, table):
+            partition_table(conn, table)
+
+
+def window_partitions(conn: Connection, table: str, date_from=None, date_to=None) -> Set[str]:
+    """
+    The partitions of `table` a date range can touch: those overlapping it,
+    plus the default partition unless existing partitions cover the range.
+    """
+    names = set(partitions(conn, table))
+    dated = sorted(name for name in names if name != default_partition(table))
+    if not (date_from and date_to):
+        return names
+    wanted = set()
+    start = window_start(date_from)
+    while start <= date_to:
+        wanted.add(partition_name(table, start))
+        start = window_end(start)
+    covered = wanted <= set(dated)
+    return (wanted & names) | (set() if covered else {default_partition(table)})
+
+
+if __name__ == "__main__":
+    from src.database.connection import engine
+
+    with engine.begin() as conn:
+        partition_tables(conn)
+        ensure_partitions(conn)
+        for table in PARTITIONED_TABLES:
+            print(f"{table}: {len(partitions(conn, table))} partitions")
+    print("Partitioning done." if DATE_PARTITIONS in PARTITION_INTERVALS else "DATE_PARTITIONS is not set.")
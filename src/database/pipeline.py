@@ -0,0 +1,187 @@
+import csv
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import Engine
+from tqdm import tqdm
+
+from src.database.bulk_insert import (
+    DEFAULT_BATCH_SIZE, SEQUENCE_DIALECTS, ensure_dimensions, parse_row, write_batch
+)
+from src.database.connection import engine
+from src.database.dimension_cache import DimensionCache
+from src.database.model import IngestCheckpoint
+from src.database.refresh import refresh_derived_data
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_WRITERS = 2
+
+
+def _read_chunks(csv_path: str, chunk_size: int) -> Iterator[Tuple[List[str], int, List[List[str]]]]:
+    """
+    Stream the CSV as (header, chunk index, raw rows) without building dicts.
+    """
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        index = 0
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                return
+            yield header, index, rows
+            index += 1
+
+
+def _normalise_chunk(header: List[str], rows: List[List[str]]) -> List[Dict[str, Any]]:
+    return [parse_row(dict(zip(header, row))) for row in rows]
+
+
+def _completed_chunks(bind: Engine, source: str, chunk_size: int) -> Set[int]:
+    with bind.connect() as conn:
+        rows = conn.execute(
+            select(IngestCheckpoint.chunk_index, IngestCheckpoint.chunk_size)
+            .where(IngestCheckpoint.source == source)
+        ).all()
+    if any(size != chunk_size for _, size in rows):
+        raise ValueError(
+            f"Checkpoint for {source} was written with a different chunk size; "
+            f"resume with chunk_size={rows[0][1]}."
+        )
+    return {index for index, _ in rows}
+
+
+def _writer(bind: Engine, batches: queue.Queue, source: str, chunk_size: int,
+            stop: threading.Event, failures: List[BaseException]) -> None:
+    try:
+        with bind.connect() as conn:
+            with conn.begin():
+                cache = DimensionCache(conn)
+            while not stop.is_set():
+                try:
+                    item = batches.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    return
+                index, batch = item
+                # Dimension members commit on their own, so writers never wait
+                # on each other's fact transactions
+                with conn.begin():
+                    ensure_dimensions(conn, batch, cache)
+                # The checkpoint commits with the chunk: a chunk is either fully
+                # loaded and recorded, or neither
+                with conn.begin():
+                    write_batch(conn, batch, cache)
+                    conn.execute(insert(IngestCheckpoint).values(
+                        source=source, chunk_index=index, chunk_size=chunk_size, row_count=len(batch)
+                    ))
+    except BaseException as e:
+        failures.append(e)
+        stop.set()
+
+
+def _put(batches: queue.Queue, item: Any, stop: threading.Event) -> None:
+    # Block while the writers are behind, but give up as soon as one fails
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def parallel_import_data(
+    csv_path: str = 'data/covid-fci-data-cleaned.csv',
+    chunk_size: int = DEFAULT_BATCH_SIZE,
+    workers: int | None = None,
+    writers: int = DEFAULT_WRITERS,
+    queue_size: int | None = None,
+    bind: Engine = engine,
+) -> int:
+    """
+    Pipelined import: the main process streams raw CSV chunks, a pool of
+    `workers` processes normalises them, and `writers` connections drain a
+    bounded queue, committing one chunk per transaction.
+
+    Every committed chunk is recorded in `ingest_checkpoints`, so re-running
+    after a crash skips the chunks already loaded. The checkpoint is cleared
+    once the whole file has been imported. Returns the number of rows written
+    by this run.
+
+    Backends without key sequences (SQLite) get a single writer, as
+    concurrent writers would reserve the same measure keys.
+    """
+    if writers > 1 and bind.dialect.name not in SEQUENCE_DIALECTS:
+        log.info("%s has no key sequences, importing with one writer", bind.dialect.name)
+        writers = 1
+    source = os.path.abspath(csv_path)
+    done = _completed_chunks(bind, source, chunk_size)
+    if done:
+        log.info("Resuming import of %s: %d chunks already loaded", source, len(done))
+
+    workers = workers or os.cpu_count() or 1
+    batches: queue.Queue = queue.Queue(maxsize=queue_size or 2 * writers)
+    stop = threading.Event()
+    failures: List[BaseException] = []
+    threads = [
+        threading.Thread(target=_writer, args=(bind, batches, source, chunk_size, stop, failures), daemon=True)
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    total = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool, \
+                tqdm(desc="Importing data", unit="rows") as progress:
+            pending: deque = deque()
+            for header, index, rows in _read_chunks(csv_path, chunk_size):
+                if stop.is_set():
+                    break
+                if index in done:
+                    continue
+                pending.append((index, pool.submit(_normalise_chunk, header, rows)))
+                # Keep at most two chunks per worker in flight
+                while len(pending) >= 2 * workers or (pending and pending[0][1].done()):
+                    index, future = pending.popleft()
+                    batch = future.result()
+                    _put(batches, (index, batch), stop)
+                    total += len(batch)
+                    progress.update(len(batch))
+            while pending and not stop.is_set():
+                index, future = pending.popleft()
+                batch = future.result()
+                _put(batches, (index, batch), stop)
+                total += len(batch)
+                progress.update(len(batch))
+    finally:
+        if not failures:
+            for _ in threads:
+                _put(batches, None, stop)
+        else:
+            stop.set()
+        for thread in threads:
+            thread.join()
+
+    if failures:
+        raise failures[0]
+
+    with bind.begin() as conn:
+        conn.execute(delete(IngestCheckpoint).where(IngestCheckpoint.source == source))
+        refresh_derived_data(conn)
+    log.info("Parallel import of %s complete: %d rows", source, total)
+    print("Data import complete.")
+    return total
+
+
+if __name__ == "__main__":
+    parallel_import_data()
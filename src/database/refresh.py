@@ -0,0 +1,25 @@
+from typing import Iterable
+
+from sqlalchemy.engine import Connection
+
+from src.database.facts import refresh_facts
+from src.database.partition import ensure_partitions
+from src.database.rollup import refresh_rollups
+from src.database.version import bump_data_version
+
+
+def refresh_derived_data(conn: Connection, dates: Iterable | None = None) -> None:
+    """
+    Bring everything derived from the measure tables up to date after an ingest.
+
+    `dates` are the measure dates touched by an incremental ingest; None
+    means the whole dataset may have changed. The data version is bumped in
+    the same transaction, so query caches drop their entries once it commits.
+    """
+    if dates is not None:
+        dates = set(dates)
+    # Rows written before their partition existed (e.g. by the ORM loader) move out of the default partition
+    ensure_partitions(conn, dates)
+    refresh_rollups(conn, dates)
+    refresh_facts(conn, dates)
+    bump_data_version(conn)
@@ -0,0 +1,138 @@
+from typing import Iterable
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Connection
+
+from src.database.connection import engine
+from src.database.criteria import date_condition
+from src.database.filter import country_ids
+from src.database.model import (
+    Measure, MeasureDate, MeasureDetail, MeasurePolicyLink, PolicyMeasureLevel,
+    MeasureCountRollup, PolicyPairRollup
+)
+from src.database.version import built_version, bump_data_version, mark_built
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# Filters a rollup can answer; anything else needs the measure tables
+ROLLUP_FILTERS = {"country", "date_from", "date_to"}
+# Name of the rollup tables in derived_builds
+ROLLUP_BUILD = "rollups"
+
+
+def _level_links(level_type, policy_id=MeasurePolicyLink.policy_measure_level_id):
+    return (
+        select(MeasurePolicyLink.measure_id, policy_id.label("policy_id"))
+        .join(PolicyMeasureLevel, MeasurePolicyLink.policy_measure_level_id == PolicyMeasureLevel.id)
+        .where(PolicyMeasureLevel.level_type == level_type)
+    )
+
+
+def _measure_count_select(dates=None):
+    # The FCI source carries one policy per level and row, so taking the
+    # smallest Level 1 link keeps every measure counted exactly once
+    level_1 = (
+        _level_links("Level 1", func.min(MeasurePolicyLink.policy_measure_level_id))
+        .group_by(MeasurePolicyLink.measure_id)
+        .subquery()
+    )
+    columns = (MeasureDate.date, Measure.country_id, MeasureDetail.authority, level_1.c.policy_id)
+    stmt = (
+        select(*columns, func.count())
+        .select_from(Measure)
+        .outerjoin(MeasureDate, MeasureDate.measure_id == Measure.id)
+        .outerjoin(MeasureDetail, MeasureDetail.measure_id == Measure.id)
+        .outerjoin(level_1, level_1.c.measure_id == Measure.id)
+        .group_by(*columns)
+    )
+    if dates is not None:
+        stmt = stmt.where(date_condition(MeasureDate.date, dates))
+    return stmt
+
+
+def _policy_pair_select(dates=None):
+    level_1 = _level_links("Level 1").subquery()
+    level_2 = _level_links("Level 2").subquery()
+    columns = (MeasureDate.date, Measure.country_id, level_1.c.policy_id, level_2.c.policy_id)
+    stmt = (
+        select(*columns, func.count())
+        .select_from(Measure)
+        .outerjoin(MeasureDate, MeasureDate.measure_id == Measure.id)
+        .join(level_1, level_1.c.measure_id == Measure.id)
+        .join(level_2, level_2.c.measure_id == Measure.id)
+        .group_by(*columns)
+    )
+    if dates is not None:
+        stmt = stmt.where(date_condition(MeasureDate.date, dates))
+    return stmt
+
+
+def refresh_rollups(conn: Connection, dates: Iterable | None = None) -> None:
+    """
+    Rebuild the rollup tables from the measure tables.
+
+    With `dates` (the measure dates touched by an incremental ingest, None
+    standing for undated measures) only the rollup rows of those dates are
+    recomputed; otherwise both tables are rebuilt from scratch. Rollups that
+    were never built in full are rebuilt from scratch either way, since the
+    other dates would be missing.
+    """
+    if dates is not None:
+        dates = set(dates)
+        if not dates:
+            return
+        if built_version(conn, ROLLUP_BUILD) is None:
+            log.info("Rollups were never built in full, rebuilding them")
+            dates = None
+    for model, source, columns in (
+        (MeasureCountRollup, _measure_count_select(dates),
+         ["date", "country_id", "authority", "level_1_id", "measure_count"]),
+        (PolicyPairRollup, _policy_pair_select(dates),
+         ["date", "country_id", "level_1_id", "level_2_id", "pair_count"]),
+    ):
+        clear = delete(model)
+        if dates is not None:
+            clear = clear.where(date_condition(model.date, dates))
+        conn.execute(clear)
+        conn.execute(insert(model).from_select(columns, source))
+    if dates is None:
+        mark_built(conn, ROLLUP_BUILD)
+    log.info("Rollups refreshed for %s dates", "all" if dates is None else len(dates))
+
+
+def rollups_ready(conn: Connection) -> bool:
+    """
+    True when the rollups have been built in full (or there are no measures).
+    Being non-empty is not enough: a refresh of some dates fills only those.
+    """
+    if built_version(conn, ROLLUP_BUILD) is not None:
+        return True
+    return not conn.execute(select(select(Measure.id).exists())).scalar()
+
+
+def can_use_rollups(filters) -> bool:
+    return all(key in ROLLUP_FILTERS for key, value in filters.items() if value)
+
+
+def rollup_criteria(model, country=None, date_from=None, date_to=None, **unset):
+    """
+    WHERE clauses on a rollup table equivalent to filter_criteria for the ROLLUP_FILTERS.
+    Any other filter must be unset (see can_use_rollups).
+    """
+    criteria = []
+    if country:
+        criteria.append(model.country_id.in_(country_ids(country)))
+    if date_from:
+        criteria.append(model.date >= date_from)
+    if date_to:
+        criteria.append(model.date <= date_to)
+    return criteria
+
+
+if __name__ == "__main__":
+    with engine.begin() as conn:
+        refresh_rollups(conn)
+        # Lets running apps pick up the rebuilt tables
+        bump_data_version(conn)
+    print("Rollups refreshed successfully.")
@@ -0,0 +1,124 @@
+from sqlalchemy import Boolean, Float, case, func, literal_column, or_, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from src.database.model import MeasureDetail
+
+# Text search configuration of the measure_details.search_vector column (see migrate.py)
+SEARCH_CONFIG = "english"
+
+# Generated column and indexes behind full-text and fuzzy search; PostgreSQL only
+SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(details, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(reference, '')), 'B')"
+)
+SEARCH_MIGRATIONS = [
+    f"ALTER TABLE measure_details ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_measure_details_search_vector ON measure_details USING gin (search_vector)",
+]
+TRIGRAM_MIGRATIONS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_measure_details_details_trgm ON measure_details USING gin (details gin_trgm_ops)",
+]
+
+_search_vector = literal_column("measure_details.search_vector")
+
+
+class search_match(FunctionElement):
+    """
+    True when the measure_details row matches the query: search_match(query).
+    """
+    type = Boolean()
+    inherit_cache = True
+    name = "search_match"
+    fuzzy = False
+
+
+class fuzzy_search_match(search_match):
+    """
+    search_match that also accepts trigram (typo-tolerant) matches of details.
+    """
+    inherit_cache = True
+    fuzzy = True
+
+
+class search_rank(FunctionElement):
+    """
+    Relevance of the measure_details row for the query: search_rank(query).
+    """
+    type = Float()
+    inherit_cache = True
+    name = "search_rank"
+    fuzzy = False
+
+
+class fuzzy_search_rank(search_rank):
+    inherit_cache = True
+    fuzzy = True
+
+
+def _tsquery(query):
+    return func.websearch_to_tsquery(SEARCH_CONFIG, query)
+
+
+@compiles(search_match, "postgresql")
+def _compile_search_match_pg(element, compiler, **kw):
+    (query,) = element.clauses
+    condition = _search_vector.op("@@")(_tsquery(query))
+    if element.fuzzy:
+        # word_similarity(query, details) above pg_trgm.word_similarity_threshold
+        condition = or_(condition, query.op("<%")(MeasureDetail.details))
+    return compiler.process(condition.self_group(), **kw)
+
+
+@compiles(search_rank, "postgresql")
+def _compile_search_rank_pg(element, compiler, **kw):
+    (query,) = element.clauses
+    rank = func.ts_rank_cd(_search_vector, _tsquery(query))
+    if element.fuzzy:
+        rank = rank + func.word_similarity(query, MeasureDetail.details)
+    return compiler.process(rank.self_group(), **kw)
+
+
+def _contains(column, query):
+    return func.lower(column).contains(func.lower(query))
+
+
+# Other backends: case-insensitive substring match, details before reference
+
+@compiles(search_match)
+def _compile_search_match(element, compiler, **kw):
+    (query,) = element.clauses
+    return compiler.process(
+        or_(_contains(MeasureDetail.details, query), _contains(MeasureDetail.reference, query)).self_group(), **kw
+    )
+
+
+@compiles(search_rank)
+def _compile_search_rank(element, compiler, **kw):
+    (query,) = element.clauses
+    return compiler.process(
+        (case((_contains(MeasureDetail.details, query), 1.0), else_=0.0)
+         + case((_contains(MeasureDetail.reference, query), 0.4), else_=0.0)).self_group(),
+        **kw
+    )
+
+
+def matches_search(query, fuzzy=False):
+    return (fuzzy_search_match if fuzzy else search_match)(query)
+
+
+def search_relevance(query, fuzzy=False):
+    return (fuzzy_search_rank if fuzzy else search_rank)(query).label("rank")
+
+
+def trigram_available(conn) -> bool:
+    """
+    True when pg_trgm is installed, i.e. fuzzy search can be used.
+    """
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(
+        select(text("1")).select_from(text("pg_extension")).where(text("extname = 'pg_trgm'"))
+    ).first())
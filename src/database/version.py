@@ -0,0 +1,77 @@
+import threading
+from typing import Any, Callable, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import Connection
+
+from src.database.model import DataVersion, DerivedBuild
+
+# data_version holds a single row
+VERSION_ROW_ID = 1
+
+
+def current_data_version(conn: Connection) -> int:
+    """
+    Current data version stamp; 0 before the first ingest.
+    """
+    version = conn.execute(
+        select(DataVersion.version).where(DataVersion.id == VERSION_ROW_ID)
+    ).scalar_one_or_none()
+    return version or 0
+
+
+def bump_data_version(conn: Connection) -> int:
+    """
+    Increment the data version stamp inside the caller's transaction and return the new value.
+    """
+    result = conn.execute(
+        update(DataVersion)
+        .where(DataVersion.id == VERSION_ROW_ID)
+        .values(version=DataVersion.version + 1)
+        .returning(DataVersion.version)
+    ).scalar_one_or_none()
+    if result is None:
+        conn.execute(DataVersion.__table__.insert().values(id=VERSION_ROW_ID, version=1))
+        result = 1
+    return result
+
+
+def built_version(conn: Connection, name: str) -> int | None:
+    """
+    Data version at which the derived tables `name` were last built in full, or None if never.
+    """
+    return conn.execute(select(DerivedBuild.version).where(DerivedBuild.name == name)).scalar_one_or_none()
+
+
+def mark_built(conn: Connection, name: str) -> None:
+    """
+    Record that the derived tables `name` have just been built in full.
+    """
+    conn.execute(delete(DerivedBuild).where(DerivedBuild.name == name))
+    conn.execute(insert(DerivedBuild).values(name=name, version=current_data_version(conn)))
+
+
+class PerVersion:
+    """
+    A value derived from the data, built by `load(conn, version)` on first
+    use and rebuilt whenever the data version changes.
+    """
+
+    def __init__(self, load: Callable[[Connection, int], Any]):
+        self.load = load
+        self._current: Tuple[int, Any] | None = None
+        self._lock = threading.Lock()
+
+    def get(self, conn: Connection) -> Any:
+        version = current_data_version(conn)
+        current = self._current
+        if current is None or current[0] != version:
+            with self._lock:
+                current = self._current
+                if current is None or current[0] != version:
+                    current = self._current = (version, self.load(conn, version))
+        return current[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._current = None
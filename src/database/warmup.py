@@ -0,0 +1,172 @@
+import queue
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from constants import PREFETCH, WARMUP, WARMUP_INTERVAL_SECONDS
+from src.database.async_query import OTHER_PANELS, TIME_SERIES_PANELS, load_dashboard_panels
+from src.database.cache import QueryCache, cache_key, query_cache
+from src.database.connection import session_scope
+from src.database.filter import count_filtered_measures, get_filtered_measure_page
+from src.database.instrumentation import track_queries
+from src.database.options import (
+    fuzzy_search_available, get_country_options, get_level_options, get_policy_type_options
+)
+from src.utils.log import get_logger
+
+log = get_logger(__name__)
+
+# The filters the app's sidebar starts with, and the page size of its result table
+DEFAULT_FILTERS = dict(
+    country=None, date_from=date(2020, 1, 1), date_to=date(2020, 2, 29), policy_type=None,
+    target_group=None, level=None, search=None, fuzzy=False,
+)
+PAGE_SIZE = 100
+
+# A cached call as the app makes it: function, positional and keyword arguments
+Call = Tuple[Callable, tuple, Dict[str, Any]]
+
+OPTION_CALLS: List[Call] = [
+    (get_country_options, (), {}),
+    (get_policy_type_options, (), {}),
+    (get_level_options, (), {}),
+    (fuzzy_search_available, (), {}),
+]
+
+
+def filter_calls(filters, page_size=PAGE_SIZE, interval="week", after_id=None) -> List[Call]:
+    """
+    The cached calls the app makes to show `filters`: the count, the page
+    after `after_id` and the dashboard panels. They must match the app's
+    calls argument for argument, or they fill different cache entries.
+    """
+    return [
+        (count_filtered_measures, (), dict(filters)),
+        (get_filtered_measure_page, (), dict(after_id=after_id, page_size=page_size, **filters)),
+        (load_dashboard_panels, (), dict(names=OTHER_PANELS, **filters)),
+        (load_dashboard_panels, (interval,), dict(names=TIME_SERIES_PANELS, **filters)),
+    ]
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def adjacent_windows(filters) -> List[Dict[str, Any]]:
+    """
+    `filters` with the date window moved back and forward by its own length,
+    in whole months when it spans whole months.
+    """
+    date_from, date_to = filters.get("date_from"), filters.get("date_to")
+    if not (date_from and date_to) or date_to < date_from:
+        return []
+    end = date_to + timedelta(days=1)
+    if date_from.day == 1 and end.day == 1:
+        months = (end.year - date_from.year) * 12 + end.month - date_from.month
+        windows = [
+            (_add_months(date_from, shift), _add_months(end, shift) - timedelta(days=1))
+            for shift in (-months, months)
+        ]
+    else:
+        length = end - date_from
+        windows = [(date_from + shift, date_to + shift) for shift in (-length, length)]
+    return [dict(filters, date_from=start, date_to=stop) for start, stop in windows]
+
+
+class Warmer:
+    """
+    Background thread running cached calls ahead of the app: the option lists
+    and default view at start (again every WARMUP_INTERVAL_SECONDS, so an
+    ingest that emptied the cache is followed by a refill), and the likely
+    next queries of the view on screen. Prefetching is best effort: calls
+    beyond `max_pending` queued ones are dropped.
+    """
+
+    def __init__(self, cache: QueryCache = query_cache, max_pending: int = 64):
+        self.cache = cache
+        self.jobs: queue.Queue = queue.Queue(max_pending)
+        self.completed = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._warmup: List[Call] = []
+
+    def submit(self, calls: List[Call]) -> None:
+        for fn, args, kwargs in calls:
+            key = cache_key(fn, *args, **kwargs)
+            with self._lock:
+                if key in self._pending:
+                    continue
+                try:
+                    self.jobs.put_nowait((fn, args, kwargs))
+                except queue.Full:
+                    return
+                self._pending.add(key)
+
+    def run(self, fn: Callable, args: tuple, kwargs: Dict[str, Any]) -> None:
+        try:
+            with track_queries(f"warmup.{fn.__name__}"), session_scope() as session:
+                self.cache.call(session, fn, *args, **kwargs)
+            self.completed += 1
+        except Exception:
+            log.exception("Warm-up call %s failed", fn.__name__)
+        finally:
+            with self._lock:
+                self._pending.discard(cache_key(fn, *args, **kwargs))
+
+    def _loop(self) -> None:
+        next_warmup = time.monotonic() + WARMUP_INTERVAL_SECONDS
+        while True:
+            timeout = max(0.0, next_warmup - time.monotonic()) if WARMUP_INTERVAL_SECONDS else None
+            try:
+                fn, args, kwargs = self.jobs.get(timeout=timeout)
+            except queue.Empty:
+                self.submit(self._warmup)
+                next_warmup = time.monotonic() + WARMUP_INTERVAL_SECONDS
+                continue
+            self.run(fn, args, kwargs)
+
+    def start(self, filters=DEFAULT_FILTERS, page_size=PAGE_SIZE, interval="week") -> None:
+        """
+        Start the thread, once per process, and queue the option lists and the view of `filters`.
+        """
+        if not WARMUP:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._warmup = OPTION_CALLS + filter_calls(filters, page_size, interval)
+            self._thread = threading.Thread(target=self._loop, name="cache-warmup", daemon=True)
+            self._thread.start()
+        log.info("Cache warm-up started with %d calls", len(self._warmup))
+        self.submit(self._warmup)
+
+    def prefetch(self, filters, page_size=PAGE_SIZE, interval="week", after_id=None) -> None:
+        """
+        Queue what is likely to be asked for after the view of `filters`: the
+        next page (when `after_id`, the last id shown, is given) and the
+        adjacent date windows.
+        """
+        if not (PREFETCH and self._thread is not None):
+            return
+        calls = [] if after_id is None else filter_calls(filters, page_size, interval, after_id)[1:2]
+        for window in adjacent_windows(filters):
+            calls += filter_calls(window, page_size, interval)
+        self.submit(calls)
+
+
+warmer = Warmer()
+
+
+if __name__ == "__main__":
+    # Fills the cache once in the foreground; useful with CACHE_REDIS_URL,
+    # where the results are shared with the app processes
+    started = time.perf_counter()
+    calls = OPTION_CALLS + filter_calls(DEFAULT_FILTERS)
+    for window in adjacent_windows(DEFAULT_FILTERS):
+        calls += filter_calls(window)
+    for fn, args, kwargs in calls:
+        warmer.run(fn, args, kwargs)
+    print(f"Warmed {warmer.completed} of {len(calls)} calls in {time.perf_counter() - started:.2f}s")
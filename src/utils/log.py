@@ -1,30 +1,187 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
 import os
-from datetime import datetime
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from typing import Dict
 
-def get_logger(submodule_name: str) -> logging.Logger:
+from constants import LOG_BACKUP_COUNT, LOG_DIR, LOG_FORMAT, LOG_LEVEL, LOG_LEVELS, LOG_ROTATE_WHEN
+
+# Attributes every LogRecord has; anything else was passed with `extra=` and goes into the JSON record
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "log_file"}
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Renders tracebacks before records are queued (see _LoggerQueueHandler)
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, source location,
+    thread, exception text and any `extra=` fields of the record.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "process": record.process,
+        }
+        if record.exc_info or record.exc_text:
+            entry["exception"] = record.exc_text or self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def _formatter() -> logging.Formatter:
+    return JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+
+
+class _FileRouter(logging.Handler):
+    """
+    Runs on the listener thread: writes each record to the file of the
+    logger it was logged through (logs/<name>.log), rotated by time.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.files: Dict[str, logging.Handler] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        name = getattr(record, "log_file", record.name)
+        handler = self.files.get(name)
+        if handler is None:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            handler = TimedRotatingFileHandler(
+                os.path.join(LOG_DIR, f"{name}.log"), when=LOG_ROTATE_WHEN,
+                backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True,
+            )
+            handler.setFormatter(_formatter())
+            self.files[name] = handler
+        handler.handle(record)
+
+    def close(self) -> None:
+        for handler in self.files.values():
+            handler.close()
+        super().close()
+
+
+class _Pipeline:
+    """
+    The queue between the logging threads and the single background writer.
+    """
+
+    def __init__(self):
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.router = _FileRouter()
+        self.listener = QueueListener(self.queue, self.router)
+        self.listener.start()
+
+    def stop(self) -> None:
+        self.listener.stop()
+        self.router.close()
+
+
+_pipeline: _Pipeline | None = None
+_pipeline_lock = threading.Lock()
+
+
+def _current_pipeline() -> _Pipeline:
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = _Pipeline()
+            atexit.register(_stop_pipeline)
+        return _pipeline
+
+
+def _stop_pipeline() -> None:
+    # Flushes the queued records on interpreter exit
+    if _pipeline is not None:
+        _pipeline.stop()
+
+
+def _after_fork() -> None:
+    # The listener thread does not survive fork(); a child process starts its own
+    global _pipeline
+    _pipeline = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class _LoggerQueueHandler(QueueHandler):
     """
-    Returns a logger that writes logs to a file named after the submodule and current date.
-    Log files are stored in a 'logs' directory.
+    Hands records to the background writer. The message and any exception
+    text are rendered here, as the arguments may change or go away once the
+    call returns; the line itself (and the JSON) is formatted on the
+    listener thread, and only for records that passed the level check.
     """
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    log_filename = f"{submodule_name}_{date_str}.log"
-    log_path = os.path.join(log_dir, log_filename)
 
+    def __init__(self, log_file: str):
+        super().__init__(None)
+        self.log_file = log_file
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        _current_pipeline().queue.put_nowait(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The same record can pass several handlers (a parent logger's too),
+        # so each one tags its own copy with the file it belongs to
+        prepared = logging.makeLogRecord(vars(record))
+        prepared.log_file = self.log_file
+        prepared.msg, prepared.args = record.getMessage(), None
+        if record.exc_info:
+            prepared.exc_text = record.exc_text or _EXCEPTION_FORMATTER.formatException(record.exc_info)
+        prepared.exc_info = None
+        return prepared
+
+
+def _parse_levels(spec: str) -> Dict[str, int]:
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+MODULE_LEVELS = _parse_levels(LOG_LEVELS)
+for _name, _level in MODULE_LEVELS.items():
+    logging.getLogger(_name).setLevel(_level)
+
+
+def level_for(name: str) -> int:
+    """
+    Level of logger `name`: that of the longest LOG_LEVELS prefix matching it, else LOG_LEVEL.
+    """
+    matches = [prefix for prefix in MODULE_LEVELS if name == prefix or name.startswith(prefix + ".")]
+    if matches:
+        return MODULE_LEVELS[max(matches, key=len)]
+    return logging.getLevelName(LOG_LEVEL)
+
+
+def get_logger(submodule_name: str) -> logging.Logger:
+    """
+    Returns a logger that writes logs to a file named after the submodule.
+    Log files are stored in LOG_DIR ('logs') and rotated by time (at
+    midnight by default); records are written as JSON lines by a background
+    thread, so logging never waits for the disk.
+    """
     logger = logging.getLogger(submodule_name)
-    logger.setLevel(logging.INFO)
+    logger.setLevel(level_for(submodule_name))
 
     # Prevent adding multiple handlers if get_logger is called multiple times
-    if not logger.handlers:
-        handler = RotatingFileHandler(log_path, maxBytes=5*1024*1024, backupCount=5)
-        formatter = logging.Formatter(
-            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-
+    if not any(isinstance(handler, _LoggerQueueHandler) for handler in logger.handlers):
+        logger.addHandler(_LoggerQueueHandler(submodule_name))
 
-    return logger
\ No newline at end of file
+    return logger
@@ -1,35 +1,34 @@
 import streamlit as st
-from datetime import date
-from sqlalchemy.orm import Session
-from collections import Counter
 
-import pandas as pd
 import plotly.express as px
 from plotly import graph_objects as go
 
-from src.database.connection import engine
-from src.database.model import Country, PolicyMeasureLevel
-from src.database.filter import get_filtered_measures
-
-# --- Session setup ---
-if "db_session" not in st.session_state:
-    st.session_state["db_session"] = Session(engine)
-session = st.session_state["db_session"]
-
-def cleanup_session():
-    db_session = st.session_state.get("db_session", None)
-    if db_session:
-        db_session.close()
-
-# --- Helper options from DB ---
-def get_country_options(session):
-    return [c.name for c in session.query(Country).order_by(Country.name).all()]
-
-def get_policy_type_options(session):
-    return sorted(set([p.name for p in session.query(PolicyMeasureLevel).all()]))
-
-def get_level_options(session):
-    return sorted(set([p.level_type for p in session.query(PolicyMeasureLevel).all() if p.level_type]))
+from constants import METRICS_HOST, METRICS_PORT, QUERY_DEBUG_PANEL
+from src.database.connection import pool_status, session_scope
+from src.database.cache import query_cache
+from src.database.instrumentation import query_metrics, start_metrics_server, track_queries
+from src.database.options import (
+    fuzzy_search_available, get_country_options, get_level_options, get_policy_type_options
+)
+from src.database.filter import count_filtered_measures, get_filtered_measure_page, search_measure_rows
+from src.database.aggregate import INTERVALS
+from src.database.async_query import OTHER_PANELS, TIME_SERIES_PANELS, load_dashboard_panels
+from src.database.warmup import DEFAULT_FILTERS, PAGE_SIZE, warmer
+
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT, METRICS_HOST)
+
+# Query traces of this rerun, for the debug panel
+rerun_traces = []
+
+# Every query below goes through the shared cache; an ingest bumps the data version and invalidates it.
+# Each call gets a short-lived session, so a pooled connection is only held while a query runs
+# (and not at all on a cache hit). Each call is traced as one request (query count, SQL time, N+1).
+def cached(fn, *args, **kwargs):
+    with track_queries(fn.__name__) as trace, session_scope() as session:
+        result = query_cache.call(session, fn, *args, **kwargs)
+    rerun_traces.append(trace)
+    return result
 
 # --- UI setup ---
 st.set_page_config(
@@ -42,72 +41,98 @@ st.title("Measure Filter App")
 # --- Sidebar filters ---
 st.sidebar.header("Filter Options")
 
-country_options = get_country_options(session)
-policy_type_options = get_policy_type_options(session)
-level_options = get_level_options(session)
+country_options = cached(get_country_options)
+policy_type_options = cached(get_policy_type_options)
+level_options = cached(get_level_options)
 
+# Once per process: fills the cache with the default view in the background (see src/database/warmup.py)
+warmer.start(DEFAULT_FILTERS, PAGE_SIZE, INTERVALS["Weekly"])
+
+search = st.sidebar.text_input("Search details", placeholder='e.g. moratorium, "capital buffer"').strip()
+fuzzy = st.sidebar.checkbox("Fuzzy match", help="Also match misspelt words") if cached(fuzzy_search_available) else False
 selected_countries = st.sidebar.multiselect("Countries", country_options)
 selected_policy_types = st.sidebar.multiselect("Policy Type", policy_type_options)
 selected_target_groups = st.sidebar.multiselect("Target Group", policy_type_options)
 selected_levels = st.sidebar.multiselect("Level", level_options)
-date_from = st.sidebar.date_input("Start Date", value=date(2020, 1, 1))
-date_to = st.sidebar.date_input("End Date", value=date(2020, 2, 29))
+date_from = st.sidebar.date_input("Start Date", value=DEFAULT_FILTERS["date_from"])
+date_to = st.sidebar.date_input("End Date", value=DEFAULT_FILTERS["date_to"])
 
 countries = selected_countries if selected_countries else None
 policy_types = selected_policy_types if selected_policy_types else None
 target_groups = selected_target_groups if selected_target_groups else None
 levels = selected_levels if selected_levels else None
 
+def as_table_rows(rows):
+    return [{
+        "id": row.id,
+        "country": row.country,
+        "date": row.date,
+        "policy_type": row.policy_type,
+        "authority": row.authority,
+        "level": row.level,
+    } for row in rows]
+
+# --- Result table paging (keyset: each entry is the last id before a page) ---
+def next_page():
+    st.session_state["page_starts"].append(st.session_state["page_last_id"])
+
+def previous_page():
+    st.session_state["page_starts"].pop()
+
 # --- Apply filters ---
 if st.sidebar.button("Apply Filters"):
+    filters = dict(
+        country=countries,
+        date_from=date_from,
+        date_to=date_to,
+        policy_type=policy_types,
+        target_group=target_groups,
+        level=levels,
+        search=search or None,
+        fuzzy=fuzzy,
+    )
     with st.spinner("Loading results..."):
-        measures = get_filtered_measures(
-            session,
-            country=countries,
-            date_from=date_from,
-            date_to=date_to,
-            policy_type=policy_types,
-            target_group=target_groups,
-            level=levels
-        )
-
-        results = []
-        for m in measures:
-            results.append({
-                "id": m.id,
-                "country": m.country.name if m.country else None,
-                "date": m.date_ref.date if getattr(m, "date_ref", None) else None,
-                "policy_type": [pl.policy.name for pl in getattr(m, "policy_links", [])],
-                "authority": m.detail_ref.authority if getattr(m, "detail_ref", None) else None,
-                "level": [pl.policy.level_type for pl in getattr(m, "policy_links", [])],
-            })
-
-        st.session_state["results"] = results
-        st.session_state["measures"] = measures
-
-results = st.session_state.get("results", [])
-measures = st.session_state.get("measures", [])
-
-if results:
-    st.write(f"Total measures found: {len(results)}")
-    st.dataframe(results)
-
-    df = pd.DataFrame(results)
-    df["date"] = pd.to_datetime(df["date"])
-
-    if not df.empty:
+        st.session_state["filters"] = filters
+        st.session_state["total"] = cached(count_filtered_measures, **filters)
+        st.session_state["page_starts"] = [None]
+
+filters = st.session_state.get("filters")
+
+if filters:
+    total = st.session_state["total"]
+    page_starts = st.session_state["page_starts"]
+    st.write(f"Total measures found: {total}")
+
+    if filters.get("search") and total:
+        st.markdown("**Best matches**")
+        best = cached(search_measure_rows, limit=10, **filters)
+        st.dataframe([
+            {"id": row.id, "country": row.country, "date": row.date, "details": row.details} for row in best
+        ])
+
+    page = cached(get_filtered_measure_page, after_id=page_starts[-1], page_size=PAGE_SIZE, **filters)
+    st.session_state["page_last_id"] = page[-1].id if page else None
+    st.dataframe(as_table_rows(page))
+
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    prev_col.button("Previous", on_click=previous_page, disabled=len(page_starts) == 1)
+    info_col.write(f"Page {len(page_starts)} of {max(1, -(-total // PAGE_SIZE))}")
+    next_col.button("Next", on_click=next_page, disabled=len(page_starts) * PAGE_SIZE >= total)
+
+    # The chart interval comes from the selectbox's previous value
+    interval_label = st.session_state.get("aggregation_interval", "Weekly")
+
+    if total:
+        # All chart queries run concurrently. Only the time series depend on the interval,
+        # so switching it leaves the other panels cached.
+        panels = cached(load_dashboard_panels, names=OTHER_PANELS, **filters)
+        panels.update(cached(load_dashboard_panels, INTERVALS[interval_label], names=TIME_SERIES_PANELS, **filters))
 
         ### ---------------- FOLD 1 ----------------------------------------
         with st.expander("Measures Over Time"):
-            aggregation_option = st.selectbox("Select aggregation interval:", ["Weekly", "Monthly", "Daily"], index=0)
-            if aggregation_option == "Daily":
-                df["interval"] = df["date"]
-            elif aggregation_option == "Monthly":
-                df["interval"] = df["date"].dt.to_period("M").apply(lambda r: r.start_time)
-            else:
-                df["interval"] = df["date"].dt.to_period("W").apply(lambda r: r.start_time)
-
-            counts = df.groupby("interval").size().reset_index(name="measure_count")
+            aggregation_option = st.selectbox("Select aggregation interval:", ["Weekly", "Monthly", "Daily"], index=0,
+                                              key="aggregation_interval")
+            counts = panels["measures_over_time"]
             fig1 = px.line(
                 counts,
                 x="interval",
@@ -119,10 +144,19 @@ if results:
             fig1.update_layout(margin=dict(l=40, r=40, t=40, b=40))
             st.plotly_chart(fig1, use_container_width=True)
 
+            fig_active = px.line(
+                panels["active_measures_over_time"],
+                x="interval",
+                y="active_count",
+                labels={"interval": aggregation_option, "active_count": "Measures in Force"},
+                title=f"Measures in Force ({aggregation_option})"
+            )
+            fig_active.update_layout(margin=dict(l=40, r=40, t=40, b=40))
+            st.plotly_chart(fig_active, use_container_width=True)
+
         ### ---------------- FOLD 2 ----------------------------------------
         with st.expander("Measures by Country"):
-            country_counts = df["country"].value_counts().reset_index()
-            country_counts.columns = ["country", "measure_count"]
+            country_counts = panels["measures_by_country"]
 
             top_n_countries = st.slider("Number of top countries to display", 0, len(country_counts), min(10, len(country_counts)))
             country_counts = country_counts.head(top_n_countries)
@@ -141,26 +175,13 @@ if results:
 
         ### ---------------- FOLD 3 ----------------------------------------
         with st.expander("Distribution of Policy Measures by Level"):
-            hierarchy_data = []
-
-            for m in measures:
-                level_1_names = []
-                level_2_names = []
-                for pl in getattr(m, "policy_links", []):
-                    if pl.policy.level_type.strip() == "Level 1":
-                        level_1_names.append(pl.policy.name.strip())
-                    elif pl.policy.level_type.strip() == "Level 2":
-                        level_2_names.append(pl.policy.name.strip())
+            df_hier = panels["policy_level_pairs"]
 
-                for l1 in level_1_names:
-                    for l2 in level_2_names:
-                        hierarchy_data.append((l1, l2))
-
-            if hierarchy_data:
-                df_hier = pd.DataFrame(hierarchy_data, columns=["level_1", "level_2"])
-
-                level1_counts = df_hier["level_1"].value_counts().reset_index()
-                level1_counts.columns = ["level_1", "count"]
+            if not df_hier.empty:
+                level1_counts = (
+                    df_hier.groupby("level_1", as_index=False)["count"].sum()
+                    .sort_values("count", ascending=False)
+                )
 
                 st.markdown("<h4 style='text-align:left; margin-top:0'>Distribution of Policy Measures by Level 1</h4>", unsafe_allow_html=True)
 
@@ -179,9 +200,7 @@ if results:
 
                 for i, l1_value in enumerate(level1_counts["level_1"]):
                     with cols[i]:
-                        subset = df_hier[df_hier["level_1"] == l1_value]
-                        level2_counts = subset["level_2"].value_counts().reset_index()
-                        level2_counts.columns = ["level_2", "count"]
+                        level2_counts = df_hier[df_hier["level_1"] == l1_value][["level_2", "count"]]
 
                         st.markdown(f"<h5 style='text-align:center; margin-bottom:0.5em'>{l1_value}</h5>", unsafe_allow_html=True)
 
@@ -204,26 +223,10 @@ if results:
 
         ### ---------------- FOLD 4 ----------------------------------------
         with st.expander("Authority Breakdown and Map"):
-            authority_counts = df["authority"].value_counts().reset_index()
-            authority_counts.columns = ["authority", "count"]
-            authority_counts = authority_counts[authority_counts["authority"].notnull() & (authority_counts["authority"] != "")]
-
-            country_authority = {}
-            for m in measures:
-                country = m.country
-                authority = m.detail_ref.authority if getattr(m, "detail_ref", None) else None
-                if country and authority:
-                    key = country.iso3.upper()
-                    country_authority.setdefault(key, []).append(authority)
-
-            rows = []
-            for iso3, authorities in country_authority.items():
-                if authorities:
-                    dominant = Counter(authorities).most_common(1)[0][0]
-                    rows.append({"iso3": iso3, "authority": dominant})
-            df_map = pd.DataFrame(rows)
-
-            if not authority_counts.empty and not df_map.empty:
+            authority_totals = panels["authority_counts"]
+            df_map = panels["dominant_authority_by_country"]
+
+            if not authority_totals.empty and not df_map.empty:
                 authority_labels = {
                     "Cb": "Central Bank",
                     "Sup": "Supervisor",
@@ -233,10 +236,10 @@ if results:
                     "Other": "Other"
                 }
 
-                authority_counts["label"] = authority_counts["authority"]
-                authority_counts["legend_name"] = authority_counts["authority"].map(lambda x: f"{x} – {authority_labels.get(x, 'Unknown')}")
+                authority_totals["label"] = authority_totals["authority"]
+                authority_totals["legend_name"] = authority_totals["authority"].map(lambda x: f"{x} – {authority_labels.get(x, 'Unknown')}")
 
-                authority_types = sorted(authority_counts["authority"].unique())
+                authority_types = sorted(authority_totals["authority"].unique())
                 color_map = px.colors.qualitative.Plotly
                 color_scale = {auth: color_map[i % len(color_map)] for i, auth in enumerate(authority_types)}
 
@@ -265,10 +268,10 @@ if results:
                     st.plotly_chart(fig_map, use_container_width=True)
 
                 with col2:
-                    labels = authority_counts["label"]
-                    values = authority_counts["count"]
-                    authorities = authority_counts["authority"]
-                    legend_names = authority_counts["legend_name"]
+                    labels = authority_totals["label"]
+                    values = authority_totals["count"]
+                    authorities = authority_totals["authority"]
+                    legend_names = authority_totals["legend_name"]
 
                     fig_pie = go.Figure(
                         data=[
@@ -302,6 +305,30 @@ if results:
                     st.plotly_chart(fig_pie, use_container_width=True)
             else:
                 st.info("No authority data available to display.")
+
+    # Once this view is on screen, queue the next page and the neighbouring date windows in the background
+    has_next = page and len(page_starts) * PAGE_SIZE < total
+    warmer.prefetch(filters, PAGE_SIZE, INTERVALS[interval_label], after_id=page[-1].id if has_next else None)
 else:
     st.info("Set your filters and click 'Apply Filters' to see results.")
-    
\ No newline at end of file
+    
+
+# --- Query debug panel (QUERY_DEBUG_PANEL=true) ---
+if QUERY_DEBUG_PANEL and st.sidebar.checkbox("Show query debug panel"):
+    with st.expander("Query debug", expanded=True):
+        st.markdown("**Calls in this rerun**")
+        st.dataframe([trace.summary() | {"n_plus_one": len(trace.n_plus_one)} for trace in rerun_traces])
+        for trace in rerun_traces:
+            for statement, count in trace.n_plus_one:
+                st.warning(f"Possible N+1 in {trace.name}: {count} executions of `{statement[:300]}`")
+        metrics = query_metrics.as_dict()
+        st.markdown("**Slowest statements (since start)**")
+        st.dataframe(metrics["top_statements"])
+        st.markdown(f"**Slow queries** (over {query_metrics.slow_ms:g} ms)")
+        for entry in reversed(metrics["recent_slow_queries"]):
+            st.code(f"-- {entry['at']}: {entry['ms']} ms, {entry['rows']} rows\n{entry['statement']}\n\n"
+                    f"{entry['plan'] or '(plan pending)'}", language="sql")
+        st.markdown("**Pool and cache**")
+        st.json({"pool": pool_status(), "cache": {"hits": query_cache.hits, "misses": query_cache.misses},
+                 "warm-up": {"completed": warmer.completed, "queued": warmer.jobs.qsize()}})
+        st.download_button("Metrics (Prometheus)", query_metrics.prometheus(), file_name="metrics.txt")
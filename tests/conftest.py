@@ -0,0 +1,80 @@
+import csv
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.engine import URL, Engine
+
+from src.database import cube, facts
+from src.database.cache import query_cache
+from src.database.columnar import filter_engine
+from src.database.embedded import schema_metadata
+from src.database.model import Measure
+
+DATA_CSV = Path(__file__).resolve().parent.parent / "data" / "covid-fci-data-cleaned.csv"
+SAMPLE_ROWS = 400
+
+
+def write_csv(path: Path, rows: List[Dict[str, str]]) -> str:
+    with open(path, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def measure_counts(bind: Engine):
+    """
+    Number of measures and of distinct source IDs among them.
+    """
+    with bind.connect() as conn:
+        return tuple(conn.execute(
+            select(func.count(), func.count(Measure.source_id.distinct())).select_from(Measure)
+        ).one())
+
+
+@pytest.fixture(scope="session")
+def source_rows() -> List[Dict[str, str]]:
+    with open(DATA_CSV, newline="", encoding="utf-8") as csvfile:
+        reader = csv.DictReader(csvfile)
+        return [row for _, row in zip(range(SAMPLE_ROWS), reader)]
+
+
+@pytest.fixture
+def sample_csv(tmp_path, source_rows) -> str:
+    return write_csv(tmp_path / "sample.csv", source_rows)
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    """
+    Factory of engines on an empty database file with the schema created.
+    """
+    engines = []
+
+    def make(backend: str, name: str = "fci") -> Engine:
+        if backend == "duckdb":
+            pytest.importorskip("duckdb_engine")
+        bind = create_engine(URL.create(backend, database=str(tmp_path / f"{name}.{backend}")))
+        schema_metadata(bind).create_all(bind)
+        engines.append(bind)
+        return bind
+
+    yield make
+    for bind in engines:
+        bind.dispose()
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    # Per-version values and cached results are keyed by data version only,
+    # which every test database starts counting from 1
+    per_version = (facts._codes, cube._cube, filter_engine._snapshot)
+    for value in per_version:
+        value.clear()
+    query_cache.clear()
+    yield
+    for value in per_version:
+        value.clear()
+    query_cache.clear()
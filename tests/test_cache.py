@@ -0,0 +1,46 @@
+from sqlalchemy.orm import Session
+
+from src.database.bulk_insert import bulk_import_data
+from src.database.cache import QueryCache
+from src.database.filter import count_filtered_measures
+from src.database.incremental import incremental_import_data
+from src.database.version import bump_data_version
+from tests.conftest import write_csv
+
+
+def test_version_bump_invalidates_cached_results(make_engine, tmp_path, source_rows):
+    bind = make_engine("sqlite")
+    bulk_import_data(write_csv(tmp_path / "before.csv", source_rows[:300]), bind=bind)
+    cache = QueryCache(version_check_seconds=0)
+    italy_before = sum(row["Country Name"] == "Italy" for row in source_rows[:300])
+    italy_after = sum(row["Country Name"] == "Italy" for row in source_rows)
+    assert italy_before != italy_after
+
+    with Session(bind) as session:
+        assert cache.call(session, count_filtered_measures, country="Italy") == italy_before
+        assert cache.call(session, count_filtered_measures, country="Italy") == italy_before
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    incremental_import_data(write_csv(tmp_path / "after.csv", source_rows), bind=bind)
+    with Session(bind) as session:
+        assert cache.call(session, count_filtered_measures, country="Italy") == italy_after
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_result_of_an_older_version_is_not_stored(make_engine):
+    bind = make_engine("sqlite")
+    cache = QueryCache(version_check_seconds=0)
+
+    def ingest_while_computing(session):
+        # An ingest commits and another caller sees its version first
+        with bind.begin() as conn:
+            bump_data_version(conn)
+        with Session(bind) as other:
+            cache.data_version(other)
+        return "stale"
+
+    with Session(bind) as session:
+        assert cache.call(session, ingest_while_computing) == "stale"
+    with Session(bind) as session:
+        assert cache.call(session, ingest_while_computing) == "stale"
+    assert (cache.hits, cache.misses) == (0, 2)
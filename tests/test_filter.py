@@ -0,0 +1,56 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import Session
+
+from src.database import columnar
+from src.database.bulk_insert import bulk_import_data
+from src.database.filter import (
+    count_filtered_measures, get_filtered_measure_page, get_filtered_measure_rows, get_filtered_measures,
+    iter_filtered_measure_rows,
+)
+
+FILTERS = [
+    {},
+    dict(country=["Italy", "Colombia", "Brazil"]),
+    dict(country="China"),
+    dict(date_from=date(2020, 3, 16), date_to=date(2020, 3, 19)),
+    dict(date_from=date(2020, 4, 1)),
+    dict(policy_type="Banking sector"),
+    dict(target_group=["Policy rate", "Prudential"], level="Level 2"),
+    dict(level=["Level 1", "Level 3"], date_to=date(2020, 3, 20)),
+    dict(country=["Italy", "Philippines"], policy_type="Liquidity/funding", date_from=date(2020, 3, 1)),
+    dict(active_from=date(2020, 6, 1), active_to=date(2020, 6, 30)),
+    dict(country="Atlantis"),
+]
+
+
+def _pages(session, page_size, **filters):
+    rows, after_id = [], None
+    while True:
+        page = get_filtered_measure_page(session, after_id=after_id, page_size=page_size, **filters)
+        rows += page
+        if len(page) < page_size:
+            return rows
+        after_id = page[-1].id
+
+
+@pytest.fixture(params=["sqlite", "duckdb"])
+def loaded_engine(request, make_engine, sample_csv):
+    bind = make_engine(request.param)
+    bulk_import_data(sample_csv, bind=bind)
+    return bind
+
+
+@pytest.mark.parametrize("in_memory", [False, True], ids=["sql", "columnar"])
+def test_filter_paths_agree(loaded_engine, monkeypatch, in_memory):
+    monkeypatch.setattr(columnar, "IN_MEMORY_FILTER", in_memory)
+    with Session(loaded_engine) as session:
+        for filters in FILTERS:
+            rows = get_filtered_measure_rows(session, **filters)
+            ids = [row.id for row in rows]
+            assert ids == sorted(ids)
+            assert sorted(measure.id for measure in get_filtered_measures(session, **filters)) == ids
+            assert count_filtered_measures(session, **filters) == len(rows), filters
+            assert _pages(session, 37, **filters) == rows, filters
+            assert list(iter_filtered_measure_rows(session, batch_size=50, **filters)) == rows, filters
@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src.database.bulk_insert import bulk_import_data
+from src.database.pipeline import parallel_import_data
+from tests.conftest import SAMPLE_ROWS, measure_counts
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "duckdb"])
+def test_second_import_keeps_one_measure_per_source_id(make_engine, sample_csv, backend):
+    bind = make_engine(backend)
+    assert bulk_import_data(sample_csv, batch_size=100, bind=bind) == SAMPLE_ROWS
+
+    with pytest.raises(IntegrityError):
+        bulk_import_data(sample_csv, batch_size=100, bind=bind)
+    with pytest.raises(IntegrityError):
+        parallel_import_data(sample_csv, chunk_size=100, workers=1, writers=1, bind=bind)
+
+    assert measure_counts(bind) == (SAMPLE_ROWS, SAMPLE_ROWS)
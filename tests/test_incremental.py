@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+import pytest
+from sqlalchemy import select
+
+from src.database.bulk_insert import bulk_import_data
+from src.database.incremental import incremental_import_data
+from src.database.model import (
+    Country, Measure, MeasureDate, MeasureDetail, MeasureModification, MeasurePolicyLink, PolicyMeasureLevel
+)
+from src.database.version import current_data_version
+from tests.conftest import write_csv
+
+
+def _contents(bind):
+    """
+    Every measure with its side table rows and policies, keyed by source ID.
+    """
+    with bind.connect() as conn:
+        policies = defaultdict(set)
+        for source_id, name, level_type in conn.execute(
+            select(Measure.source_id, PolicyMeasureLevel.name, PolicyMeasureLevel.level_type)
+            .join(MeasurePolicyLink, MeasurePolicyLink.measure_id == Measure.id)
+            .join(PolicyMeasureLevel, PolicyMeasureLevel.id == MeasurePolicyLink.policy_measure_level_id)
+        ):
+            policies[source_id].add((name, level_type))
+        rows = conn.execute(
+            select(
+                Measure.source_id, Measure.original_id, Measure.row_hash, Country.iso3, Country.name,
+                MeasureDate.date, MeasureDate.termination_date,
+                MeasureDetail.authority, MeasureDetail.details, MeasureDetail.reference,
+                MeasureModification.was_modified, MeasureModification.modification_of_parent,
+                MeasureModification.parent_measure,
+            )
+            .join(Country, Country.id == Measure.country_id)
+            .join(MeasureDate, MeasureDate.measure_id == Measure.id)
+            .join(MeasureDetail, MeasureDetail.measure_id == Measure.id)
+            .join(MeasureModification, MeasureModification.measure_id == Measure.id)
+        ).all()
+    return {row[0]: (tuple(row[1:]), policies[row[0]]) for row in rows}
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "duckdb"])
+def test_incremental_import_matches_full_load(make_engine, tmp_path, source_rows, backend):
+    before = source_rows[:300]
+    after = [dict(row) for row in source_rows[50:]]
+    for row in after[:20]:
+        row["Details of the measure"] += " (amended)"
+    for row in after[20:25]:
+        row["Level 3 policy measures"] = "Other prudential relaxation"
+        row["Termination Date"] = "2021-12-31"
+    for row in after[25:28]:
+        row["Country Name"], row["Country ISO3"] = "Atlantis", "ATL"
+
+    incremental = make_engine(backend, "incremental")
+    bulk_import_data(write_csv(tmp_path / "before.csv", before), bind=incremental)
+    after_csv = write_csv(tmp_path / "after.csv", after)
+    delta = incremental_import_data(after_csv, bind=incremental)
+    assert (delta.inserted, delta.updated, delta.deleted, delta.unchanged) == (100, 28, 50, 222)
+
+    full = make_engine(backend, "full")
+    bulk_import_data(after_csv, bind=full)
+    assert _contents(incremental) == _contents(full)
+
+    # Nothing changed since: the data version, and with it every cache, stays
+    with incremental.connect() as conn:
+        version = current_data_version(conn)
+    delta = incremental_import_data(after_csv, bind=incremental)
+    assert (delta.inserted, delta.updated, delta.deleted, delta.unchanged) == (0, 0, 0, 350)
+    with incremental.connect() as conn:
+        assert current_data_version(conn) == version
@@ -0,0 +1,8 @@
+from src.database.pipeline import parallel_import_data
+from tests.conftest import DATA_CSV, measure_counts
+
+
+def test_parallel_import_on_sqlite(make_engine):
+    bind = make_engine("sqlite")
+    rows = parallel_import_data(str(DATA_CSV), chunk_size=100, workers=2, writers=4, bind=bind)
+    assert measure_counts(bind) == (rows, rows)